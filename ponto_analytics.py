@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""Worked-hours and time-bank analytics over punch history.
+
+Punches are loaded into columnar NumPy arrays (user code, timestamp)
+from the local history store(s) or from a CSV/JSON export, and every
+step runs as whole-array operations, so years of punches for many users
+take well under a second:
+
+- punches are sorted by user and time and grouped by local day;
+- within a day they pair up as in/out (1st-2nd, 3rd-4th, ...), and a
+  day with an odd number of punches is flagged as incomplete;
+- daily totals are compared to the expected hours of a workday;
+- the time-bank balance is the running sum of the daily differences.
+
+Only days with punches count: holidays, vacations and absences are not
+known here and are left to the payroll system.
+
+Requires NumPy (``pip install numpy``).
+"""
+# Standard library imports
+import csv
+import json
+import time
+import sqlite3
+
+# Third-party imports
+import numpy as np
+
+# Local imports
+from ponto_history import parse_timestamp
+
+SECONDS_PER_DAY = 86400
+DEFAULT_DAILY_HOURS = 8.0
+
+# Monday is 0, as in datetime.weekday()
+WORKDAYS = (0, 1, 2, 3, 4)
+
+
+def local_utc_offset():
+    """Return the local UTC offset in seconds (Brazil has no DST since 2019)."""
+    return time.localtime().tm_gmtoff
+
+
+class PunchArrays:
+    """Columnar punch data: user names, per-punch user codes and timestamps."""
+
+    def __init__(self, users, user_codes, timestamps):
+        self.users = list(users)
+        self.user_codes = np.asarray(user_codes, dtype=np.int64)
+        self.timestamps = np.asarray(timestamps, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @classmethod
+    def from_columns(cls, usernames, timestamps):
+        """Build from a sequence of user names and one of Unix timestamps."""
+        names = np.asarray(usernames, dtype=str)
+        if len(names) == 0:
+            return cls([], [], [])
+        users, codes = np.unique(names, return_inverse=True)
+        return cls(users.tolist(), codes, timestamps)
+
+    @classmethod
+    def from_sqlite(cls, paths, usernames=None):
+        """Load the punch history of one or more history.db files."""
+        if isinstance(paths, str):
+            paths = [paths]
+        names, stamps = [], []
+        query = "SELECT username, punched_at FROM history"
+        params = ()
+        if usernames:
+            query += f" WHERE username IN ({', '.join('?' * len(usernames))})"
+            params = tuple(usernames)
+        for path in paths:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+            try:
+                rows = conn.execute(query, params).fetchall()
+            finally:
+                conn.close()
+            if rows:
+                user_column, time_column = zip(*rows)
+                names.extend(user_column)
+                stamps.extend(time_column)
+        return cls.from_columns(names, stamps)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Load a CSV export with ``username`` and ``punched_at`` columns.
+
+        ``punched_at`` may be a Unix timestamp or a local ISO 8601 date-time.
+        """
+        with open(path, newline='') as f:
+            rows = [(row['username'], row['punched_at']) for row in csv.DictReader(f)]
+        if not rows:
+            return cls([], [], [])
+        names, values = zip(*rows)
+        return cls.from_columns(names, parse_time_column(values))
+
+    @classmethod
+    def from_json(cls, path):
+        """Load a JSON list of ``{"username", "punched_at" | "dataHora"}`` objects."""
+        with open(path, 'r') as f:
+            records = json.load(f)
+        names = [record['username'] for record in records]
+        values = [record.get('punched_at', record.get('dataHora')) for record in records]
+        return cls.from_columns(names, parse_time_column(values))
+
+    @classmethod
+    def load(cls, path):
+        """Load a history database, CSV or JSON file based on its extension."""
+        if path.endswith('.csv'):
+            return cls.from_csv(path)
+        if path.endswith('.json'):
+            return cls.from_json(path)
+        return cls.from_sqlite(path)
+
+
+def parse_time_column(values):
+    """Convert a column of epoch numbers or ISO strings to Unix timestamps."""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except ValueError:
+        pass
+    try:
+        # Naive local date-times: parse in bulk and shift to UTC
+        local = np.asarray(values, dtype='datetime64[s]').astype(np.int64)
+        return (local - local_utc_offset()).astype(np.float64)
+    except ValueError:
+        # Mixed or zoned values
+        return np.fromiter((parse_timestamp(value) for value in values), dtype=np.float64, count=len(values))
+
+
+def sort_order(user_codes, timestamps):
+    """Return the permutation sorting punches by user, then time.
+
+    Packs both into one int64 key (millisecond resolution) when it fits,
+    which sorts several times faster than np.lexsort on two columns.
+    """
+    if len(timestamps) == 0:
+        return np.zeros(0, dtype=np.int64)
+    span = np.ceil((timestamps.max() - timestamps.min()) * 1000)
+    user_bits = int(user_codes.max()).bit_length()
+    time_bits = 62 - user_bits
+    if span >= 2 ** time_bits:
+        return np.lexsort((timestamps, user_codes))
+    key = (user_codes << time_bits) | np.round((timestamps - timestamps.min()) * 1000).astype(np.int64)
+    if np.all(key[1:] >= key[:-1]):
+        # Already ordered, e.g. a single user's history
+        return np.arange(len(key))
+    return np.argsort(key)
+
+
+def group_starts(*keys):
+    """Return a boolean mask marking where any of the sorted keys changes."""
+    n = len(keys[0])
+    starts = np.zeros(n, dtype=bool)
+    if n:
+        starts[0] = True
+        for key in keys:
+            starts[1:] |= key[1:] != key[:-1]
+    return starts
+
+
+class WorkedHours:
+    """Daily and monthly worked hours, overtime and time bank per user.
+
+    Daily arrays (one entry per user and day with punches, ordered by
+    user then day): ``day_user``, ``day`` (days since 1970-01-01, local
+    time), ``worked``, ``expected``, ``balance``, ``bank`` (seconds) and
+    ``incomplete``. Monthly arrays: ``month_user``, ``month`` (months since
+    1970-01) and the same sums per month.
+    """
+
+    def __init__(self, punches, daily_hours=DEFAULT_DAILY_HOURS, workdays=WORKDAYS, utc_offset=None):
+        self.users = punches.users
+        offset = local_utc_offset() if utc_offset is None else utc_offset
+
+        order = sort_order(punches.user_codes, punches.timestamps)
+        users = punches.user_codes[order]
+        stamps = punches.timestamps[order]
+        days = np.floor_divide(stamps + offset, SECONDS_PER_DAY).astype(np.int64)
+
+        # One group per (user, day); rank of each punch inside its day
+        day_start = group_starts(users, days)
+        day_group = np.cumsum(day_start) - 1
+        first = np.flatnonzero(day_start)
+        rank = np.arange(len(stamps)) - first[day_group] if len(stamps) else np.zeros(0, dtype=np.int64)
+
+        # Every second punch of a day closes the interval opened by the previous one
+        gaps = np.zeros(len(stamps))
+        gaps[1:] = stamps[1:] - stamps[:-1]
+        closing = rank % 2 == 1
+        self.worked = np.bincount(day_group, weights=gaps * closing, minlength=len(first))
+        self.incomplete = np.bincount(day_group, minlength=len(first)) % 2 == 1
+        self.day_user = users[first]
+        self.day = days[first]
+
+        weekday = (self.day + 3) % 7  # 1970-01-01 was a Thursday
+        self.expected = np.where(np.isin(weekday, workdays), daily_hours * 3600, 0.0)
+        self.balance = self.worked - self.expected
+        self.overtime = np.maximum(self.balance, 0.0)
+
+        # Running balance, restarted for every user
+        running = np.cumsum(self.balance)
+        user_start = group_starts(self.day_user)
+        user_group = np.cumsum(user_start) - 1
+        self.bank = running - (running - self.balance)[user_start][user_group]
+
+        # Monthly sums
+        months = self.day.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        month_start = group_starts(self.day_user, months)
+        month_first = np.flatnonzero(month_start)
+        month_last = np.r_[month_first[1:], len(months)] - 1
+        self.month_user = self.day_user[month_first]
+        self.month = months[month_first]
+        self.month_days = np.diff(np.r_[month_first, len(months)])
+        if len(month_first):
+            self.month_worked = np.add.reduceat(self.worked, month_first)
+            self.month_expected = np.add.reduceat(self.expected, month_first)
+            self.month_overtime = np.add.reduceat(self.overtime, month_first)
+            self.month_incomplete = np.add.reduceat(self.incomplete.astype(np.int64), month_first)
+        else:
+            self.month_worked = self.month_expected = self.month_overtime = np.zeros(0)
+            self.month_incomplete = np.zeros(0, dtype=np.int64)
+        self.month_bank = self.bank[month_last] if len(month_first) else np.zeros(0)
+
+    def monthly(self, month=None, users=None):
+        """Return one dict per user and month, hours rounded to minutes.
+
+        ``month`` ("YYYY-MM") and ``users`` (names) filter the rows.
+        """
+        mask = np.ones(len(self.month), dtype=bool)
+        if month:
+            mask &= self.month == np.datetime64(month, 'M').astype(np.int64)
+        if users:
+            wanted = [self.users.index(name) for name in users if name in self.users]
+            mask &= np.isin(self.month_user, wanted)
+
+        def hours(values):
+            return np.round(values[mask] / 3600, 2).tolist()
+
+        labels = self.month[mask].astype('datetime64[M]').astype(str).tolist()
+        return [
+            {
+                'user': self.users[user],
+                'month': label,
+                'days': days,
+                'worked_h': worked,
+                'expected_h': expected,
+                'overtime_h': overtime,
+                'balance_h': round(worked - expected, 2),
+                'bank_h': bank,
+                'incomplete_days': incomplete,
+            }
+            for user, label, days, worked, expected, overtime, bank, incomplete in zip(
+                self.month_user[mask].tolist(), labels, self.month_days[mask].tolist(),
+                hours(self.month_worked), hours(self.month_expected), hours(self.month_overtime),
+                hours(self.month_bank), self.month_incomplete[mask].tolist(),
+            )
+        ]
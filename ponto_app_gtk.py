@@ -2,29 +2,168 @@
 # Standard library imports
 import sys
 import argparse
+import importlib
+import threading
 from datetime import datetime
 
+# Local imports
+from ponto_profile import Profiler, profile_requested, add_profile_arguments
+
+# Start profiling before the toolkit imports so they are measured too
+PROFILER = Profiler() if __name__ == "__main__" and profile_requested() else None
+
 # Third-party imports
 import gi
 gi.require_version('Gtk', '3.0')
 from gi.repository import Gtk, GLib
 
-# Local imports
-from ponto_backend import PontoBackend
+from ponto_daemon import connect_backend
+from ponto_history import format_today, format_history, format_summary
+
+if PROFILER:
+    PROFILER.mark('imports')
+
+
+def load_app_indicator():
+    """Return the AppIndicator3 module (Ayatana or legacy), or None if neither is installed."""
+    for namespace in ('AyatanaAppIndicator3', 'AppIndicator3'):
+        try:
+            gi.require_version(namespace, '0.1')
+            return importlib.import_module(f"gi.repository.{namespace}")
+        except (ValueError, ImportError):
+            continue
+    return None
+
+
+class TrayIcon:
+    """Tray icon with a menu: an AppIndicator where available, else a Gtk.StatusIcon."""
+
+    def __init__(self, menu, on_activate):
+        self.menu = menu
+        self.status_icon = None
+        self.indicator = None
+        AppIndicator = load_app_indicator()
+        if AppIndicator is not None:
+            # Indicators only offer the menu, which has an "Abrir" item
+            self.indicator = AppIndicator.Indicator.new(
+                "ponto-app", "clock", AppIndicator.IndicatorCategory.APPLICATION_STATUS
+            )
+            self.indicator.set_status(AppIndicator.IndicatorStatus.ACTIVE)
+            self.indicator.set_menu(menu)
+        else:
+            self.status_icon = Gtk.StatusIcon.new_from_icon_name("clock")
+            self.status_icon.connect("activate", lambda icon: on_activate())
+            self.status_icon.connect("popup-menu", self.on_popup_menu)
+        self.set_tooltip("Ponto App")
+
+    def on_popup_menu(self, icon, button, activate_time):
+        self.menu.popup(None, None, Gtk.StatusIcon.position_menu, icon, button, activate_time)
+
+    def set_tooltip(self, text):
+        if self.indicator is not None:
+            self.indicator.set_title(text)
+        else:
+            self.status_icon.set_tooltip_text(text)
 
 
 class PontoAppGTK(Gtk.Application):
-    def __init__(self, auto_trigger=False):
+    def __init__(self, auto_trigger=False, tray=False):
         super().__init__(application_id="com.icarus.pontoapp")
         self.connect("activate", self.on_activate)
+        self.connect("shutdown", self.on_shutdown)
         self.auto_trigger = auto_trigger
+        self.pending_punch = None
+        self.cancel_event = None
+        
+        # In tray mode the backend stays warm and the window is built on
+        # demand and torn down when closed
+        self.tray = tray
+        self.tray_icon = None
+        self.window = None
+        self.clock_source = None
         
-        # Initialize backend
-        self.backend = PontoBackend()
+        # Use the backend daemon if one is running, else a local backend
+        self.backend = connect_backend()
+        if PROFILER:
+            PROFILER.mark('backend')
+            self.backend.profiler = PROFILER
 
     def on_activate(self, app):
+        if self.tray:
+            # Activating again (e.g. launching the app a second time) opens the window
+            if self.tray_icon is not None:
+                self.show_window()
+                return
+            self.create_tray_icon()
+            if PROFILER:
+                PROFILER.mark('window')
+                GLib.idle_add(PROFILER.finish)
+            GLib.idle_add(self.start_background_tasks)
+            if self.auto_trigger:
+                GLib.timeout_add(500, self.trigger_tray_punch)
+            return
+        
+        self.build_window()
+        if PROFILER:
+            PROFILER.mark('window')
+            # Startup ends once the main loop is idle with the window shown
+            GLib.idle_add(PROFILER.finish)
+        
+        # Start background work only once the window is up
+        GLib.idle_add(self.start_background_tasks)
+        
+        # Automatically trigger the clock button click if requested
+        if self.auto_trigger:
+            GLib.timeout_add(500, self.trigger_clock_button)
+
+    def create_tray_icon(self):
+        menu = Gtk.Menu()
+        for label, callback in (
+            ("Bater Ponto", self.trigger_tray_punch),
+            ("Abrir", self.show_window),
+            ("Configurações", self.show_settings_dialog),
+        ):
+            item = Gtk.MenuItem(label=label)
+            item.connect("activate", lambda item, callback=callback: callback())
+            menu.append(item)
+        menu.append(Gtk.SeparatorMenuItem())
+        quit_item = Gtk.MenuItem(label="Sair")
+        quit_item.connect("activate", lambda item: self.quit())
+        menu.append(quit_item)
+        menu.show_all()
+        
+        self.tray_icon = TrayIcon(menu, self.toggle_window)
+        # No window keeps the application running in tray mode
+        self.hold()
+
+    def toggle_window(self):
+        if self.window is not None and self.window.get_visible():
+            self.window.close()
+        else:
+            self.show_window()
+
+    def show_window(self):
+        if self.window is None:
+            self.build_window()
+        self.window.present()
+
+    def on_window_delete(self, window, event):
+        # Resident mode: hide now, destroy once no punch needs the window
+        window.hide()
+        self.release_window()
+        return True
+
+    def release_window(self):
+        """Tear down the main window once it is hidden and not running a punch."""
+        if self.window is None or self.window.get_visible() or self.pending_punch is not None:
+            return
+        window, self.window = self.window, None
+        self.time_label = self.clock_button = self.status_label = self.history_label = None
+        window.destroy()
+
+    def build_window(self):
         # Create the main window
-        self.window = Gtk.ApplicationWindow(application=app, title="Ponto App")
+        self.window = Gtk.ApplicationWindow(application=self, title="Ponto App")
         self.window.set_default_size(400, 300)
         self.window.set_position(Gtk.WindowPosition.CENTER)
         
@@ -42,6 +181,22 @@ class PontoAppGTK(Gtk.Application):
         settings_button.connect("clicked", self.on_settings_clicked)
         header.pack_end(settings_button)
         
+        # History button
+        history_button = Gtk.Button()
+        history_button.set_tooltip_text("Histórico")
+        history_icon = Gtk.Image.new_from_icon_name("document-open-recent-symbolic", Gtk.IconSize.BUTTON)
+        history_button.add(history_icon)
+        history_button.connect("clicked", self.on_history_clicked)
+        header.pack_end(history_button)
+        
+        # Month summary button
+        summary_button = Gtk.Button()
+        summary_button.set_tooltip_text("Resumo do mês")
+        summary_icon = Gtk.Image.new_from_icon_name("x-office-spreadsheet-symbolic", Gtk.IconSize.BUTTON)
+        summary_button.add(summary_icon)
+        summary_button.connect("clicked", self.on_summary_clicked)
+        header.pack_end(summary_button)
+        
         # Main container
         main_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=10)
         main_box.set_margin_top(20)
@@ -55,8 +210,11 @@ class PontoAppGTK(Gtk.Application):
         self.update_time()
         main_box.pack_start(self.time_label, False, False, 0)
         
-        # Update time every second
-        GLib.timeout_add_seconds(1, self.update_time)
+        # Update time every second while the window is mapped
+        self.window.connect("map", self.start_clock)
+        self.window.connect("unmap", self.stop_clock)
+        if self.tray:
+            self.window.connect("delete-event", self.on_window_delete)
         
         # Button to clock in/out
         self.clock_button = Gtk.Button(label="Bater Ponto")
@@ -68,12 +226,48 @@ class PontoAppGTK(Gtk.Application):
         self.status_label = Gtk.Label(label="")
         main_box.pack_start(self.status_label, False, False, 0)
         
+        # Today's punches, from the local history
+        self.history_label = Gtk.Label(label="")
+        main_box.pack_start(self.history_label, False, False, 0)
+        self.update_history()
+        
         # Show all widgets
         self.window.show_all()
-        
-        # Automatically trigger the clock button click if requested
-        if self.auto_trigger:
-            GLib.timeout_add(500, self.trigger_clock_button)
+
+    def start_background_tasks(self):
+        # Load the HTTP/crypto stack, prefetch the location and replay
+        # offline punches while the user looks at the window
+        self.backend.warm_up()
+        return False  # Run once
+
+    def on_shutdown(self, app):
+        self.backend.shutdown()
+
+    def start_clock(self, widget):
+        if self.clock_source is None:
+            self.update_time()
+            self.clock_source = GLib.timeout_add_seconds(1, self.update_time)
+
+    def stop_clock(self, widget):
+        if self.clock_source is not None:
+            GLib.source_remove(self.clock_source)
+            self.clock_source = None
+
+    def set_status(self, text):
+        # The window's status label, or the tray tooltip while there is no window
+        if self.window is not None:
+            self.status_label.set_text(text)
+        elif self.tray_icon is not None:
+            self.tray_icon.set_tooltip(text)
+
+    def set_clock_button_label(self, label):
+        if self.window is not None:
+            self.clock_button.set_label(label)
+
+    def update_history(self):
+        if self.window is None:
+            return
+        self.history_label.set_text(format_today(self.backend.todays_punches()))
 
     def update_time(self):
         now = datetime.now()
@@ -83,12 +277,21 @@ class PontoAppGTK(Gtk.Application):
         return True
 
     def on_clock_button_clicked(self, button):
-        if not self.backend.username or not self.backend.encrypted_password:
+        # While a punch is running the button cancels it
+        if self.pending_punch is not None:
+            self.cancel_event.set()
+            self.set_status("Cancelando...")
+            return
+        
+        if not self.backend.has_credentials():
             self.show_error_dialog("Configuração Necessária", 
                                   "Por favor, configure seu usuário e senha primeiro.")
             self.on_settings_clicked(None)
             return
         
+        # Connect, derive the key and log in while the user reads the dialog
+        self.backend.submit_prepare()
+        
         # Ask for confirmation before registering time
         confirm_dialog = Gtk.MessageDialog(
             transient_for=self.window,
@@ -103,23 +306,58 @@ class PontoAppGTK(Gtk.Application):
         
         # If user doesn't confirm, return without registering time
         if response != Gtk.ResponseType.YES:
+            self.backend.cancel_prepare()
             return
         
-        self.status_label.set_text("Registrando ponto...")
+        self.set_status("Registrando ponto...")
+        self.set_clock_button_label("Cancelar")
         
-        # Process UI events to update the status label
-        while Gtk.events_pending():
-            Gtk.main_iteration()
+        # Register time in a worker thread; results come back through GLib.idle_add
+        self.cancel_event = threading.Event()
+        self.pending_punch = self.backend.submit_register_time(
+            progress=lambda phase: GLib.idle_add(self.on_register_progress, phase),
+            cancel_event=self.cancel_event
+        )
+        self.pending_punch.add_done_callback(
+            lambda future: GLib.idle_add(self.on_register_done, future)
+        )
+
+    def on_register_progress(self, phase):
+        if self.pending_punch is not None and not self.cancel_event.is_set():
+            self.set_status(f"{phase.capitalize()}...")
+        return False  # Run once
+
+    def on_register_done(self, future):
+        self.pending_punch = None
+        self.set_clock_button_label("Bater Ponto")
         
-        # Register time using backend
-        success, message, current_time = self.backend.register_time()
+        try:
+            success, message, current_time = future.result()
+        except Exception as e:
+            success, message = False, f"Falha ao registrar ponto: {e}"
         
         if success:
             self.show_info_dialog("Sucesso", message)
-            self.status_label.set_text(f"Último registro: {current_time}")
+            self.set_status(f"Último registro: {current_time}")
+            self.update_history()
+        elif self.cancel_event.is_set():
+            self.set_status(message)
         else:
             self.show_error_dialog("Erro", message)
-            self.status_label.set_text("Falha ao registrar ponto.")
+            # Say so when the API is failing fast rather than just failing
+            self.set_status(self.backend.circuit_message() or "Falha ao registrar ponto.")
+        
+        # A resident window closed mid-punch can go now
+        if self.tray:
+            self.release_window()
+        return False  # Run once
+
+    def on_history_clicked(self, button):
+        self.show_info_dialog("Histórico", format_history(self.backend.punch_history()))
+
+    def on_summary_clicked(self, button):
+        success, summary = self.backend.month_summary()
+        self.show_info_dialog("Resumo do mês", format_summary(summary) if success else summary)
 
     def on_settings_clicked(self, button):
         self.show_settings_dialog()
@@ -175,7 +413,7 @@ class PontoAppGTK(Gtk.Application):
             
             # Update credentials using backend
             success, message = self.backend.update_credentials(new_username, new_password if new_password else None)
-            self.status_label.set_text(message)
+            self.set_status(message)
         
         dialog.destroy()
 
@@ -209,15 +447,27 @@ class PontoAppGTK(Gtk.Application):
             self.clock_button.clicked()
         return False  # Don't repeat this timeout
 
+    def trigger_tray_punch(self):
+        """Punch from the tray; a punch already running is shown, not cancelled"""
+        if self.pending_punch is not None:
+            self.show_window()
+        else:
+            self.on_clock_button_clicked(None)
+        return False  # Don't repeat this timeout
+
 
 def parse_arguments():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description='Ponto App - Aplicativo para registro de ponto')
     parser.add_argument('--auto', action='store_true', help='Iniciar com diálogo de confirmação de ponto')
+    parser.add_argument('--tray', action='store_true', help='Ficar na bandeja do sistema; a janela abre sob demanda')
+    add_profile_arguments(parser)
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_arguments()
-    app = PontoAppGTK(auto_trigger=args.auto)
+    if PROFILER:
+        PROFILER.top = args.profile_top
+    app = PontoAppGTK(auto_trigger=args.auto, tray=args.tray)
     app.run()
@@ -2,19 +2,29 @@
 # Standard library imports
 import sys
 import argparse
+import threading
 from datetime import datetime
 
+# Local imports
+from ponto_profile import Profiler, profile_requested, add_profile_arguments
+
+# Start profiling before the toolkit imports so they are measured too
+PROFILER = Profiler() if __name__ == "__main__" and profile_requested() else None
+
 # Third-party imports
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QHBoxLayout, QWidget, 
     QPushButton, QLabel, QDialog, QLineEdit, QMessageBox, 
-    QDialogButtonBox, QFormLayout
+    QDialogButtonBox, QFormLayout, QSystemTrayIcon, QMenu, QStyle
 )
-from PyQt6.QtCore import QTimer, Qt
+from PyQt6.QtCore import QObject, QTimer, Qt, pyqtSignal
 from PyQt6.QtGui import QIcon
 
-# Local imports
-from ponto_backend import PontoBackend
+from ponto_daemon import connect_backend
+from ponto_history import format_today, format_history, format_summary
+
+if PROFILER:
+    PROFILER.mark('imports')
 
 
 class SettingsDialog(QDialog):
@@ -47,17 +57,60 @@ class SettingsDialog(QDialog):
         layout.addRow(self.button_box)
 
 
+def edit_credentials(parent, backend):
+    """Run the settings dialog; return the resulting status message, or None if cancelled."""
+    dialog = SettingsDialog(parent, backend.username)
+    try:
+        if not dialog.exec():
+            return None
+        new_username = dialog.username_entry.text()
+        new_password = dialog.password_entry.text()
+        
+        # Update credentials using backend
+        success, message = backend.update_credentials(new_username, new_password if new_password else None)
+        return message
+    finally:
+        # Built on demand, not kept around with its parent
+        dialog.deleteLater()
+
+
+def app_icon(name="clock"):
+    """Return a themed icon, falling back to a built-in one (tray icons must not be empty)."""
+    return QIcon.fromTheme(name, QApplication.style().standardIcon(QStyle.StandardPixmap.SP_ComputerIcon))
+
+
 class PontoAppPyQt(QMainWindow):
-    def __init__(self, auto_trigger=False):
+    # Emitted from the worker thread, delivered on the UI thread
+    register_progress = pyqtSignal(str)
+    register_finished = pyqtSignal(bool, str, str)
+    # Emitted when a resident (tray) window has been closed
+    closed = pyqtSignal()
+
+    def __init__(self, auto_trigger=False, backend=None):
         super().__init__()
         self.auto_trigger = auto_trigger
+        self.pending_punch = None
+        self.cancel_event = None
+        self.register_progress.connect(self.on_register_progress)
+        self.register_finished.connect(self.on_register_done)
+        
+        # In tray mode the window borrows the tray's warm backend and is
+        # torn down when closed
+        self.resident = backend is not None
         
-        # Initialize backend
-        self.backend = PontoBackend()
+        # Use the backend daemon if one is running, else a local backend
+        self.backend = backend or connect_backend()
+        if PROFILER and not self.resident:
+            PROFILER.mark('backend')
+            self.backend.profiler = PROFILER
         
         # Setup UI
         self.init_ui()
         
+        # Start background work only once the window is up
+        if not self.resident:
+            QTimer.singleShot(0, self.start_background_tasks)
+        
         # Trigger clock button if auto_trigger is True
         if self.auto_trigger:
             QTimer.singleShot(500, self.trigger_clock_button)
@@ -66,7 +119,7 @@ class PontoAppPyQt(QMainWindow):
         # Set window properties
         self.setWindowTitle("Ponto App")
         self.resize(400, 300)
-        self.setWindowIcon(QIcon.fromTheme("clock"))
+        self.setWindowIcon(app_icon())
         
         # Create central widget and main layout
         central_widget = QWidget()
@@ -80,16 +133,21 @@ class PontoAppPyQt(QMainWindow):
         settings_action = toolbar.addAction("Settings")
         settings_action.setIcon(QIcon.fromTheme("preferences-system"))
         settings_action.triggered.connect(self.on_settings_clicked)
+        history_action = toolbar.addAction("Histórico")
+        history_action.setIcon(QIcon.fromTheme("document-open-recent"))
+        history_action.triggered.connect(self.on_history_clicked)
+        summary_action = toolbar.addAction("Resumo")
+        summary_action.setIcon(QIcon.fromTheme("x-office-spreadsheet"))
+        summary_action.triggered.connect(self.on_summary_clicked)
         
         # Current time label
         self.time_label = QLabel()
         self.update_time()
         main_layout.addWidget(self.time_label, alignment=Qt.AlignmentFlag.AlignCenter)
         
-        # Update time every second
+        # Update time every second while the window is visible
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_time)
-        self.timer.start(1000)
         
         # Button to clock in/out
         self.clock_button = QPushButton("Bater Ponto")
@@ -101,9 +159,32 @@ class PontoAppPyQt(QMainWindow):
         self.status_label = QLabel("")
         main_layout.addWidget(self.status_label, alignment=Qt.AlignmentFlag.AlignCenter)
         
+        # Today's punches, from the local history
+        self.history_label = QLabel("")
+        main_layout.addWidget(self.history_label, alignment=Qt.AlignmentFlag.AlignCenter)
+        self.update_history()
+        
         # Show the window
         self.show()
 
+    def start_background_tasks(self):
+        # Load the HTTP/crypto stack, prefetch the location and replay
+        # offline punches while the user looks at the window
+        self.backend.warm_up()
+
+    def showEvent(self, event):
+        # Redraw the clock right away; it only ticks while it can be seen
+        self.update_time()
+        self.timer.start(1000)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def update_history(self):
+        self.history_label.setText(format_today(self.backend.todays_punches()))
+
     def update_time(self):
         now = datetime.now()
         time_str = now.strftime("%H:%M:%S")
@@ -112,12 +193,21 @@ class PontoAppPyQt(QMainWindow):
         return True
 
     def on_clock_button_clicked(self):
-        if not self.backend.username or not self.backend.encrypted_password:
+        # While a punch is running the button cancels it
+        if self.pending_punch is not None:
+            self.cancel_event.set()
+            self.status_label.setText("Cancelando...")
+            return
+        
+        if not self.backend.has_credentials():
             self.show_error_dialog("Configuração Necessária", 
                                   "Por favor, configure seu usuário e senha primeiro.")
             self.on_settings_clicked()
             return
         
+        # Connect, derive the key and log in while the user reads the dialog
+        self.backend.submit_prepare()
+        
         # Ask for confirmation before registering time
         confirm_response = QMessageBox.question(
             self, 
@@ -128,32 +218,70 @@ class PontoAppPyQt(QMainWindow):
         
         # If user doesn't confirm, return without registering time
         if confirm_response != QMessageBox.StandardButton.Yes:
+            self.backend.cancel_prepare()
             return
         
         self.status_label.setText("Registrando ponto...")
-        QApplication.processEvents()
+        self.clock_button.setText("Cancelar")
         
-        # Register time using backend
-        success, message, current_time = self.backend.register_time()
+        # Register time in a worker thread; results come back through Qt signals
+        self.cancel_event = threading.Event()
+        self.pending_punch = self.backend.submit_register_time(
+            progress=self.register_progress.emit,
+            cancel_event=self.cancel_event
+        )
+        self.pending_punch.add_done_callback(self.emit_register_finished)
+
+    def emit_register_finished(self, future):
+        try:
+            success, message, current_time = future.result()
+        except Exception as e:
+            success, message, current_time = False, f"Falha ao registrar ponto: {e}", ""
+        self.register_finished.emit(success, message, current_time)
+
+    def on_register_progress(self, phase):
+        if self.pending_punch is not None and not self.cancel_event.is_set():
+            self.status_label.setText(f"{phase.capitalize()}...")
+
+    def on_register_done(self, success, message, current_time):
+        self.pending_punch = None
+        self.clock_button.setText("Bater Ponto")
         
         if success:
             self.show_info_dialog("Sucesso", message)
             self.status_label.setText(f"Último registro: {current_time}")
+            self.update_history()
+        elif self.cancel_event.is_set():
+            self.status_label.setText(message)
         else:
             self.show_error_dialog("Erro", message)
-            self.status_label.setText("Falha ao registrar ponto.")
+            # Say so when the API is failing fast rather than just failing
+            self.status_label.setText(self.backend.circuit_message() or "Falha ao registrar ponto.")
+        
+        # A resident window closed mid-punch can go now
+        if self.resident and not self.isVisible():
+            self.closed.emit()
 
     def on_settings_clicked(self):
-        dialog = SettingsDialog(self, self.backend.username)
-        if dialog.exec():
-            new_username = dialog.username_entry.text()
-            new_password = dialog.password_entry.text()
-            
-            # Update credentials using backend
-            success, message = self.backend.update_credentials(new_username, new_password if new_password else None)
-            
+        message = edit_credentials(self, self.backend)
+        if message is not None:
             self.status_label.setText(message)
 
+    def on_history_clicked(self):
+        self.show_info_dialog("Histórico", format_history(self.backend.punch_history()))
+
+    def on_summary_clicked(self):
+        success, summary = self.backend.month_summary()
+        self.show_info_dialog("Resumo do mês", format_summary(summary) if success else summary)
+
+    def closeEvent(self, event):
+        super().closeEvent(event)
+        if self.resident:
+            # The tray keeps the backend; tell it once the window is hidden
+            QTimer.singleShot(0, self.closed.emit)
+        else:
+            self.backend.shutdown()
+
     def show_error_dialog(self, title, message):
         QMessageBox.critical(self, title, message)
 
@@ -166,15 +294,175 @@ class PontoAppPyQt(QMainWindow):
             self.clock_button.click()
 
 
+class PontoTray(QObject):
+    """Resident mode: a warm backend and a tray icon, with windows built on demand."""
+
+    # Emitted from the worker thread, delivered on the UI thread
+    register_progress = pyqtSignal(str)
+    register_finished = pyqtSignal(bool, str, str)
+
+    def __init__(self):
+        super().__init__()
+        self.window = None
+        self.pending_punch = None
+        self.register_progress.connect(self.on_register_progress)
+        self.register_finished.connect(self.on_register_done)
+        
+        # Use the backend daemon if one is running, else a local backend
+        self.backend = connect_backend()
+        if PROFILER:
+            PROFILER.mark('backend')
+            self.backend.profiler = PROFILER
+        
+        # Tray menu
+        self.menu = QMenu()
+        punch_action = self.menu.addAction("Bater Ponto")
+        punch_action.triggered.connect(self.on_punch)
+        open_action = self.menu.addAction("Abrir")
+        open_action.triggered.connect(self.show_window)
+        settings_action = self.menu.addAction("Configurações")
+        settings_action.triggered.connect(self.on_settings)
+        self.menu.addSeparator()
+        quit_action = self.menu.addAction("Sair")
+        quit_action.triggered.connect(self.on_quit)
+        
+        self.icon = QSystemTrayIcon(app_icon(), self)
+        self.icon.setToolTip("Ponto App")
+        self.icon.setContextMenu(self.menu)
+        self.icon.activated.connect(self.on_activated)
+        self.icon.show()
+        
+        # Warm the backend once the event loop runs
+        QTimer.singleShot(0, self.backend.warm_up)
+
+    def on_activated(self, reason):
+        # A click on the icon toggles the window
+        if reason != QSystemTrayIcon.ActivationReason.Trigger:
+            return
+        if self.window is not None and self.window.isVisible():
+            self.window.close()
+        else:
+            self.show_window()
+
+    def show_window(self):
+        if self.window is None:
+            self.window = PontoAppPyQt(backend=self.backend)
+            self.window.closed.connect(self.release_window)
+        self.window.showNormal()
+        self.window.raise_()
+        self.window.activateWindow()
+
+    def release_window(self):
+        """Tear down the main window once it is hidden and not running a punch."""
+        window = self.window
+        if window is None or window.isVisible() or window.pending_punch is not None:
+            return
+        self.window = None
+        window.deleteLater()
+
+    def on_punch(self):
+        # With the window open, punch there so progress and cancelling show up
+        if self.window is not None:
+            self.show_window()
+            if self.window.pending_punch is None:
+                self.window.trigger_clock_button()
+            return
+        if self.pending_punch is not None:
+            return
+        
+        if not self.backend.has_credentials():
+            QMessageBox.critical(None, "Configuração Necessária",
+                                 "Por favor, configure seu usuário e senha primeiro.")
+            self.on_settings()
+            return
+        
+        # Connect, derive the key and log in while the user reads the dialog
+        self.backend.submit_prepare()
+        
+        confirm_response = QMessageBox.question(
+            None,
+            "Confirmação",
+            "Bater ponto agora?",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if confirm_response != QMessageBox.StandardButton.Yes:
+            self.backend.cancel_prepare()
+            return
+        
+        self.icon.setToolTip("Registrando ponto...")
+        self.pending_punch = self.backend.submit_register_time(progress=self.register_progress.emit)
+        self.pending_punch.add_done_callback(self.emit_register_finished)
+
+    def emit_register_finished(self, future):
+        try:
+            success, message, current_time = future.result()
+        except Exception as e:
+            success, message, current_time = False, f"Falha ao registrar ponto: {e}", ""
+        self.register_finished.emit(success, message, current_time)
+
+    def on_register_progress(self, phase):
+        if self.pending_punch is not None:
+            self.icon.setToolTip(f"{phase.capitalize()}...")
+
+    def on_register_done(self, success, message, current_time):
+        self.pending_punch = None
+        if success:
+            self.icon.setToolTip(f"Último registro: {current_time}")
+            self.notify("Sucesso", message, QSystemTrayIcon.MessageIcon.Information)
+        else:
+            self.icon.setToolTip(self.backend.circuit_message() or "Falha ao registrar ponto.")
+            self.notify("Erro", message, QSystemTrayIcon.MessageIcon.Critical)
+
+    def notify(self, title, message, icon):
+        # Balloon messages where the tray supports them, dialogs elsewhere
+        if self.icon.supportsMessages():
+            self.icon.showMessage(title, message, icon)
+        elif icon == QSystemTrayIcon.MessageIcon.Critical:
+            QMessageBox.critical(None, title, message)
+        else:
+            QMessageBox.information(None, title, message)
+
+    def on_settings(self):
+        if self.window is not None:
+            self.show_window()
+            self.window.on_settings_clicked()
+            return
+        message = edit_credentials(None, self.backend)
+        if message is not None:
+            self.icon.setToolTip(message)
+
+    def on_quit(self):
+        self.icon.hide()
+        self.backend.shutdown()
+        QApplication.quit()
+
+
 def parse_arguments():
     """Parse command line arguments"""
     parser = argparse.ArgumentParser(description='Ponto App - Aplicativo para registro de ponto')
     parser.add_argument('--auto', action='store_true', help='Iniciar com diálogo de confirmação de ponto')
+    parser.add_argument('--tray', action='store_true', help='Ficar na bandeja do sistema; a janela abre sob demanda')
+    add_profile_arguments(parser)
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = parse_arguments()
+    if PROFILER:
+        PROFILER.top = args.profile_top
     app = QApplication(sys.argv)
-    window = PontoAppPyQt(auto_trigger=args.auto)
+    if args.tray and QSystemTrayIcon.isSystemTrayAvailable():
+        # Closing the window leaves the app in the tray
+        app.setQuitOnLastWindowClosed(False)
+        resident = PontoTray()
+        if args.auto:
+            QTimer.singleShot(500, resident.on_punch)
+    else:
+        if args.tray:
+            print("Bandeja do sistema indisponível; abrindo a janela.", file=sys.stderr)
+        window = PontoAppPyQt(auto_trigger=args.auto)
+    if PROFILER:
+        PROFILER.mark('window')
+        # Startup ends once the event loop has shown the window
+        QTimer.singleShot(0, PROFILER.finish)
     sys.exit(app.exec())
@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+"""asyncio API for the Ponto App backend.
+
+AsyncPontoBackend has awaitable ``login``, ``locate`` and
+``register_time`` methods. It keeps the config directory, encrypted
+credentials, token cache, journal and history of a PontoBackend (it
+wraps one for those) and does its network I/O through AsyncHttpClient, a
+small keep-alive HTTP/1.1 client on asyncio streams. One client can be
+shared by many backends (e.g. one per profile), so thousands of punches
+run concurrently on a single thread over a bounded connection pool.
+
+GLibLoopDriver and QtLoopDriver run that asyncio loop on a background
+thread for the GTK and Qt front-ends: coroutines are submitted from UI
+callbacks and their results come back on the GUI thread, through
+GLib.idle_add or a queued Qt signal.
+"""
+# Standard library imports
+import ssl
+import json
+import time
+import asyncio
+import weakref
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit, urlencode
+
+# Local imports
+from ponto_breaker import CircuitBreakers, CircuitOpenError
+from ponto_backend import (
+    PontoBackend, PhaseTimer, LocationResult,
+    API_BASE_URL, LOGIN_PATH, REGISTER_PATH, DEFAULT_LOCATION,
+    CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES, RETRY_BACKOFF, RETRY_STATUS_CODES,
+    STATUS_SENT, STATUS_FAILED, STATUS_OFFLINE, STATUS_UNKNOWN, STATUS_CANCELLED,
+)
+
+# Service used by geocoder.ip('me')
+IP_LOCATION_URL = "https://ipinfo.io/json"
+
+# Maximum idle keep-alive connections kept per host
+DEFAULT_POOL_SIZE = 100
+
+
+class HttpError(OSError):
+    """Network failure talking to the API."""
+
+
+class ConnectError(HttpError):
+    """The connection could not be opened; nothing was sent."""
+
+
+class ReadTimeout(HttpError):
+    """No complete response within the read timeout."""
+
+
+class _StaleConnection(Exception):
+    """The server closed a keep-alive connection under a request.
+
+    ``sent`` is False when writing the request failed, so it never reached
+    the server; otherwise it may have been received and acted upon.
+    """
+
+    def __init__(self, sent=True):
+        super().__init__()
+        self.sent = sent
+
+
+class AsyncResponse:
+    """Minimal response object with the parts of requests.Response we use."""
+
+    def __init__(self, status_code, headers, content):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class AsyncHttpClient:
+    """Keep-alive HTTP/1.1 client with a bounded connection pool.
+
+    Follows the retry policy of ApiTransport: connection failures are
+    retried, read errors and gateway status codes only for idempotent
+    calls, and each endpoint has a circuit breaker with an adaptive read
+    timeout. Use one client per event loop.
+    """
+
+    def __init__(self, base_url=API_BASE_URL, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES,
+                 backoff=RETRY_BACKOFF, pool_size=DEFAULT_POOL_SIZE):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.connections_opened = 0
+        self.breakers = CircuitBreakers()
+        self._idle = {}
+        self._slots = None
+        self._ssl_context = None
+
+    async def request(self, method, path, idempotent=False, json_body=None, params=None, headers=None):
+        """Send a request to base_url + path (or an absolute URL) and return an AsyncResponse."""
+        url = path if path.startswith(('http://', 'https://')) else f"{self.base_url}{path}"
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+        parts = urlsplit(url)
+        scheme = parts.scheme
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+
+        body = b""
+        request_headers = {
+            'Host': parts.netloc,
+            'User-Agent': "pyIcarus",
+            'Accept': "*/*",
+            'Accept-Encoding': "identity",
+            'Connection': "keep-alive",
+        }
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            request_headers['Content-Type'] = "application/json"
+        request_headers.update(headers or {})
+        if body or method in ('POST', 'PUT', 'PATCH'):
+            request_headers['Content-Length'] = str(len(body))
+        target = parts.path or "/"
+        if parts.query:
+            target = f"{target}?{parts.query}"
+        head = f"{method} {target} HTTP/1.1\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in request_headers.items()
+        ) + "\r\n"
+        data = head.encode('latin-1') + body
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        breaker = self.breakers.get(method, path.split('?')[0]) if self.breakers is not None else None
+        read_timeout = breaker.timeout(self.read_timeout) if breaker is not None else self.read_timeout
+        attempts = self.max_retries + 1 if idempotent else 1
+        async with self._slots:
+            for attempt in range(attempts):
+                last_attempt = attempt == attempts - 1
+                if breaker is not None:
+                    breaker.before_call(self.connect_timeout + self.read_timeout)
+                start = time.perf_counter()
+                try:
+                    response = await self._send(key, data, method, read_timeout, idempotent)
+                except HttpError as e:
+                    if breaker is not None:
+                        breaker.record_failure()
+                    if last_attempt or isinstance(e, ConnectError):
+                        raise
+                else:
+                    if breaker is not None:
+                        if response.status_code >= 500:
+                            breaker.record_failure()
+                        else:
+                            breaker.record_success(time.perf_counter() - start)
+                    if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                        return response
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    def circuits(self):
+        """Return a snapshot of every endpoint's circuit breaker."""
+        if self.breakers is None:
+            return []
+        return self.breakers.snapshots(self.read_timeout)
+
+    async def _send(self, key, data, method, read_timeout, idempotent=False):
+        while True:
+            (reader, writer), reused = await self._acquire(key)
+            try:
+                try:
+                    writer.write(data)
+                    await writer.drain()
+                except (ConnectionResetError, BrokenPipeError):
+                    raise _StaleConnection(sent=False)
+                status, headers, content, keep_alive = await asyncio.wait_for(
+                    self._read_response(reader, method), read_timeout
+                )
+            except _StaleConnection as e:
+                writer.close()
+                # A pooled connection may have been closed while idle. Send
+                # again on a fresh one, unless the server may already have
+                # acted on a request that isn't idempotent (a punch).
+                if reused and (not e.sent or idempotent):
+                    continue
+                raise HttpError("Conexão encerrada pelo servidor")
+            except asyncio.TimeoutError:
+                writer.close()
+                raise ReadTimeout(f"Sem resposta em {read_timeout:.1f} s")
+            except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+                writer.close()
+                raise HttpError(str(e)) from e
+            if keep_alive and len(self._idle.get(key, ())) < self.pool_size:
+                self._idle.setdefault(key, []).append((reader, writer))
+            else:
+                writer.close()
+            return AsyncResponse(status, headers, content)
+
+    async def _acquire(self, key):
+        """Return ((reader, writer), reused) from the pool or a new connection."""
+        idle = self._idle.get(key)
+        while idle:
+            reader, writer = idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return (reader, writer), True
+            writer.close()
+        return await self._open(key), False
+
+    async def _open(self, key):
+        scheme, host, port = key
+        context = None
+        if scheme == 'https':
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            context = self._ssl_context
+        for attempt in range(self.max_retries + 1):
+            try:
+                connection = await asyncio.wait_for(
+                    asyncio.open_connection(host, port, ssl=context), self.connect_timeout
+                )
+                self.connections_opened += 1
+                return connection
+            except (OSError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise ConnectError(f"Falha ao conectar a {host}:{port}: {e}") from e
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+
+    @staticmethod
+    async def _read_response(reader, method):
+        status_line = await reader.readline()
+        if not status_line:
+            raise _StaleConnection()
+        version, status = status_line.decode('latin-1').split(None, 2)[:2]
+        status = int(status)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = version == "HTTP/1.1" and headers.get('connection', "").lower() != "close"
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            content = b""
+        elif 'chunked' in headers.get('transfer-encoding', "").lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if size == 0:
+                    # Skip trailers
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            content = b"".join(chunks)
+        elif 'content-length' in headers:
+            content = await reader.readexactly(int(headers['content-length']))
+        else:
+            content = await reader.read()
+            keep_alive = False
+        return status, headers, content, keep_alive
+
+    async def close(self):
+        """Close every pooled connection."""
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+
+# Location lookups in flight, per LocationProvider, so concurrent misses share one
+_pending_lookups = weakref.WeakKeyDictionary()
+
+
+class AsyncPontoBackend:
+    """Awaitable counterpart of PontoBackend.
+
+    Wraps a PontoBackend for configuration, encryption, token cache,
+    journal, history and metrics; ``client`` may be shared between many
+    instances on the same event loop.
+    """
+
+    def __init__(self, config_dir=None, client=None, backend=None, base_url=None, location_provider=None):
+        self.backend = backend or PontoBackend(config_dir, location_provider=location_provider, base_url=base_url)
+        transport = self.backend.transport
+        self.owns_client = client is None
+        self.client = client or AsyncHttpClient(
+            transport.base_url, transport.connect_timeout, transport.read_timeout,
+            transport.max_retries, transport.backoff,
+        )
+        self._inflight = None
+        self._last_result = None
+        self._last_finished = 0.0
+
+    @property
+    def username(self):
+        return self.backend.username
+
+    def has_credentials(self):
+        return self.backend.has_credentials()
+
+    async def ensure_key(self):
+        """Derive the Fernet key off the loop; PBKDF2 takes tens of milliseconds."""
+        backend = self.backend
+        if not backend.key_cache.is_cached(backend.secret_key, backend.salt):
+            await asyncio.get_running_loop().run_in_executor(
+                None, backend.key_cache.get_fernet, backend.secret_key, backend.salt
+            )
+
+    async def decrypt_password(self):
+        await self.ensure_key()
+        return self.backend.decrypt_password()
+
+    async def login(self, timer=None):
+        """Log in and return (True, auth) or (False, message), like PontoBackend.login."""
+        timer = timer or PhaseTimer()
+        with timer.span('decrypt'):
+            success, password = await self.decrypt_password()
+        if not success:
+            return False, password
+        with timer.span('login'):
+            response = await self.client.request(
+                'POST', LOGIN_PATH, idempotent=True,
+                json_body={"username": self.backend.username, "password": password},
+            )
+        return self.backend.parse_login_response(response)
+
+    async def get_auth(self, timer=None):
+        """Return (success, auth, cached), reusing a valid cached token if possible."""
+        # The token cache is encrypted with the same key
+        await self.ensure_key()
+        auth = self.backend.token_cache.get(self.backend.username)
+        if auth:
+            return True, auth, True
+        success, result = await self.login(timer)
+        return success, result, False
+
+    async def locate(self):
+        """Return a LocationResult, resolving over the network only on a miss."""
+        provider = self.backend.location_provider
+        entry = provider.cached()
+        if provider.is_fresh(entry):
+            return provider.get()
+        if provider.lookup is not None:
+            # Custom lookups are blocking callables
+            return await asyncio.get_running_loop().run_in_executor(None, provider.get)
+
+        pending = _pending_lookups.get(provider)
+        if pending is None or pending.done():
+            pending = asyncio.ensure_future(self._lookup_ip(provider))
+            _pending_lookups[provider] = pending
+        provider.misses += 1
+        if await asyncio.shield(pending):
+            entry = provider.cached()
+            return LocationResult(entry['latitude'], entry['longitude'], 'network', False, 0.0, False)
+        if entry:
+            age = time.time() - entry['resolved_at']
+            return LocationResult(entry['latitude'], entry['longitude'], 'stale', False, age, True)
+        latitude, longitude = DEFAULT_LOCATION
+        return LocationResult(latitude, longitude, 'default', False, None, True)
+
+    async def _lookup_ip(self, provider):
+        try:
+            response = await self.client.request('GET', IP_LOCATION_URL, idempotent=True)
+            latitude, longitude = (float(part) for part in response.json()['loc'].split(','))
+        except Exception:
+            return False
+        provider.update(latitude, longitude)
+        return True
+
+    async def register_time(self, progress=None):
+        """Punch and return a PunchResult, like PontoBackend.register_time.
+
+        Concurrent calls share one attempt, and a successful punch is
+        shared for ``punch_window`` seconds, also with other processes
+        through PontoBackend's single-flight state file (the cross-process
+        lock is not taken, since it would block the loop). Cancelling the
+        task aborts the punch if the register call has not been sent yet.
+        """
+        if self._inflight is not None and not self._inflight.done():
+            return await asyncio.shield(self._inflight)
+        single_flight = self.backend.single_flight
+        if self._last_result is not None and time.monotonic() - self._last_finished < single_flight.window:
+            return self._last_result
+        shared = single_flight.recent()
+        if shared is not None:
+            return shared
+
+        self._inflight = asyncio.ensure_future(self.punch(progress))
+        result = await self._inflight
+        if result.status == STATUS_SENT:
+            self._last_result = result
+            self._last_finished = time.monotonic()
+            single_flight.remember(result)
+        return result
+
+    async def punch(self, progress=None):
+        """Journal, send and record one punch."""
+        backend = self.backend
+        loop = asyncio.get_running_loop()
+        timer = PhaseTimer()
+        # Journal, history and metrics writes hit the disk; keep them off the loop
+        punched_at, entry_id = await loop.run_in_executor(None, backend.begin_punch, timer)
+        delivery = {'status': STATUS_FAILED}
+        try:
+            success, message, current_time = await self.send_punch(progress, delivery, timer)
+        except asyncio.CancelledError:
+            if delivery['status'] != STATUS_UNKNOWN:
+                delivery['status'] = STATUS_CANCELLED
+            backend.finish_punch(punched_at, entry_id, False, "Registro cancelado",
+                                 datetime.now().strftime("%H:%M:%S"), delivery, timer)
+            raise
+        return await loop.run_in_executor(
+            None, backend.finish_punch, punched_at, entry_id, success, message, current_time, delivery, timer
+        )
+
+    async def send_punch(self, progress, delivery, timer, location=None):
+        """Log in if needed, resolve the location and send the punch (see PontoBackend.send_punch)."""
+        backend = self.backend
+        current_time = datetime.now().strftime("%H:%M:%S")
+        locating = None
+        try:
+            if progress:
+                progress("autenticando")
+            # The location doesn't depend on the login: resolve it meanwhile
+            if location is None:
+                locating = asyncio.ensure_future(self.locate())
+            success, auth, cached = await self.get_auth(timer)
+            if not success:
+                return False, auth, current_time
+
+            if progress:
+                progress("localizando")
+            if location is None:
+                with timer.span('geolocation'):
+                    location = await locating
+                backend.last_location = location
+            latitude, longitude = location[0], location[1]
+            delivery['latitude'], delivery['longitude'] = latitude, longitude
+
+            if progress:
+                progress("registrando")
+            register_data, headers = backend.register_request(auth['id_mutuario'], auth['token'], latitude, longitude)
+            delivery['status'] = STATUS_UNKNOWN
+            with timer.span('register'):
+                response = await self.client.request('POST', REGISTER_PATH, json_body=register_data, headers=headers)
+
+            # A cached token may have been revoked; a 401 means nothing was recorded
+            if response.status_code == 401 and cached:
+                backend.token_cache.invalidate()
+                delivery['status'] = STATUS_FAILED
+                success, auth = await self.login(timer)
+                if not success:
+                    return False, auth, current_time
+                register_data, headers = backend.register_request(auth['id_mutuario'], auth['token'], latitude, longitude)
+                delivery['status'] = STATUS_UNKNOWN
+                with timer.span('register'):
+                    response = await self.client.request('POST', REGISTER_PATH, json_body=register_data, headers=headers)
+
+            success, message = backend.parse_register_response(response)
+            delivery['status'] = STATUS_SENT if success else STATUS_FAILED
+            return success, message, current_time
+
+        except CircuitOpenError:
+            # Failed fast: nothing was sent
+            delivery['status'] = STATUS_OFFLINE
+            return False, "Servidor indisponível", datetime.now().strftime("%H:%M:%S")
+        except HttpError as e:
+            # Failing to connect means nothing reached the server
+            if delivery['status'] != STATUS_UNKNOWN or isinstance(e, ConnectError):
+                delivery['status'] = STATUS_OFFLINE
+            if isinstance(e, ReadTimeout):
+                return False, "Tempo esgotado ao comunicar com o servidor", datetime.now().strftime("%H:%M:%S")
+            return False, "Sem conexão com o servidor", datetime.now().strftime("%H:%M:%S")
+        except Exception as e:
+            return False, f"Falha ao registrar ponto: {e}", datetime.now().strftime("%H:%M:%S")
+        finally:
+            if locating is not None and not locating.done():
+                locating.cancel()
+
+    async def close(self):
+        if self.owns_client:
+            await self.client.close()
+
+
+class LoopDriver:
+    """Runs an asyncio event loop on its own thread for a GUI main loop.
+
+    Only public asyncio APIs cross threads: coroutines are handed to the
+    loop with run_coroutine_threadsafe and stopped with
+    call_soon_threadsafe. Subclasses implement ``deliver`` to run a
+    callback on the GUI thread.
+    """
+
+    def __init__(self, loop=None):
+        self.loop = loop or asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name="ponto-asyncio", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def submit(self, coroutine, callback=None):
+        """Start a coroutine on the loop and return its concurrent.futures.Future.
+
+        callback, if given, is called with the finished future on the GUI
+        thread.
+        """
+        future = asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+        if callback:
+            future.add_done_callback(lambda done: self.deliver(callback, done))
+        return future
+
+    def deliver(self, callback, future):
+        """Call callback(future) on the GUI thread."""
+        raise NotImplementedError
+
+    async def _cancel_tasks(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self, timeout=5):
+        """Cancel what is still running, stop the loop and join its thread."""
+        if self.loop.is_closed():
+            return
+        if self._thread.is_alive():
+            try:
+                asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self.loop).result(timeout)
+            except Exception:
+                pass
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout)
+        if not self._thread.is_alive():
+            self.loop.close()
+
+
+class GLibLoopDriver(LoopDriver):
+    """Delivers results to the GLib main loop (GTK front-end)."""
+
+    def __init__(self, loop=None):
+        from gi.repository import GLib
+        self.GLib = GLib
+        super().__init__(loop)
+
+    def deliver(self, callback, future):
+        def call():
+            callback(future)
+            return False  # Run once
+        self.GLib.idle_add(call)
+
+
+class QtLoopDriver(LoopDriver):
+    """Delivers results to the Qt event loop (PyQt front-end).
+
+    Create it on the GUI thread: the signal is queued to the thread its
+    receiver lives in.
+    """
+
+    def __init__(self, loop=None):
+        from PyQt6.QtCore import Qt, QObject, pyqtSignal, pyqtSlot
+
+        class Receiver(QObject):
+            finished = pyqtSignal(object, object)
+
+            @pyqtSlot(object, object)
+            def run(self, callback, future):
+                callback(future)
+
+        self._receiver = Receiver()
+        self._receiver.finished.connect(self._receiver.run, Qt.ConnectionType.QueuedConnection)
+        super().__init__(loop)
+
+    def deliver(self, callback, future):
+        self._receiver.finished.emit(callback, future)
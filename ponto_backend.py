@@ -1,85 +1,891 @@
 #!/usr/bin/env python3
 # Standard library imports
 import os
+import sys
 import json
 import base64
+import hashlib
+import time
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
-# Third-party imports
-import requests
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-import geocoder
+# Third-party imports (requests, cryptography and geocoder) are deferred to
+# the code paths that need them, so the GUIs can show a window before
+# paying for them.
+
+# Local imports
+from ponto_journal import (
+    PunchJournal, JournalReplayer,
+    STATUS_SENT, STATUS_FAILED, STATUS_OFFLINE, STATUS_UNKNOWN, STATUS_CANCELLED,
+    STATUS_DUPLICATE,
+)
+from ponto_history import PunchHistory, HISTORY_LIMIT, parse_timestamp
+from ponto_singleflight import SingleFlight
+from ponto_breaker import CircuitBreakers, CircuitOpenError, format_circuits
+from ponto_profile import profiled
+from ponto_vault import PontoVault, VAULT_DIR, DEFAULT_PROFILE, atomic_write
+
+# Number of PBKDF2 iterations used to derive the Fernet key
+KDF_ITERATIONS = 100000
+
+# Fixed salt of the key that encrypted passwords in config.json, before the vault
+LEGACY_SALT = b'pontoapp_salt_123'
+# Secret of vaults that were never rotated
+DEFAULT_SECRET_KEY = "Dyn@"
+
+# Process-wide cache of derived Fernet instances, keyed by key fingerprint.
+# The global lock only guards the dicts: a key is derived under its own lock
+# in _fernet_key_locks, so other keys stay available meanwhile.
+_fernet_cache = {}
+_fernet_key_locks = {}
+_fernet_cache_lock = threading.Lock()
+
+# Process-wide PBKDF2 statistics: number of derivations and CPU seconds spent
+kdf_stats = {'derivations': 0, 'cpu_s': 0.0}
+_kdf_stats_lock = threading.Lock()
+
+# Icarus API
+API_BASE_URL = "https://backendicarus.pontoicarus.com.br"
+LOGIN_PATH = "/usuario/logar"
+REGISTER_PATH = "/ponto/bater"
+
+# HTTP transport defaults (seconds / attempts), overridable in config.json
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 20.0
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5
+RETRY_STATUS_CODES = (502, 503, 504)
+
+# Token cache: lifetime for tokens without an exp claim, and renewal margin (seconds)
+TOKEN_DEFAULT_TTL = 3600
+TOKEN_EXPIRY_MARGIN = 60
+
+# Punches within this many seconds of a successful one share its result
+PUNCH_WINDOW = 30
+PUNCH_LOCK_TIMEOUT = 60
+
+# Longest a punch waits for a prepare() still in flight (seconds)
+PREPARE_WAIT = 10
+
+# Location used when nothing has ever been resolved, and cache lifetime (seconds)
+DEFAULT_LOCATION = (-27.572293, -48.5095271)
+LOCATION_TTL = 6 * 3600
+
+# Offline lookups (configured sites, local IP database) cost microseconds,
+# so they are redone often enough to follow the user between networks
+OFFLINE_LOCATION_TTL = 60
+
+
+def default_config_dir():
+    """Return the per-user configuration directory."""
+    return os.path.join(str(Path.home()), ".config", "ponto_app")
+
 
 def get_current_location():
+    """Return (latitude, longitude) of the public IP address, or (None, None)."""
+    import geocoder
     g = geocoder.ip('me')
     if g.ok:
         return g.lat, g.lng
     return None, None
 
 
+class PhaseTimer:
+    """Collects monotonic-clock spans (in ms) for the phases of one punch."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = {}
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+class PunchResult(namedtuple('PunchResult', 'success message current_time')):
+    """Result of register_time.
+
+    Unpacks like the historical ``(success, message, current_time)`` tuple
+    and additionally carries the per-phase timings (``phases``, in ms),
+    the total duration, the journal delivery status and the location used.
+    """
+
+    def __new__(cls, success, message, current_time, phases=None, total_ms=0.0,
+                status=None, location=None):
+        result = super().__new__(cls, success, message, current_time)
+        result.phases = phases or {}
+        result.total_ms = total_ms
+        result.status = status
+        result.location = location
+        return result
+
+    def as_dict(self):
+        return {
+            'success': self.success,
+            'message': self.message,
+            'time': self.current_time,
+            'status': self.status,
+            'total_ms': round(self.total_ms, 3),
+            'phases': {name: round(value, 3) for name, value in self.phases.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild a result serialised with as_dict."""
+        return cls(data['success'], data['message'], data['time'], data.get('phases'),
+                   data.get('total_ms', 0.0), data.get('status'))
+
+
+class KeyCache:
+    """Derives the Fernet key once per process and reuses it.
+
+    The derived key can optionally be kept in the OS keyring (via the
+    ``keyring`` package) so that new processes skip PBKDF2 as well.
+    """
+
+    keyring_service = "ponto_app"
+
+    def __init__(self, iterations=KDF_ITERATIONS, use_keyring=False):
+        self.iterations = iterations
+        self.use_keyring = use_keyring
+
+    def fingerprint(self, secret_key, salt):
+        """Return a non-reversible identifier for a secret/salt pair."""
+        digest = hashlib.sha256()
+        digest.update(secret_key.encode())
+        digest.update(salt)
+        digest.update(str(self.iterations).encode())
+        return digest.hexdigest()[:32]
+
+    def derive_key(self, secret_key, salt):
+        """Run PBKDF2 and return the urlsafe base64 encoded key."""
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+        kdf = PBKDF2HMAC(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=salt,
+            iterations=self.iterations,
+        )
+        started = time.thread_time()
+        key = base64.urlsafe_b64encode(kdf.derive(secret_key.encode()))
+        with _kdf_stats_lock:
+            kdf_stats['derivations'] += 1
+            kdf_stats['cpu_s'] += time.thread_time() - started
+        return key
+
+    def get_fernet(self, secret_key, salt):
+        """Return a cached Fernet instance, deriving the key only on a miss.
+
+        Concurrent misses on the same key wait for a single derivation;
+        misses on different keys derive in parallel.
+        """
+        fingerprint = self.fingerprint(secret_key, salt)
+        with _fernet_cache_lock:
+            fernet = _fernet_cache.get(fingerprint)
+            if fernet is not None:
+                return fernet
+            key_lock = _fernet_key_locks.setdefault(fingerprint, threading.Lock())
+
+        with key_lock:
+            # Another thread may have derived it while we waited
+            with _fernet_cache_lock:
+                fernet = _fernet_cache.get(fingerprint)
+                if fernet is not None:
+                    return fernet
+
+            key = self._keyring_get(fingerprint)
+            if key is None:
+                key = self.derive_key(secret_key, salt)
+                self._keyring_set(fingerprint, key)
+
+            from cryptography.fernet import Fernet
+            fernet = Fernet(key)
+            with _fernet_cache_lock:
+                _fernet_cache[fingerprint] = fernet
+                _fernet_key_locks.pop(fingerprint, None)
+            return fernet
+
+    def is_cached(self, secret_key, salt):
+        """Return True if the key for secret_key/salt is already derived in this process."""
+        with _fernet_cache_lock:
+            return self.fingerprint(secret_key, salt) in _fernet_cache
+
+    def invalidate(self, secret_key=None, salt=None):
+        """Drop the cached key for a secret/salt pair, or every key if omitted."""
+        with _fernet_cache_lock:
+            if secret_key is None or salt is None:
+                fingerprints = list(_fernet_cache)
+                _fernet_cache.clear()
+            else:
+                fingerprint = self.fingerprint(secret_key, salt)
+                _fernet_cache.pop(fingerprint, None)
+                fingerprints = [fingerprint]
+        for fingerprint in fingerprints:
+            self._keyring_delete(fingerprint)
+
+    def _keyring_get(self, fingerprint):
+        if not self.use_keyring:
+            return None
+        try:
+            import keyring
+            key = keyring.get_password(self.keyring_service, fingerprint)
+            return key.encode() if key else None
+        except Exception:
+            return None
+
+    def _keyring_set(self, fingerprint, key):
+        if not self.use_keyring:
+            return
+        try:
+            import keyring
+            keyring.set_password(self.keyring_service, fingerprint, key.decode())
+        except Exception:
+            pass
+
+    def _keyring_delete(self, fingerprint):
+        if not self.use_keyring:
+            return
+        try:
+            import keyring
+            keyring.delete_password(self.keyring_service, fingerprint)
+        except Exception:
+            pass
+
+
+class SecretStore:
+    """Keeps a vault's secret in the OS keyring (via the ``keyring`` package).
+
+    The vault itself only records a key-check token, so the secret that
+    opens it lives outside the config directory. Each vault has an entry
+    for its current secret and, while a rotation runs, one for the
+    previous secret.
+    """
+
+    service = "ponto_app"
+
+    def __init__(self, vault_id):
+        self.vault_id = vault_id
+
+    def entry(self, previous=False):
+        return f"vault-secret{'-previous' if previous else ''}:{self.vault_id}"
+
+    def get(self, previous=False):
+        """Return the stored secret, or None if there is none or no keyring."""
+        try:
+            import keyring
+            return keyring.get_password(self.service, self.entry(previous))
+        except Exception:
+            return None
+
+    def set(self, secret, previous=False):
+        """Store secret; return True only if the keyring has kept it."""
+        try:
+            import keyring
+            keyring.set_password(self.service, self.entry(previous), secret)
+            return keyring.get_password(self.service, self.entry(previous)) == secret
+        except Exception:
+            return False
+
+    def delete(self, previous=False):
+        try:
+            import keyring
+            keyring.delete_password(self.service, self.entry(previous))
+        except Exception:
+            pass
+
+
+class ApiTransport:
+    """Long-lived, pooled HTTP transport for the Icarus API.
+
+    Connections are kept alive and shared between login and register.
+    Failures to connect are always retried, since the request never
+    reached the server. Read errors and gateway status codes are only
+    retried for idempotent calls, so a punch is never sent twice.
+
+    Each endpoint has a circuit breaker (see ponto_breaker): while the
+    API keeps failing, calls raise CircuitOpenError without being sent,
+    and read timeouts follow the observed latency. Set ``breakers`` to
+    None to disable them.
+    """
+
+    def __init__(self, base_url=API_BASE_URL, connect_timeout=CONNECT_TIMEOUT,
+                 read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES,
+                 backoff=RETRY_BACKOFF, pool_size=10):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.breakers = CircuitBreakers()
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """Return the shared session, creating it on first use."""
+        with self._lock:
+            if self._session is None:
+                self._session = self._create_session()
+            return self._session
+
+    def _create_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+        session = requests.Session()
+        # Only connection failures are retried at the adapter level
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=0,
+            other=0,
+            backoff_factor=self.backoff,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_size,
+            pool_maxsize=self.pool_size,
+            max_retries=retry,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @property
+    def timeout(self):
+        return (self.connect_timeout, self.read_timeout)
+
+    def url(self, path):
+        return f"{self.base_url}{path}"
+
+    def post(self, path, idempotent=False, **kwargs):
+        """POST to the API with timeouts and the retry policy applied."""
+        return self.request('POST', path, idempotent, **kwargs)
+
+    def get(self, path, **kwargs):
+        """GET from the API; reads are always safe to retry."""
+        return self.request('GET', path, True, **kwargs)
+
+    def request(self, method, path, idempotent=False, **kwargs):
+        import requests
+        breaker = self.breakers.get(method, path) if self.breakers is not None else None
+        if breaker is not None:
+            kwargs.setdefault('timeout', (self.connect_timeout, breaker.timeout(self.read_timeout)))
+        kwargs.setdefault('timeout', self.timeout)
+        attempts = self.max_retries + 1 if idempotent else 1
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            if breaker is not None:
+                # Fail fast, also between retries, once the circuit opens
+                breaker.before_call(self.connect_timeout + self.read_timeout)
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, self.url(path), **kwargs)
+            except (requests.exceptions.ReadTimeout, requests.exceptions.ChunkedEncodingError):
+                # Connection failures were already retried by the adapter
+                if breaker is not None:
+                    breaker.record_failure()
+                if last_attempt:
+                    raise
+            except (requests.ConnectionError, requests.Timeout):
+                if breaker is not None:
+                    breaker.record_failure()
+                raise
+            else:
+                if breaker is not None:
+                    if response.status_code >= 500:
+                        breaker.record_failure()
+                    else:
+                        breaker.record_success(time.perf_counter() - start)
+                if response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                    return response
+            time.sleep(self.backoff * (2 ** attempt))
+
+    def circuits(self):
+        """Return a snapshot of every endpoint's circuit breaker."""
+        if self.breakers is None:
+            return []
+        return self.breakers.snapshots(self.read_timeout)
+
+    def warm(self):
+        """Open a pooled connection (DNS, TCP and TLS) to the API host.
+
+        Goes straight to the session: whatever the host answers to the
+        probe says nothing about the API endpoints, so it is kept out of
+        the circuit breakers.
+        """
+        try:
+            self.session.head(self.url("/"), timeout=self.timeout, allow_redirects=False)
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def is_network_error(error):
+        """Return True if error is a requests connection or timeout error, or an open circuit."""
+        if isinstance(error, CircuitOpenError):
+            return True
+        # If requests was never imported, no request was made
+        requests = sys.modules.get('requests')
+        return requests is not None and isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+    @staticmethod
+    def never_sent(error):
+        """Return True if a requests exception means the request never left."""
+        if isinstance(error, CircuitOpenError):
+            return True
+        import requests
+        from urllib3.exceptions import NewConnectionError
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        if isinstance(error, requests.ConnectionError) and error.args:
+            reason = getattr(error.args[0], 'reason', error.args[0])
+            return isinstance(reason, NewConnectionError)
+        return False
+
+    def close(self):
+        """Close pooled connections."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class TokenCache:
+    """Caches the bearer token and idMutuario between punches.
+
+    Entries are kept in memory and, when a path and Fernet provider are
+    given, encrypted on disk so that new processes can reuse them too.
+    Tokens are considered valid until their JWT ``exp`` claim (minus a
+    safety margin), or for ``default_ttl`` seconds if the token has none.
+    """
+
+    def __init__(self, path=None, fernet_provider=None, default_ttl=TOKEN_DEFAULT_TTL,
+                 margin=TOKEN_EXPIRY_MARGIN):
+        self.path = path
+        self.fernet_provider = fernet_provider
+        self.default_ttl = default_ttl
+        self.margin = margin
+        self._entry = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def token_expiry(token):
+        """Return the ``exp`` claim of a JWT, or None if it can't be read."""
+        try:
+            payload = token.split('.')[1]
+            payload += '=' * (-len(payload) % 4)
+            claims = json.loads(base64.urlsafe_b64decode(payload))
+            return float(claims['exp'])
+        except Exception:
+            return None
+
+    def get(self, username):
+        """Return a valid cached auth dict for username, or None."""
+        with self._lock:
+            if self._entry is None:
+                self._entry = self._load()
+            entry = self._entry
+            if not entry or entry.get('username') != username:
+                return None
+            if entry.get('expires_at', 0) - self.margin <= time.time():
+                return None
+            return {'token': entry['token'], 'id_mutuario': entry['id_mutuario']}
+
+    def set(self, username, token, id_mutuario):
+        """Store a freshly obtained token."""
+        expires_at = self.token_expiry(token) or time.time() + self.default_ttl
+        with self._lock:
+            self._entry = {
+                'username': username,
+                'token': token,
+                'id_mutuario': id_mutuario,
+                'expires_at': expires_at,
+            }
+            self._store(self._entry)
+
+    def invalidate(self):
+        """Forget the cached token, in memory and on disk."""
+        with self._lock:
+            self._entry = {}
+            if self.path and os.path.exists(self.path):
+                try:
+                    os.remove(self.path)
+                except OSError:
+                    pass
+
+    def _load(self):
+        if not self.path or not self.fernet_provider or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'rb') as f:
+                data = self.fernet_provider().decrypt(f.read())
+            return json.loads(data)
+        except Exception:
+            return {}
+
+    def _store(self, entry):
+        if not self.path or not self.fernet_provider:
+            return
+        try:
+            data = self.fernet_provider().encrypt(json.dumps(entry).encode())
+            with open(self.path, 'wb') as f:
+                f.write(data)
+            os.chmod(self.path, 0o600)
+        except Exception:
+            pass
+
+
+# Result of a location lookup. source is "cache", "network", "stale" or "default"
+LocationResult = namedtuple('LocationResult', 'latitude longitude source hit age stale')
+
+
+class LocationProvider:
+    """TTL cache in front of get_current_location, persisted to the config dir.
+
+    ``prefetch()`` resolves the location in a background thread so that a
+    later punch can use an already-resolved coordinate.
+    """
+
+    def __init__(self, path=None, ttl=LOCATION_TTL, lookup=None):
+        self.path = path
+        self.ttl = ttl
+        self.lookup = lookup
+        self.hits = 0
+        self.misses = 0
+        self._entry = None
+        self._lock = threading.Lock()
+        self._prefetch_thread = None
+
+    def _resolve(self):
+        lookup = self.lookup or get_current_location
+        try:
+            latitude, longitude = lookup()
+        except Exception:
+            return None
+        if latitude is None or longitude is None:
+            return None
+        return self.update(latitude, longitude)
+
+    def update(self, latitude, longitude):
+        """Cache a freshly resolved location and return its entry."""
+        entry = {'latitude': latitude, 'longitude': longitude, 'resolved_at': time.time()}
+        with self._lock:
+            self._entry = entry
+            self._store(entry)
+        return entry
+
+    def cached(self):
+        """Return the cached entry (possibly stale), or None."""
+        with self._lock:
+            if self._entry is None:
+                self._entry = self._load()
+            return self._entry or None
+
+    def is_fresh(self, entry):
+        return entry is not None and time.time() - entry['resolved_at'] < self.ttl
+
+    def prefetch(self):
+        """Refresh the cached location in the background if it is stale."""
+        if self.is_fresh(self.cached()):
+            return None
+        with self._lock:
+            if self._prefetch_thread and self._prefetch_thread.is_alive():
+                return self._prefetch_thread
+            self._prefetch_thread = threading.Thread(target=self._resolve, daemon=True)
+            self._prefetch_thread.start()
+            return self._prefetch_thread
+
+    def get(self, wait=None):
+        """Return a LocationResult, resolving over the network only on a miss.
+
+        If a prefetch is in flight it is joined (up to ``wait`` seconds)
+        instead of issuing a second lookup.
+        """
+        entry = self.cached()
+        if self.is_fresh(entry):
+            self.hits += 1
+            return self._result(entry, 'cache', True)
+
+        self.misses += 1
+        thread = self._prefetch_thread
+        if thread and thread.is_alive():
+            thread.join(wait)
+            fresh = self.cached()
+            # Whatever the prefetch resolved is as new as a second lookup
+            if fresh and fresh is not entry:
+                return self._result(fresh, 'network', False)
+
+        fresh = self._resolve()
+        if fresh:
+            return self._result(fresh, 'network', False)
+        if entry:
+            return self._result(entry, 'stale', False)
+        latitude, longitude = DEFAULT_LOCATION
+        return LocationResult(latitude, longitude, 'default', False, None, True)
+
+    def _result(self, entry, source, hit):
+        age = time.time() - entry['resolved_at']
+        return LocationResult(entry['latitude'], entry['longitude'], source, hit, age, age >= self.ttl)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _store(self, entry):
+        if not self.path:
+            return
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(entry, f)
+            os.chmod(self.path, 0o600)
+        except Exception:
+            pass
+
+
 class PontoBackend:
     """Backend class for Ponto App that handles configuration and API interactions."""
     
-    def __init__(self):
+    # Overlap the location lookup with key derivation and login instead of
+    # running them one after another
+    pipelined = True
+    
+    def __init__(self, config_dir=None, transport=None, location_provider=None, base_url=None,
+                 vault=None, profile=None, secret_key=None):
+        """Create a backend.
+
+        ``config_dir`` defaults to ~/.config/ponto_app. ``base_url`` points
+        the API calls elsewhere (e.g. a local mock server); it can also be
+        set with the ``api_base_url`` setting. A ``transport`` and
+        ``location_provider`` may be shared between several backends (e.g.
+        one per profile); shared instances are not reconfigured from this
+        backend's settings.
+
+        Credentials are kept in ``vault`` (a ponto_vault.PontoVault) under
+        ``profile``; by default in a vault of its own in ``config_dir``. A
+        vault shared by many profiles derives its key once for all of them.
+        The vault's secret is the application default unless it was rotated
+        (update_credentials), in which case it is kept in the OS keyring;
+        ``secret_key`` supplies it instead (e.g. asked from the user), and
+        moves a vault still on the default secret to it.
+        """
         # Configuration
-        self.config_dir = os.path.join(str(Path.home()), ".config", "ponto_app")
+        self.config_dir = config_dir or default_config_dir()
         self.config_file = os.path.join(self.config_dir, "config.json")
         self.username = ""
         self.encrypted_password = ""
-        self.secret_key = "Dyn@"
-        self.salt = b'pontoapp_salt_123'  # Fixed salt for key derivation
+        self.salt = LEGACY_SALT  # Replaced by the vault's salt once it is opened
+        self.vault = vault or PontoVault(os.path.join(self.config_dir, VAULT_DIR))
+        self.supplied_secret = secret_key
+        self.secret_store = None  # Set once the vault is opened
+        self.profile = profile or DEFAULT_PROFILE
+        self.settings = {}
+        self.key_cache = KeyCache()
+        self.owns_transport = transport is None
+        self.transport = transport or ApiTransport()
+        self.base_url = base_url
+        self.token_cache = TokenCache(
+            os.path.join(self.config_dir, "token.enc"),
+            lambda: self.key_cache.get_fernet(self.secret_key, self.salt),
+        )
+        self.owns_location_provider = location_provider is None
+        self.location_provider = location_provider or LocationProvider(
+            os.path.join(self.config_dir, "location.json")
+        )
+        self.last_location = None
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._preparing = None
+        self._prepare_cancel = None
+        # Set to a ponto_profile.Profiler to profile every punch
+        self.profiler = None
+        self.journal = None
+        self.replayer = None
+        self.history = None
+        self.metrics = None
+        self.single_flight = SingleFlight(
+            os.path.join(self.config_dir, "punch.lock"),
+            os.path.join(self.config_dir, "punch.last"),
+            PUNCH_WINDOW,
+            PunchResult.as_dict,
+            PunchResult.from_dict,
+            shareable=lambda result: result.status == STATUS_SENT,
+            lock_timeout=PUNCH_LOCK_TIMEOUT,
+        )
         
         # Ensure config directory exists
         os.makedirs(self.config_dir, exist_ok=True)
         
         # Load configuration if exists
         self.load_config()
+        if not os.path.exists(self.config_file):
+            self.apply_settings()
+
+    @property
+    def secret_key(self):
+        """The secret the vault's key is derived from (shared by every backend on the vault)."""
+        return self.vault.secret or DEFAULT_SECRET_KEY
 
     def load_config(self):
-        """Load username and encrypted password from config file."""
-        if os.path.exists(self.config_file):
-            try:
+        """Load optional settings from the config file and credentials from the vault.
+
+        Credentials still in config.json (from before the vault) are moved
+        into the vault on the first load.
+        """
+        try:
+            legacy = {}
+            if os.path.exists(self.config_file):
                 with open(self.config_file, 'r') as f:
                     config = json.load(f)
-                    self.username = config.get('username', '')
-                    self.encrypted_password = config.get('encrypted_password', '')
-                return True
-            except Exception as e:
-                return False, f"Error loading configuration: {e}"
+                legacy = {key: config.pop(key) for key in ('username', 'encrypted_password') if key in config}
+                self.settings = config
+                self.apply_settings()
+            
+            self.vault.open(self.key_cache.iterations)
+            self.salt = self.vault.salt
+            self.key_cache.iterations = self.vault.iterations
+            self.secret_store = SecretStore(self.vault.id)
+            self.resolve_secret()
+            record = self.vault.get(self.profile)
+            if record is None and legacy:
+                record = self.migrate_config(legacy)
+            elif legacy:
+                # Already in the vault: drop the stale copy
+                self.write_settings()
+            if record:
+                self.username = record.get('username', '')
+                self.encrypted_password = record.get('encrypted_password', '')
+            return True
+        except Exception as e:
+            return False, f"Error loading configuration: {e}"
+
+    def resolve_secret(self):
+        """Find the vault's secret: the default, the one supplied, or the one in the keyring.
+
+        Only vaults moved off the default secret (they have a key-check
+        token) look in the keyring, so the default case costs nothing. A
+        rotation left unfinished by a crashed process is finished here.
+        """
+        vault = self.vault
+        if vault.key_check is None:
+            if self.supplied_secret and self.supplied_secret != DEFAULT_SECRET_KEY:
+                vault.rekey(self.key_cache, DEFAULT_SECRET_KEY, self.supplied_secret)
+            return
+        if vault.secret is None:
+            vault.secret = self.supplied_secret or self.secret_store.get()
+        if vault.rotating and vault.secret:
+            previous = self.secret_store.get(previous=True)
+            if previous:
+                vault.rekey(self.key_cache, previous, vault.secret)
+                self.secret_store.delete(previous=True)
+
+    def migrate_config(self, legacy):
+        """Move credentials from config.json into the vault; return the new record.
+
+        The password is re-encrypted under the vault's key. If it can't be
+        decrypted, config.json is left as it is and only the username is
+        loaded; saving a new password then completes the move.
+        """
+        username = legacy.get('username', '')
+        encrypted_password = ""
+        if legacy.get('encrypted_password'):
+            try:
+                fernet = KeyCache().get_fernet(DEFAULT_SECRET_KEY, LEGACY_SALT)
+                password = fernet.decrypt(legacy['encrypted_password'].encode())
+                encrypted_password = self.key_cache.get_fernet(self.secret_key, self.salt).encrypt(password).decode()
+            except Exception:
+                return {'username': username}
+        record = {'username': username, 'encrypted_password': encrypted_password}
+        self.vault.put(self.profile, record)
+        self.write_settings()
+        return record
+
+    def apply_settings(self):
+        """Apply optional settings loaded from the config file."""
+        self.key_cache.use_keyring = self.settings.get('use_keyring', False)
+        if self.owns_transport:
+            base_url = self.base_url or self.settings.get('api_base_url', API_BASE_URL)
+            self.transport.base_url = base_url.rstrip('/')
+            self.transport.connect_timeout = self.settings.get('connect_timeout', CONNECT_TIMEOUT)
+            self.transport.read_timeout = self.settings.get('read_timeout', READ_TIMEOUT)
+            self.transport.max_retries = self.settings.get('max_retries', MAX_RETRIES)
+            if not self.settings.get('circuit_breaker', True):
+                self.transport.breakers = None
+        self.single_flight.window = self.settings.get('punch_window', PUNCH_WINDOW)
+        if self.owns_location_provider:
+            offline = self.apply_location_settings()
+            self.location_provider.ttl = self.settings.get(
+                'location_ttl', OFFLINE_LOCATION_TTL if offline else LOCATION_TTL
+            )
+        if not self.settings.get('persist_token', True):
+            self.token_cache.path = None
+        if self.settings.get('metrics_export', False) and self.metrics is None:
+            # Only imported when enabled, so disabled metrics cost nothing
+            from ponto_metrics import MetricsExporter
+            self.metrics = MetricsExporter(self.config_dir)
+        if self.settings.get('offline_journal', True) and self.journal is None:
+            try:
+                self.journal = PunchJournal(os.path.join(self.config_dir, "journal.db"))
+            except Exception:
+                self.journal = None
+        if self.settings.get('punch_history', True) and self.history is None:
+            try:
+                self.history = PunchHistory(os.path.join(self.config_dir, "history.db"))
+            except Exception:
+                self.history = None
+
+    def apply_location_settings(self):
+        """Use the offline locator if sites or a local IP database are configured.
+
+        Returns True if it is in use. With ``"location_source": "offline"``
+        the network lookup is never used as a fallback.
+        """
+        database = self.settings.get('geoip_database') or os.path.join(self.config_dir, "geoip.bin")
+        sites = self.settings.get('location_sites') or []
+        if not sites and not os.path.exists(database):
+            self.location_provider.lookup = None
+            return False
+        from ponto_geoip import OfflineLocator
+        fallback = None if self.settings.get('location_source') == 'offline' else get_current_location
+        self.location_provider.lookup = OfflineLocator(database, sites, fallback)
         return True
 
     def save_config(self):
-        """Save username and encrypted password to config file."""
-        config = {
-            'username': self.username,
-            'encrypted_password': self.encrypted_password
-        }
+        """Save username and encrypted password to this profile's vault record."""
         try:
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f)
-            # Set proper permissions to protect the password
-            os.chmod(self.config_file, 0o600)
+            self.vault.put(self.profile, {'username': self.username, 'encrypted_password': self.encrypted_password})
             return True, "Configuration saved successfully"
         except Exception as e:
             return False, f"Error saving configuration: {e}"
 
+    def write_settings(self):
+        """Rewrite config.json with the settings only (created with mode 0600)."""
+        atomic_write(self.config_file, json.dumps(self.settings))
+
     def encrypt_password(self, password):
         """Encrypt the password using Fernet symmetric encryption."""
         try:
-            # Generate a key from the secret key and salt
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=self.salt,
-                iterations=100000,
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(self.secret_key.encode()))
-            
-            # Create a Fernet instance with the derived key
-            fernet = Fernet(key)
+            # Reuse the key derived from the secret key and salt
+            fernet = self.key_cache.get_fernet(self.secret_key, self.salt)
             
             # Encrypt the password
             encrypted_bytes = fernet.encrypt(password.encode())
@@ -94,21 +900,17 @@ class PontoBackend:
         try:
             if not self.encrypted_password:
                 return False, "No password stored"
+            if self.vault.key_check is not None and self.vault.secret is None:
+                return False, "Secret key not found in the OS keyring"
                 
-            # Generate a key from the secret key and salt
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=self.salt,
-                iterations=100000,
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(self.secret_key.encode()))
-            
-            # Create a Fernet instance with the derived key
-            fernet = Fernet(key)
+            # Reuse the key derived from the secret key and salt
+            fernet = self.key_cache.get_fernet(self.secret_key, self.salt)
             
             # Decrypt the password
-            decrypted_bytes = fernet.decrypt(self.encrypted_password.encode())
+            try:
+                decrypted_bytes = fernet.decrypt(self.encrypted_password.encode())
+            except Exception:
+                decrypted_bytes = self.decrypt_rotated()
             decrypted_password = decrypted_bytes.decode()
             
             return True, decrypted_password
@@ -116,118 +918,575 @@ class PontoBackend:
         except Exception as e:
             return False, f"Failed to decrypt password: {e}"
 
-    def register_time(self):
-        """Register time with the API."""
+    def decrypt_rotated(self):
+        """Decrypt the password after another backend rotated the vault's secret.
+
+        The vault header and the record are read again; while the rotation
+        is still running the record may be under the previous secret.
+        """
+        self.vault.reload()
+        if self.vault.key_check is not None and self.secret_store is not None:
+            # The rotating process put the new secret in the keyring
+            self.vault.secret = self.secret_store.get() or self.vault.secret
+        record = self.vault.get(self.profile) or {}
+        self.encrypted_password = record.get('encrypted_password', '')
+        token = self.encrypted_password.encode()
+        try:
+            return self.key_cache.get_fernet(self.secret_key, self.salt).decrypt(token)
+        except Exception:
+            previous = self.secret_store.get(previous=True) if self.vault.rotating else None
+            if previous is None:
+                raise
+            return self.key_cache.get_fernet(previous, self.salt).decrypt(token)
+
+    def login(self, timer=None):
+        """Log in to the API and return (success, auth) or (False, message).
+
+        On success ``auth`` is a dict with ``token`` and ``id_mutuario``.
+        Phase timings are added to ``timer`` if one is given.
+        """
+        timer = timer or PhaseTimer()
+        
+        # Get password
+        with timer.span('decrypt'):
+            success, password_result = self.decrypt_password()
+        if not success:
+            return False, password_result
+        
+        password = password_result
+        
+        # Login and get token
+        login_data = {
+            "username": self.username,
+            "password": password
+        }
+        
+        # Make login API request (safe to retry)
+        with timer.span('login'):
+            login_response = self.transport.post(LOGIN_PATH, idempotent=True, json=login_data)
+        return self.parse_login_response(login_response)
+
+    def parse_login_response(self, login_response):
+        """Return (True, auth) from a login response, caching the token, or (False, message)."""
+        if login_response.status_code != 200:
+            return False, f"Falha na autenticação: {login_response.status_code}"
+        
+        # Check if response has content before parsing JSON
+        if not login_response.text.strip():
+            return False, "Resposta de autenticação vazia"
+            
+        try:
+            auth_data = login_response.json()
+        except ValueError as json_err:
+            return False, f"Erro ao processar resposta de autenticação: {json_err}"
+        
+        token = auth_data.get('token')
+        
+        if not token:
+            return False, "Falha ao obter token de autenticação"
+        
+        id_mutuario = auth_data.get('employee', [{}])[0].get('idMutuario')
+        if not id_mutuario:
+            return False, "Falha ao obter idMutuario"
+
+        auth = {'token': token, 'id_mutuario': id_mutuario}
+        self.token_cache.set(self.username, token, id_mutuario)
+        return True, auth
+
+    def get_auth(self, timer=None):
+        """Return (success, auth, cached), reusing a valid cached token if possible."""
+        auth = self.token_cache.get(self.username)
+        if auth:
+            return True, auth, True
+        success, result = self.login(timer)
+        return success, result, False
+
+    @property
+    def executor(self):
+        """Worker pool used to run punches off the UI thread."""
+        with self._executor_lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                # A punch, a prepare() and a history sync may run at once
+                self._executor = ThreadPoolExecutor(max_workers=3, thread_name_prefix="ponto")
+            return self._executor
+
+    def submit_register_time(self, progress=None, cancel_event=None):
+        """Run register_time in the worker pool and return its Future.
+
+        ``progress`` is called from the worker thread with the current phase
+        ("autenticando", "localizando", "registrando"); callers are
+        responsible for marshalling it back to their UI thread. Setting
+        ``cancel_event`` aborts the punch before the register call is sent.
+        """
+        return self.executor.submit(self.register_time, progress, cancel_event)
+
+    def has_credentials(self):
+        """Return True if a username and password are configured."""
+        return bool(self.username and self.encrypted_password)
+
+    def warm_up(self):
+        """Start the background work a front-end wants once its window is up.
+
+        Loads the HTTP/crypto stack, prefetches the location, starts
+        replaying punches left in the offline journal and syncs the punch
+        history in the background.
+        """
+        self.preload()
+        self.location_provider.prefetch()
+        self.start_replayer()
+        if self.history is not None and self.settings.get('history_path') and self.has_credentials():
+            self.executor.submit(self.sync_history)
+
+    def prepare(self, cancel_event=None):
+        """Get everything a punch needs ready ahead of time.
+
+        Opens a pooled connection to the API (DNS, TCP and TLS), derives
+        the key, makes sure a valid token is cached (unless the
+        ``prepare_login`` setting is off) and refreshes the location.
+        Stops between steps once ``cancel_event`` is set; whatever was
+        already done stays cached for the next punch.
+        """
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        self.location_provider.prefetch()
+        self.transport.warm()
+        if not self.has_credentials() or cancelled():
+            return
+        self.key_cache.get_fernet(self.secret_key, self.salt)
+        if self.settings.get('prepare_login', True) and not cancelled():
+            self.get_auth()
+
+    def submit_prepare(self):
+        """Start prepare() in the worker pool, e.g. while a confirmation dialog is open.
+
+        A punch started meanwhile waits for it instead of repeating its
+        work; cancel_prepare() stops it if the user declines.
+        """
+        with self._executor_lock:
+            if self._preparing is not None and not self._preparing.done():
+                return self._preparing
+            self._prepare_cancel = threading.Event()
+        future = self.executor.submit(self.prepare, self._prepare_cancel)
+        self._preparing = future
+        return future
+
+    def cancel_prepare(self):
+        """Stop a prepare() started by submit_prepare() at its next step."""
+        if self._prepare_cancel is not None:
+            self._prepare_cancel.set()
+
+    def wait_prepared(self, timeout=PREPARE_WAIT):
+        """Wait for a prepare() in flight, so a punch reuses its login."""
+        future = self._preparing
+        if future is None or future.done():
+            return
+        try:
+            future.result(timeout)
+        except Exception:
+            # The punch does the same steps itself and reports their errors
+            pass
+
+    def status(self):
+        """Return a JSON-serialisable snapshot of the backend state."""
+        location = self.location_provider.cached()
+        return {
+            'username': self.username,
+            'configured': self.has_credentials(),
+            'token_cached': self.token_cache.get(self.username) is not None,
+            'location_age_s': round(time.time() - location['resolved_at'], 1) if location else None,
+            'location_hits': self.location_provider.hits,
+            'location_misses': self.location_provider.misses,
+            'journal': self.journal.counts() if self.journal is not None else {},
+            'circuits': self.transport.circuits(),
+        }
+
+    def circuit_message(self):
+        """Return a status line if the API is failing fast, or ""."""
+        return format_circuits(self.transport.circuits())
+
+    def preload(self):
+        """Import the HTTP and crypto stacks in a background thread.
+
+        Used on startup paths that show a window first (e.g. --auto) so
+        the heavy imports overlap with the user reading the dialog.
+        """
+        def load():
+            try:
+                import requests  # noqa: F401
+                import cryptography.fernet  # noqa: F401
+                from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC  # noqa: F401
+            except ImportError:
+                pass
+        thread = threading.Thread(target=load, name="ponto-preload", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        """Stop the worker pool and replayer and close pooled connections."""
+        if self.replayer is not None:
+            self.replayer.stop()
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        if self.owns_transport:
+            self.transport.close()
+
+    @profiled('punch')
+    def register_time(self, progress=None, cancel_event=None):
+        """Register time with the API.
+
+        The attempt is recorded in the offline journal first; if the server
+        can't be reached the punch is kept there and replayed later.
+        Concurrent calls, from this or another process, share one attempt,
+        and a successful punch is shared for ``punch_window`` seconds.
+        Returns a PunchResult, which unpacks as (success, message, current_time).
+        """
+        busy = PunchResult(False, "Outro registro de ponto está em andamento",
+                           datetime.now().strftime("%H:%M:%S"), status=STATUS_FAILED)
+        return self.single_flight.run(lambda: self.punch(progress, cancel_event), busy)
+
+    def punch(self, progress=None, cancel_event=None):
+        """Journal, send and record one punch (see register_time)."""
+        timer = PhaseTimer()
+        punched_at, entry_id = self.begin_punch(timer)
+        if self._preparing is not None and not self._preparing.done():
+            with timer.span('prepare'):
+                self.wait_prepared()
+        delivery = {}
+        success, message, current_time = self.send_punch(progress, cancel_event, delivery=delivery, timer=timer)
+        return self.finish_punch(punched_at, entry_id, success, message, current_time, delivery, timer)
+
+    def begin_punch(self, timer):
+        """Journal a new attempt; return (punched_at, journal entry id or None)."""
+        punched_at = time.time()
+        entry_id = None
+        if self.journal is not None:
+            with timer.span('journal'):
+                try:
+                    entry_id = self.journal.append(self.username, punched_at)
+                except Exception:
+                    entry_id = None
+        return punched_at, entry_id
+
+    def finish_punch(self, punched_at, entry_id, success, message, current_time, delivery, timer):
+        """Record the outcome of an attempt and return its PunchResult."""
+        status = delivery.get('status', STATUS_FAILED)
+        
+        if entry_id is not None:
+            with timer.span('journal'):
+                self.journal.complete(entry_id, status, delivery.get('latitude'),
+                                      delivery.get('longitude'), None if success else message)
+            if status == STATUS_OFFLINE:
+                self.start_replayer()
+                message = f"{message}. Ponto guardado; será enviado quando a conexão voltar."
+        
+        if success:
+            self.record_history(punched_at, delivery)
+
+        result = PunchResult(success, message, current_time, timer.phases, timer.total_ms(),
+                             status, self.last_location)
+        if self.metrics is not None:
+            self.metrics.record_circuits(self.transport.circuits())
+            self.metrics.record_punch(result, self.username)
+        return result
+
+    def replay_punch(self, entry):
+        """Send a journaled punch; return (status, latitude, longitude, error).
+
+        Runs under the single-flight locks, so it never overlaps a punch
+        of this or another process; a punch that went through meanwhile
+        makes the entry a duplicate.
+        """
+        if entry['username'] != self.username:
+            return STATUS_FAILED, None, None, "Usuário diferente do configurado"
+        busy = (STATUS_OFFLINE, None, None, "Outro registro de ponto está em andamento")
+        return self.single_flight.exclusive(lambda: self.replay_locked(entry), busy)
+
+    def replay_locked(self, entry):
+        if self.journal is not None and self.journal.superseded(entry):
+            return STATUS_DUPLICATE, None, None, None
+        location = None
+        if entry['latitude'] is not None and entry['longitude'] is not None:
+            location = (entry['latitude'], entry['longitude'])
+        delivery = {}
+        success, message, _ = self.send_punch(location=location, delivery=delivery)
+        if success:
+            self.record_history(entry['punched_at'], delivery)
+        return (delivery.get('status', STATUS_FAILED), delivery.get('latitude'),
+                delivery.get('longitude'), None if success else message)
+
+    def record_history(self, punched_at, delivery):
+        """Add a delivered punch to the local history."""
+        if self.history is None:
+            return
+        try:
+            self.history.record(self.username, punched_at, delivery.get('latitude'), delivery.get('longitude'))
+        except Exception:
+            pass
+
+    def punch_history(self, limit=HISTORY_LIMIT, since=None):
+        """Return the newest punches of the current user from the local history."""
+        if self.history is None:
+            return []
+        return self.history.recent(self.username, limit, since)
+
+    def todays_punches(self):
+        """Return today's punches of the current user, oldest first."""
+        if self.history is None:
+            return []
+        return self.history.today(self.username)
+
+    def month_summary(self, month=None):
+        """Return (True, summary dict) for the current month's worked hours.
+
+        Needs NumPy; returns (False, message) if it is missing or there is
+        no history.
+        """
+        if self.history is None:
+            return False, "Histórico desativado"
+        try:
+            from ponto_analytics import PunchArrays, WorkedHours
+        except ImportError:
+            return False, "Instale o numpy para ver o resumo de horas"
+        punches = PunchArrays.from_sqlite(self.history.path, [self.username])
+        rows = WorkedHours(punches, self.settings.get('daily_hours', 8.0)).monthly(
+            month or datetime.now().strftime("%Y-%m")
+        )
+        if not rows:
+            return False, "Nenhum registro neste mês"
+        return True, rows[0]
+
+    def sync_history(self):
+        """Fetch punches newer than the high-water mark from the server.
+
+        The history endpoint is set with the ``history_path`` setting.
+        Returns (success, number of new punches) or (False, message).
+        """
+        path = self.settings.get('history_path')
+        if self.history is None or not path:
+            return False, "Sincronização do histórico desativada"
+        try:
+            success, auth, _ = self.get_auth()
+            if not success:
+                return False, auth
+            params = {'idMutuario': auth['id_mutuario']}
+            high_water = self.history.high_water(self.username)
+            if high_water is not None:
+                params['desde'] = datetime.fromtimestamp(high_water).isoformat()
+            response = self.transport.get(path, params=params,
+                                          headers={"Authorization": f"Bearer {auth['token']}"})
+            if response.status_code != 200:
+                return False, f"Falha ao sincronizar histórico: {response.status_code}"
+            records = []
+            for item in response.json():
+                punched_at = parse_timestamp(item['dataHora'])
+                # The server filter is inclusive; skip what we already have
+                if high_water is not None and punched_at <= high_water:
+                    continue
+                records.append({
+                    'remote_id': item.get('id', item['dataHora']),
+                    'punched_at': punched_at,
+                    'latitude': item.get('latitude'),
+                    'longitude': item.get('longitude'),
+                })
+            return True, self.history.merge(self.username, records)
+        except Exception as e:
+            return False, f"Falha ao sincronizar histórico: {e}"
+
+    def start_replayer(self):
+        """Start draining offline punches in the background."""
+        if self.journal is None:
+            return None
+        if self.replayer is None:
+            self.replayer = JournalReplayer(self.journal, self.replay_punch)
+        return self.replayer.start()
+
+    def send_punch(self, progress=None, cancel_event=None, location=None, delivery=None, timer=None):
+        """Log in if needed, resolve the location and send the punch.
+
+        ``location`` overrides the resolved coordinates. If a ``delivery``
+        dict is given it is filled with the journal status of the attempt
+        and the coordinates used. Phase timings are added to ``timer``.
+        """
+        if delivery is None:
+            delivery = {}
+        timer = timer or PhaseTimer()
+        delivery['status'] = STATUS_FAILED
+
+        def enter_phase(phase):
+            if cancel_event is not None and cancel_event.is_set():
+                return False
+            if progress:
+                progress(phase)
+            return True
+
         try:
             # Get current time
             now = datetime.now()
             current_time = now.strftime("%H:%M:%S")
             
-            # Get password
-            success, password_result = self.decrypt_password()
+            # Get a bearer token, skipping the login when one is cached
+            if not enter_phase("autenticando"):
+                delivery['status'] = STATUS_CANCELLED
+                return False, "Registro cancelado", current_time
+            # The location doesn't depend on the login: resolve it meanwhile
+            if location is None and self.pipelined:
+                self.location_provider.prefetch()
+            success, auth, cached = self.get_auth(timer)
             if not success:
-                return False, password_result, current_time
-            
-            password = password_result
-            
-            # API endpoints - using the correct endpoints from the original app
-            login_url = "https://backendicarus.pontoicarus.com.br/usuario/logar"
-            register_url = "https://backendicarus.pontoicarus.com.br/ponto/bater"
-            
-            # Login and get token
-            login_data = {
-                "username": self.username,
-                "password": password
-            }
-            
-            # Make login API request
-            login_response = requests.post(login_url, json=login_data)
-            
-            if login_response.status_code != 200:
-                return False, f"Falha na autenticação: {login_response.status_code}", current_time
-            
-            # Check if response has content before parsing JSON
-            if not login_response.text.strip():
-                return False, "Resposta de autenticação vazia", current_time
-                
-            try:
-                auth_data = login_response.json()
-            except ValueError as json_err:
-                return False, f"Erro ao processar resposta de autenticação: {json_err}", current_time
-            
-            token = auth_data.get('token')
-            
-            if not token:
-                return False, "Falha ao obter token de autenticação", current_time
+                return False, auth, current_time
             
-            id_mutuario = auth_data.get('employee', [{}])[0].get('idMutuario')
-            if not id_mutuario:
-                return False, "Falha ao obter idMutuario", current_time
-
-            # Get real location
-            latitude, longitude = get_current_location()  # or get_location()
-
-            # Fallback to default values if location couldn't be determined
-            if latitude is None or longitude is None:
-                latitude, longitude = -27.572293, -48.5095271  # Keep your current defaults
-
-            register_data = {
-                "idMutuario": id_mutuario,
-                "latitude": latitude,
-                "longitude": longitude,
-                "precisao": 42.5,  # You might want to get real accuracy too
-                "meioBatida": "NAVEGADOR"
-            }
+            token = auth['token']
+            id_mutuario = auth['id_mutuario']
+
+            if not enter_phase("localizando"):
+                delivery['status'] = STATUS_CANCELLED
+                return False, "Registro cancelado", current_time
 
-            # Data to send for clock in/out
-#            register_data = {
-#                "idMutuario": id_mutuario,
-#                "latitude": -27.572293,
-#                "longitude": -48.5095271,
-#                "precisao": 42.5,
-#                "meioBatida": "NAVEGADOR"
-#            }
+            # Get real location, preferring the cached/prefetched one (this
+            # only waits for the rest of a lookup started above).
+            # Falls back to DEFAULT_LOCATION only if nothing was ever resolved.
+            if location is None:
+                with timer.span('geolocation'):
+                    location = self.location_provider.get()
+                self.last_location = location
+            latitude, longitude = location[0], location[1]
+            delivery['latitude'], delivery['longitude'] = latitude, longitude
+
+            register_data, headers = self.register_request(id_mutuario, token, latitude, longitude)
             
-            # Send authenticated request
-            headers = {
-                "Authorization": f"Bearer {token}",
-                "Content-Type": "application/json; charset=UTF-8"
-            }
+            # Last chance to cancel: once sent, the punch can't be taken back
+            if not enter_phase("registrando"):
+                delivery['status'] = STATUS_CANCELLED
+                return False, "Registro cancelado", current_time
+
+            # Make register time API request (never retried once sent).
+            # From here on a network error may mean the punch was recorded.
+            delivery['status'] = STATUS_UNKNOWN
+            with timer.span('register'):
+                register_response = self.transport.post(REGISTER_PATH, json=register_data, headers=headers)
             
-            # Make register time API request
-            register_response = requests.post(register_url, json=register_data, headers=headers)
+            # A cached token may have been revoked; a 401 means nothing was recorded
+            if register_response.status_code == 401 and cached:
+                self.token_cache.invalidate()
+                delivery['status'] = STATUS_FAILED
+                success, auth = self.login(timer)
+                if not success:
+                    return False, auth, current_time
+                delivery['status'] = STATUS_UNKNOWN
+                register_data["idMutuario"] = auth['id_mutuario']
+                headers["Authorization"] = f"Bearer {auth['token']}"
+                with timer.span('register'):
+                    register_response = self.transport.post(REGISTER_PATH, json=register_data, headers=headers)
             
             # Handle successful response codes
-            if register_response.status_code == 200 or register_response.status_code == 201:
-                # Check if response is plain text "ok"
-                if register_response.text.strip().lower() == "ok":
-                    return True, "Ponto registrado com sucesso", current_time
-                    
-                # Try to parse as JSON if not plain "ok"
-                try:
-                    result = register_response.json()
-                    message = result.get('message', 'Ponto registrado com sucesso')
-                    return True, message, current_time
-                except ValueError:
-                    # If can't parse as JSON but status code is success, consider it successful
-                    return True, "Ponto registrado com sucesso", current_time
-            else:
-                # Handle error responses
-                try:
-                    result = register_response.json()
-                    message = result.get('message', 'Erro ao registrar ponto')
-                except ValueError:
-                    # If can't parse error as JSON, use response text or status code
-                    message = register_response.text.strip() if register_response.text.strip() else f"Erro {register_response.status_code}"
-                
-                return False, message, current_time
+            success, message = self.parse_register_response(register_response)
+            delivery['status'] = STATUS_SENT if success else STATUS_FAILED
+            return success, message, current_time
         
         except Exception as e:
+            if self.transport.is_network_error(e):
+                # Failing to connect means nothing reached the server
+                if delivery['status'] != STATUS_UNKNOWN or self.transport.never_sent(e):
+                    delivery['status'] = STATUS_OFFLINE
+                if isinstance(e, CircuitOpenError):
+                    return False, "Servidor indisponível", datetime.now().strftime("%H:%M:%S")
+                if isinstance(e, sys.modules['requests'].Timeout):
+                    return False, "Tempo esgotado ao comunicar com o servidor", datetime.now().strftime("%H:%M:%S")
+                return False, "Sem conexão com o servidor", datetime.now().strftime("%H:%M:%S")
             return False, f"Falha ao registrar ponto: {e}", datetime.now().strftime("%H:%M:%S")
 
-    def update_credentials(self, username, password=None):
-        """Update username and password."""
+    @staticmethod
+    def register_request(id_mutuario, token, latitude, longitude):
+        """Return the JSON body and headers of a register call."""
+        register_data = {
+            "idMutuario": id_mutuario,
+            "latitude": latitude,
+            "longitude": longitude,
+            "precisao": 42.5,  # You might want to get real accuracy too
+            "meioBatida": "NAVEGADOR"
+        }
+        
+        # Send authenticated request
+        headers = {
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json; charset=UTF-8"
+        }
+        return register_data, headers
+
+    @staticmethod
+    def parse_register_response(register_response):
+        """Return (success, message) for a register response."""
+        if register_response.status_code == 200 or register_response.status_code == 201:
+            # Check if response is plain text "ok"
+            if register_response.text.strip().lower() == "ok":
+                return True, "Ponto registrado com sucesso"
+                
+            # Try to parse as JSON if not plain "ok"
+            try:
+                result = register_response.json()
+                return True, result.get('message', 'Ponto registrado com sucesso')
+            except (ValueError, AttributeError):
+                # If can't parse as JSON but status code is success, consider it successful
+                return True, "Ponto registrado com sucesso"
+        
+        # Handle error responses
+        try:
+            result = register_response.json()
+            message = result.get('message', 'Erro ao registrar ponto')
+        except (ValueError, AttributeError):
+            # If can't parse error as JSON, use response text or status code
+            message = register_response.text.strip() if register_response.text.strip() else f"Erro {register_response.status_code}"
+        return False, message
+
+    def restore_secret(self, secret):
+        """Put the keyring back on secret after a rotation that didn't start."""
+        if secret == DEFAULT_SECRET_KEY:
+            self.secret_store.delete()
+        else:
+            self.secret_store.set(secret)
+        self.secret_store.delete(previous=True)
+
+    def update_credentials(self, username, password=None, secret_key=None):
+        """Update username and password, optionally rotating the secret key."""
+        if username != self.username or password or secret_key:
+            self.token_cache.invalidate()
+            self.single_flight.reset()
         self.username = username
+        # Encrypt under the vault's current secret, even if another process
+        # rotated it since this backend loaded
+        if self.vault.reload() and self.encrypted_password and not password:
+            try:
+                password = self.decrypt_rotated().decode()
+            except Exception as e:
+                return False, f"Failed to decrypt password: {e}"
+        
+        if secret_key and secret_key != self.secret_key:
+            # Re-encrypt the stored password under the new secret
+            if not password and self.encrypted_password:
+                success, result = self.decrypt_password()
+                if not success:
+                    return False, result
+                password = result
+            # The secret is shared by every profile in the vault, which only
+            # keeps a key-check token: both secrets go to the keyring before
+            # any record is re-encrypted, or nothing changes
+            old_secret = self.secret_key
+            if not (self.secret_store.set(old_secret, previous=True) and self.secret_store.set(secret_key)):
+                self.restore_secret(old_secret)
+                return False, "Failed to store the new secret key in the OS keyring"
+            try:
+                self.vault.rekey(self.key_cache, old_secret, secret_key)
+            except Exception as e:
+                if not self.vault.rotating or self.vault.secret != secret_key:
+                    # Nothing was re-encrypted: the keyring goes back too
+                    self.restore_secret(old_secret)
+                return False, f"Failed to rotate secret key: {e}"
+            self.secret_store.delete(previous=True)
+            self.key_cache.invalidate(old_secret, self.salt)
         
         if password:
             success, message = self.encrypt_password(password)
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""Micro benchmarks for the Ponto App backend.
+
+Usage:
+    python3 ponto_bench.py key [--punches N]
+    python3 ponto_bench.py journal [--appends N]
+    python3 ponto_bench.py startup [--toolkit pyqt|gtk] [--runs N] [--max-ms MS]
+    python3 ponto_bench.py e2e [--punches N] [--latency-ms MS] [--cold-token] ...
+    python3 ponto_bench.py analytics [--users N] [--years N]
+    python3 ponto_bench.py geoip [--ranges N] [--lookups N]
+    python3 ponto_bench.py memory [--idle S]
+    python3 ponto_bench.py vault [--profiles N] [--operations N]
+"""
+# Standard library imports
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+# Local imports
+from ponto_backend import PontoBackend, LocationProvider, KeyCache
+from ponto_vault import PontoVault, atomic_write
+from ponto_journal import PunchJournal
+from ponto_mock_server import MockIcarusServer, RESPONSE_SHAPES
+from ponto_cli import latency_summary
+
+
+def bench_key(args):
+    """Compare per-punch decrypt cost with and without the key cache."""
+    # Work on a throwaway config, never on the user's vault
+    with tempfile.TemporaryDirectory() as config_dir:
+        backend = PontoBackend(config_dir=config_dir)
+        try:
+            backend.encrypted_password = ""
+            backend.encrypt_password("benchmark-password")
+
+            # Uncached: derive the key from scratch for every punch (old behaviour)
+            cold = []
+            for _ in range(args.punches):
+                backend.key_cache.invalidate(backend.secret_key, backend.salt)
+                start = time.perf_counter()
+                backend.decrypt_password()
+                cold.append(time.perf_counter() - start)
+
+            # Cached: the key is derived once per process and reused
+            warm = []
+            backend.key_cache.get_fernet(backend.secret_key, backend.salt)
+            for _ in range(args.punches):
+                start = time.perf_counter()
+                backend.decrypt_password()
+                warm.append(time.perf_counter() - start)
+        finally:
+            backend.shutdown()
+
+    cold_ms = sum(cold) / len(cold) * 1000
+    warm_ms = sum(warm) / len(warm) * 1000
+    print(f"PBKDF2 iterations:     {backend.key_cache.iterations}")
+    print(f"decrypt (uncached):    {cold_ms:9.3f} ms/punch")
+    print(f"decrypt (cached):      {warm_ms:9.3f} ms/punch")
+    print(f"saving per punch:      {cold_ms - warm_ms:9.3f} ms")
+
+
+def bench_journal(args):
+    """Measure the latency of appending a punch to the offline journal."""
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = PunchJournal(os.path.join(tmp, "journal.db"))
+        samples = []
+        for _ in range(args.appends):
+            start = time.perf_counter()
+            journal.append("benchmark")
+            samples.append(time.perf_counter() - start)
+        journal.close()
+
+    samples.sort()
+    print(f"appends:               {len(samples)}")
+    print(f"mean:                  {sum(samples) / len(samples) * 1e6:9.1f} us")
+    print(f"p99:                   {samples[int(len(samples) * 0.99) - 1] * 1e6:9.1f} us")
+    print(f"max:                   {samples[-1] * 1e6:9.1f} us")
+
+
+# Child programs for the startup benchmark. Each prints READY as soon as
+# its first window has been constructed and shown.
+STARTUP_PROGRAMS = {
+    'import': "import ponto_backend; print('READY', flush=True)",
+    'pyqt': (
+        "import sys\n"
+        "from PyQt6.QtWidgets import QApplication\n"
+        "from ponto_app_pyqt import PontoAppPyQt\n"
+        "app = QApplication(sys.argv)\n"
+        "window = PontoAppPyQt()\n"
+        "print('READY', flush=True)\n"
+    ),
+    'gtk': (
+        "from ponto_app_gtk import PontoAppGTK\n"
+        "app = PontoAppGTK()\n"
+        "app.connect('activate', lambda a: (print('READY', flush=True), a.quit()))\n"
+        "app.run([])\n"
+    ),
+}
+
+
+def time_to_ready(program, env):
+    """Start a fresh interpreter and return the seconds until it prints READY."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    start = time.perf_counter()
+    child = subprocess.Popen(
+        [sys.executable, "-c", program], cwd=here, env=env,
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    try:
+        for line in child.stdout:
+            if line.strip() == "READY":
+                return time.perf_counter() - start
+        raise RuntimeError("o programa terminou antes de abrir a janela")
+    finally:
+        child.kill()
+        child.wait()
+
+
+def bench_startup(args):
+    """Measure interpreter + backend import time and time-to-first-window."""
+    with tempfile.TemporaryDirectory() as home:
+        # Run against an empty config so no real punch can be replayed
+        env = dict(os.environ, HOME=home, USERPROFILE=home)
+        if args.toolkit == 'pyqt':
+            env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+        baseline = min(time_to_ready("print('READY', flush=True)", env) for _ in range(args.runs))
+        results = {}
+        for name in ('import', args.toolkit):
+            samples = sorted(time_to_ready(STARTUP_PROGRAMS[name], env) for _ in range(args.runs))
+            results[name] = samples[len(samples) // 2]
+
+    print(f"bare interpreter:      {baseline * 1000:9.1f} ms")
+    print(f"import ponto_backend:  {results['import'] * 1000:9.1f} ms (median)")
+    print(f"first window ({args.toolkit}):  {results[args.toolkit] * 1000:9.1f} ms (median)")
+
+    if args.max_ms is not None and results[args.toolkit] * 1000 > args.max_ms:
+        print(f"REGRESSÃO: primeira janela acima de {args.max_ms} ms", file=sys.stderr)
+        sys.exit(1)
+
+
+def bench_e2e(args):
+    """Punch repeatedly against the local mock server and report latencies."""
+    server = MockIcarusServer(
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        error_rate=args.error_rate,
+        response_shape=args.response,
+    )
+    server.start()
+
+    def lookup():
+        time.sleep(args.geo_latency_ms / 1000)
+        return -27.5, -48.5
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        location_provider = LocationProvider(ttl=args.geo_ttl, lookup=lookup)
+        backend = PontoBackend(config_dir=config_dir, base_url=server.url,
+                               location_provider=location_provider)
+        backend.update_credentials("benchmark", "benchmark-password")
+        # Every iteration is a real punch, not the shared result of the last one
+        backend.single_flight.window = 0
+        backend.pipelined = not args.serial
+
+        totals = []
+        breakdown = {}
+        failures = 0
+        for _ in range(args.punches):
+            if args.cold_token:
+                backend.token_cache.invalidate()
+            if args.cold_key:
+                backend.key_cache.invalidate(backend.secret_key, backend.salt)
+            result = backend.register_time()
+            totals.append(result.total_ms)
+            failures += 0 if result.success else 1
+            for name in ('decrypt', 'login', 'geolocation', 'register'):
+                breakdown.setdefault(name, []).append(result.phases.get(name, 0.0))
+        backend.shutdown()
+    server.stop()
+
+    report = {
+        'punches': args.punches,
+        'pipelined': not args.serial,
+        'failed': failures,
+        'total': latency_summary(totals),
+        'phases': {name: latency_summary(values) for name, values in breakdown.items()},
+        'server_requests': server.counters,
+    }
+    if args.json:
+        print(json.dumps(report))
+        return
+
+    print(f"punches: {args.punches}  failed: {failures}  server: {server.counters}")
+    print(f"{'phase':<12} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    rows = [('total', report['total'])] + list(report['phases'].items())
+    for name, stats in rows:
+        print(f"{name:<12} {stats['mean_ms']:9.2f} {stats['p50_ms']:9.2f} "
+              f"{stats['p95_ms']:9.2f} {stats['p99_ms']:9.2f}")
+
+
+def synthetic_punches(users, years, seed=0):
+    """Return user names and timestamps for four punches per workday per user."""
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2020-01-01', 'D')
+    days = np.arange(int(years * 365)) + start.astype(np.int64)
+    days = days[(days + 3) % 7 < 5]
+    # 08:00, 12:00, 13:00 and 17:00 local time, each with up to 30 min of noise
+    offsets = np.array([8, 12, 13, 17]) * 3600.0
+    stamps = (days[:, None] * 86400.0 + offsets).ravel()
+    stamps = np.tile(stamps, users) + rng.uniform(0, 1800, stamps.size * users)
+    names = np.repeat(np.array([f"user{i:05d}" for i in range(users)]), stamps.size // users)
+    # Arbitrary input order, as when merging several history files
+    order = rng.permutation(stamps.size)
+    return names[order], stamps[order] - time.localtime().tm_gmtoff
+
+
+def python_worked_hours(names, stamps, daily_hours=8.0):
+    """Reference per-punch Python implementation of the monthly totals."""
+    from datetime import date, timedelta
+    offset = time.localtime().tm_gmtoff
+    days = {}
+    for name, stamp in zip(names, stamps):
+        days.setdefault((name, int((stamp + offset) // 86400)), []).append(stamp)
+    months = {}
+    bank = {}
+    for (name, day), day_stamps in sorted(days.items()):
+        day_stamps.sort()
+        worked = sum(day_stamps[i + 1] - day_stamps[i] for i in range(0, len(day_stamps) - 1, 2))
+        expected = daily_hours * 3600 if (day + 3) % 7 < 5 else 0.0
+        bank[name] = bank.get(name, 0.0) + worked - expected
+        month = (date(1970, 1, 1) + timedelta(days=day)).strftime("%Y-%m")
+        totals = months.setdefault((name, month), [0.0, 0.0])
+        totals[0] += worked
+        totals[1] = bank[name]
+    return months
+
+
+def bench_analytics(args):
+    """Time the vectorised worked-hours report on a synthetic dataset."""
+    from ponto_analytics import PunchArrays, WorkedHours
+    names, stamps = synthetic_punches(args.users, args.years)
+    print(f"punches:               {len(stamps):,} ({args.users} users, {args.years} years)")
+
+    start = time.perf_counter()
+    punches = PunchArrays.from_columns(names, stamps)
+    load = time.perf_counter() - start
+    start = time.perf_counter()
+    report = WorkedHours(punches)
+    compute = time.perf_counter() - start
+    rows = report.monthly()
+    print(f"load (columns):        {load * 1000:9.1f} ms")
+    print(f"worked hours (numpy):  {compute * 1000:9.1f} ms  ({len(rows):,} user-months)")
+
+    # Pure Python reference on a slice, extrapolated per punch
+    sample = min(len(stamps), args.baseline_punches)
+    start = time.perf_counter()
+    python_worked_hours(names[:sample].tolist(), stamps[:sample].tolist())
+    baseline = (time.perf_counter() - start) / sample * len(stamps)
+    print(f"worked hours (python): {baseline * 1000:9.1f} ms  (extrapolated from {sample:,} punches)")
+    print(f"speed-up:              {baseline / compute:9.1f}x")
+
+
+def bench_geoip(args):
+    """Time lookups in an offline IP database of synthetic, non-overlapping ranges."""
+    import socket
+    import struct
+    from ponto_geoip import GeoIPDatabase, write_database
+    rng = random.Random(0)
+    ranges = []
+    start = 1 << 24
+    for _ in range(args.ranges):
+        size = rng.randint(1, 2048)
+        ranges.append((start, start + size - 1, rng.uniform(-33, 5), rng.uniform(-74, -35)))
+        start += size + rng.randint(0, 64)
+    addresses = [socket.inet_ntoa(struct.pack("!I", rng.randint(1 << 24, start))) for _ in range(args.lookups)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "geoip.bin")
+        begin = time.perf_counter()
+        write_database(ranges, path)
+        build = time.perf_counter() - begin
+        begin = time.perf_counter()
+        database = GeoIPDatabase(path)
+        opened = time.perf_counter() - begin
+
+        timings = []
+        found = 0
+        for address in addresses:
+            begin = time.perf_counter()
+            location = database.lookup(address)
+            timings.append((time.perf_counter() - begin) * 1000)
+            found += location is not None
+        size = os.path.getsize(path)
+        database.close()
+
+    stats = latency_summary(timings)
+    print(f"ranges:                {args.ranges:,} ({size / 2**20:.1f} MiB)")
+    print(f"build:                 {build * 1000:9.1f} ms")
+    print(f"open (mmap):           {opened * 1000:9.3f} ms")
+    print(f"lookup p50 / p99:      {stats['p50_ms'] * 1000:9.2f} / {stats['p99_ms'] * 1000:.2f} us  "
+          f"({found:,} of {args.lookups:,} found)")
+
+
+# Child programs for the memory benchmark (PyQt). Each prints one JSON
+# line per stage with the resident memory and the CPU time spent idling
+# for IDLE seconds in the event loop at that stage.
+MEMORY_PRELUDE = (
+    "import sys, gc, json, time\n"
+    "from PyQt6.QtWidgets import QApplication\n"
+    "from PyQt6.QtCore import QEventLoop, QTimer\n"
+    "from ponto_profile import resident_memory\n"
+    "import ponto_app_pyqt\n"
+    "app = QApplication(sys.argv)\n"
+    "app.setQuitOnLastWindowClosed(False)\n"
+    "def stage(name):\n"
+    "    loop = QEventLoop()\n"
+    "    QTimer.singleShot(200, loop.quit)\n"
+    "    loop.exec()\n"
+    "    gc.collect()\n"
+    "    cpu = time.process_time()\n"
+    "    QTimer.singleShot(int(IDLE * 1000), loop.quit)\n"
+    "    loop.exec()\n"
+    "    cpu = time.process_time() - cpu\n"
+    "    print(json.dumps({'stage': name, 'rss': resident_memory(), 'idle_cpu_s': cpu}), flush=True)\n"
+)
+
+MEMORY_PROGRAMS = {
+    'window': (
+        "stage('imports')\n"
+        "window = ponto_app_pyqt.PontoAppPyQt()\n"
+        "stage('janela aberta')\n"
+        "window.showMinimized()\n"
+        "stage('janela minimizada')\n"
+    ),
+    'tray': (
+        "tray = ponto_app_pyqt.PontoTray()\n"
+        "stage('bandeja')\n"
+        "tray.show_window()\n"
+        "stage('bandeja + janela')\n"
+        "tray.window.close()\n"
+        "stage('bandeja, janela fechada')\n"
+        "tray.show_window()\n"
+        "tray.window.close()\n"
+        "stage('bandeja, reaberta e fechada')\n"
+    ),
+}
+
+
+def bench_memory(args):
+    """Compare resident memory and idle CPU of the window and the tray (PyQt)."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    rows = []
+    with tempfile.TemporaryDirectory() as home:
+        env = dict(os.environ, HOME=home, USERPROFILE=home)
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        for mode, program in MEMORY_PROGRAMS.items():
+            output = subprocess.run(
+                [sys.executable, "-c", f"IDLE = {args.idle}\n" + MEMORY_PRELUDE + program],
+                cwd=here, env=env, capture_output=True, text=True, timeout=120,
+            ).stdout
+            rows += [(mode, json.loads(line)) for line in output.splitlines() if line.startswith("{")]
+
+    print(f"{'modo':<8} {'estágio':<30} {'RSS (MiB)':>10} {'CPU ocioso (ms/s)':>18}")
+    for mode, row in rows:
+        rss = f"{row['rss'] / 2**20:10.1f}" if row['rss'] else f"{'?':>10}"
+        print(f"{mode:<8} {row['stage']:<30} {rss} {row['idle_cpu_s'] * 1000 / args.idle:18.2f}")
+
+
+def bench_vault(args):
+    """Open, look up and update a vault with many profiles, against one file rewritten whole."""
+    rng = random.Random(0)
+    key_cache = KeyCache()
+
+    def timed(function, runs):
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            function()
+            samples.append((time.perf_counter() - start) * 1000)
+        return latency_summary(samples)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = PontoVault(os.path.join(tmp, "vault")).open(key_cache.iterations)
+        start = time.perf_counter()
+        key_cache.derive_key("benchmark", vault.salt)
+        derive_ms = (time.perf_counter() - start) * 1000
+        fernet = key_cache.get_fernet("benchmark", vault.salt)
+        names = [f"perfil{index:05d}" for index in range(args.profiles)]
+        records = {name: {'username': name, 'encrypted_password': fernet.encrypt(b"password").decode()}
+                   for name in names}
+        start = time.perf_counter()
+        vault.put_many(records)
+        populate_s = time.perf_counter() - start
+
+        # One JSON file with every profile, rewritten on each change
+        single_path = os.path.join(tmp, "profiles.json")
+        atomic_write(single_path, json.dumps(records))
+
+        def single_open():
+            with open(single_path, 'r') as f:
+                json.load(f)[rng.choice(names)]
+
+        def single_update():
+            with open(single_path, 'r') as f:
+                data = json.load(f)
+            data[rng.choice(names)]['encrypted_password'] = fernet.encrypt(b"new-password").decode()
+            atomic_write(single_path, json.dumps(data))
+
+        def vault_open():
+            PontoVault(vault.directory).open(key_cache.iterations).get(rng.choice(names))
+
+        def vault_update():
+            name = rng.choice(names)
+            vault.put(name, {'username': name, 'encrypted_password': fernet.encrypt(b"new-password").decode()})
+
+        added = iter(range(args.profiles, args.profiles + args.operations))
+
+        def vault_add():
+            name = f"perfil{next(added):05d}"
+            vault.put(name, {'username': name, 'encrypted_password': fernet.encrypt(b"password").decode()})
+
+        results = {
+            'abrir + 1 perfil (cofre)': timed(vault_open, args.operations),
+            'abrir + 1 perfil (arquivo único)': timed(single_open, args.operations),
+            'consulta (cofre aberto)': timed(lambda: vault.get(rng.choice(names)), args.operations),
+            'decifrar 1 senha': timed(lambda: fernet.decrypt(vault.get(rng.choice(names))['encrypted_password'].encode()),
+                                      args.operations),
+            'atualizar perfil (cofre)': timed(vault_update, args.operations),
+            'atualizar perfil (arquivo único)': timed(single_update, args.operations),
+            'incluir perfil (cofre)': timed(vault_add, args.operations),
+            'listar perfis': timed(vault.names, args.operations),
+        }
+
+    print(f"profiles:              {args.profiles}")
+    print(f"populate:              {populate_s:9.2f} s")
+    print(f"PBKDF2 (1 per vault):  {derive_ms:9.1f} ms  (1 per profile: {derive_ms * args.profiles / 1000:.1f} s)")
+    print(f"{'':<34} {'p50':>9} {'p99':>9}  (ms)")
+    for name, stats in results.items():
+        print(f"{name:<34} {stats['p50_ms']:9.3f} {stats['p99_ms']:9.3f}")
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Ponto App - benchmarks')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    key_parser = subparsers.add_parser('key', help='Custo da derivação de chave por batida')
+    key_parser.add_argument('--punches', type=int, default=20, help='Número de batidas simuladas')
+    key_parser.set_defaults(func=bench_key)
+
+    journal_parser = subparsers.add_parser('journal', help='Latência de gravação no diário offline')
+    journal_parser.add_argument('--appends', type=int, default=1000, help='Número de gravações')
+    journal_parser.set_defaults(func=bench_journal)
+
+    startup_parser = subparsers.add_parser('startup', help='Tempo de importação e até a primeira janela')
+    startup_parser.add_argument('--toolkit', choices=['pyqt', 'gtk'], default='pyqt', help='Interface a medir')
+    startup_parser.add_argument('--runs', type=int, default=5, help='Número de execuções')
+    startup_parser.add_argument('--max-ms', type=float, default=None, help='Falhar se a primeira janela demorar mais que isso')
+    startup_parser.set_defaults(func=bench_startup)
+
+    e2e_parser = subparsers.add_parser('e2e', help='Latência de batidas contra o servidor simulado')
+    e2e_parser.add_argument('--punches', type=int, default=200, help='Número de batidas')
+    e2e_parser.add_argument('--latency-ms', type=float, default=20.0, help='Latência do servidor simulado')
+    e2e_parser.add_argument('--jitter-ms', type=float, default=0.0, help='Latência aleatória adicional do servidor')
+    e2e_parser.add_argument('--error-rate', type=float, default=0.0, help='Fração de respostas com erro')
+    e2e_parser.add_argument('--response', choices=RESPONSE_SHAPES, default='ok', help='Formato da resposta do registro')
+    e2e_parser.add_argument('--geo-latency-ms', type=float, default=80.0, help='Latência simulada da geolocalização')
+    e2e_parser.add_argument('--geo-ttl', type=float, default=0.0, help='Validade do cache de localização (0 = sempre consultar)')
+    e2e_parser.add_argument('--cold-token', action='store_true', help='Descartar o token antes de cada batida')
+    e2e_parser.add_argument('--cold-key', action='store_true', help='Descartar a chave derivada antes de cada batida')
+    e2e_parser.add_argument('--serial', action='store_true', help='Resolver a localização só depois do login (sem sobreposição)')
+    e2e_parser.add_argument('--json', action='store_true', help='Imprimir o relatório em JSON')
+    e2e_parser.set_defaults(func=bench_e2e)
+
+    analytics_parser = subparsers.add_parser('analytics', help='Relatório de horas sobre dados sintéticos')
+    analytics_parser.add_argument('--users', type=int, default=500, help='Número de usuários')
+    analytics_parser.add_argument('--years', type=float, default=4.0, help='Anos de batidas por usuário')
+    analytics_parser.add_argument('--baseline-punches', type=int, default=200000, help='Batidas medidas na versão em Python puro')
+    analytics_parser.set_defaults(func=bench_analytics)
+
+    geoip_parser = subparsers.add_parser('geoip', help='Consultas na base de geolocalização offline')
+    geoip_parser.add_argument('--ranges', type=int, default=3000000, help='Número de faixas de IP')
+    geoip_parser.add_argument('--lookups', type=int, default=100000, help='Número de consultas')
+    geoip_parser.set_defaults(func=bench_geoip)
+
+    memory_parser = subparsers.add_parser('memory', help='Memória residente da janela e do modo bandeja (PyQt)')
+    memory_parser.add_argument('--idle', type=float, default=5.0, help='Segundos ociosos medidos em cada estágio')
+    memory_parser.set_defaults(func=bench_memory)
+
+    vault_parser = subparsers.add_parser('vault', help='Abrir, consultar e atualizar um cofre com muitos perfis')
+    vault_parser.add_argument('--profiles', type=int, default=5000, help='Número de perfis no cofre')
+    vault_parser.add_argument('--operations', type=int, default=200, help='Operações medidas de cada tipo')
+    vault_parser.set_defaults(func=bench_vault)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    args.func(args)
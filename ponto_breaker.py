@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Per-endpoint circuit breakers and adaptive timeouts for the API.
+
+Each endpoint (method and path) keeps a rolling window of recent calls:
+
+- when at least half of the recent calls failed (network errors or 5xx
+  responses), the circuit opens and calls fail fast with
+  CircuitOpenError instead of waiting on a dead backend;
+- after a cool-down, one half-open probe call is let through; if it
+  succeeds the circuit closes, otherwise it reopens with a longer
+  cool-down;
+- the read timeout is derived from the observed p99 latency, so a
+  degraded server is detected in seconds rather than after the full
+  configured timeout.
+"""
+# Standard library imports
+import time
+import threading
+from collections import deque
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# Rolling window: at most this many calls, none older than this (seconds)
+BREAKER_SAMPLES = 50
+BREAKER_SAMPLE_AGE = 300
+
+# Trip when the error rate reaches this over at least this many calls
+BREAKER_ERROR_RATE = 0.5
+BREAKER_MIN_CALLS = 5
+
+# Cool-down before a half-open probe; doubled after each failed probe (seconds)
+BREAKER_OPEN_SECONDS = 30
+BREAKER_OPEN_SECONDS_MAX = 300
+
+# Adaptive read timeout: this multiple of the p99 latency, never below the floor
+TIMEOUT_P99_MULTIPLIER = 3.0
+TIMEOUT_FLOOR = 3.0
+TIMEOUT_MIN_SAMPLES = 20
+
+
+class CircuitOpenError(ConnectionError):
+    """The endpoint's circuit is open; the call was not sent."""
+
+    def __init__(self, endpoint, retry_in):
+        super().__init__(f"Circuito aberto para {endpoint}")
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Rolling error rate, latency and open/half-open/closed state of one endpoint."""
+
+    def __init__(self, endpoint, clock=time.monotonic):
+        self.endpoint = endpoint
+        self.clock = clock
+        self.state = STATE_CLOSED
+        self.trips = 0
+        self._samples = deque(maxlen=BREAKER_SAMPLES)
+        self._open_seconds = BREAKER_OPEN_SECONDS
+        self._opened_at = 0.0
+        self._probe_until = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self, timeout):
+        """Raise CircuitOpenError unless a call may be sent now.
+
+        ``timeout`` bounds how long a half-open probe may stay unanswered
+        before another call is allowed to probe.
+        """
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return
+            now = self.clock()
+            retry_at = self._opened_at + self._open_seconds
+            if self.state == STATE_OPEN and now >= retry_at:
+                self.state = STATE_HALF_OPEN
+            if self.state == STATE_HALF_OPEN and now >= self._probe_until:
+                self._probe_until = now + timeout
+                return
+            raise CircuitOpenError(self.endpoint, max(retry_at - now, 0.0))
+
+    def record_success(self, latency):
+        with self._lock:
+            if self.state != STATE_CLOSED:
+                # The probe went through: start over with a clean window
+                self.state = STATE_CLOSED
+                self._samples.clear()
+                self._open_seconds = BREAKER_OPEN_SECONDS
+            self._add(True, latency)
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == STATE_HALF_OPEN:
+                self._open_seconds = min(self._open_seconds * 2, BREAKER_OPEN_SECONDS_MAX)
+                self._trip()
+                return
+            self._add(False, None)
+            if self.state == STATE_CLOSED:
+                calls = len(self._samples)
+                failures = sum(1 for _, ok, _ in self._samples if not ok)
+                if calls >= BREAKER_MIN_CALLS and failures / calls >= BREAKER_ERROR_RATE:
+                    self._trip()
+
+    def timeout(self, configured):
+        """Return the read timeout to use: adapted to the p99 latency, at most ``configured``."""
+        p99 = self.p99()
+        if p99 is None:
+            return configured
+        return min(configured, max(TIMEOUT_FLOOR, p99 * TIMEOUT_P99_MULTIPLIER))
+
+    def p99(self):
+        """Return the p99 latency of recent successful calls, or None if too few."""
+        with self._lock:
+            latencies = sorted(latency for _, ok, latency in self._samples if ok)
+        if len(latencies) < TIMEOUT_MIN_SAMPLES:
+            return None
+        return latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+    def snapshot(self, configured_timeout=None):
+        """Return a JSON-serialisable view of the breaker."""
+        p99 = self.p99()
+        with self._lock:
+            calls = len(self._samples)
+            failures = sum(1 for _, ok, _ in self._samples if not ok)
+            retry_in = None
+            if self.state != STATE_CLOSED:
+                retry_in = round(max(self._opened_at + self._open_seconds - self.clock(), 0.0), 1)
+            snapshot = {
+                'endpoint': self.endpoint,
+                'state': self.state,
+                'trips': self.trips,
+                'calls': calls,
+                'error_rate': round(failures / calls, 3) if calls else 0.0,
+                'p99_ms': round(p99 * 1000, 1) if p99 is not None else None,
+                'retry_in_s': retry_in,
+            }
+        if configured_timeout is not None:
+            snapshot['timeout_s'] = round(self.timeout(configured_timeout), 3)
+        return snapshot
+
+    def _add(self, ok, latency):
+        now = self.clock()
+        while self._samples and now - self._samples[0][0] > BREAKER_SAMPLE_AGE:
+            self._samples.popleft()
+        self._samples.append((now, ok, latency))
+
+    def _trip(self):
+        self.state = STATE_OPEN
+        self.trips += 1
+        self._opened_at = self.clock()
+        self._probe_until = 0.0
+
+
+class CircuitBreakers:
+    """Lazily created breakers, one per endpoint, shared by every caller of a transport."""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, method, path):
+        endpoint = f"{method} {path}"
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(endpoint, self.clock)
+            return breaker
+
+    def snapshots(self, configured_timeout=None):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [breaker.snapshot(configured_timeout) for breaker in breakers]
+
+
+def format_circuits(snapshots):
+    """Return a short status line for endpoints that are failing fast, or ""."""
+    failing = [snapshot for snapshot in snapshots if snapshot['state'] != STATE_CLOSED]
+    if not failing:
+        return ""
+    retry_in = min(snapshot['retry_in_s'] or 0 for snapshot in failing)
+    if retry_in > 0:
+        return f"Servidor indisponível; nova tentativa em {retry_in:.0f} s"
+    return "Servidor indisponível; testando a conexão..."
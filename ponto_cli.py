@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+"""Headless command line interface for Ponto App.
+
+Punches for many profiles at once. The credentials of every profile
+are kept in one vault (~/.config/ponto_app/profiles/.vault, see
+ponto_vault), so the key is derived once for all of them; each profile
+keeps its settings, token cache and history in its own directory under
+~/.config/ponto_app/profiles/<name>.
+
+Usage:
+    python3 ponto_cli.py add-profile NAME --username USER
+    python3 ponto_cli.py list
+    python3 ponto_cli.py punch [NAME ...] [--all] [--workers N] [--async]
+    python3 ponto_cli.py report [NAME ...] [--all] [--file EXPORT] [--month YYYY-MM]
+"""
+# Standard library imports
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import getpass
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Local imports
+from ponto_backend import (
+    PontoBackend, ApiTransport, LocationProvider, default_config_dir, API_BASE_URL, STATUS_OFFLINE,
+)
+from ponto_journal import JournalReplayer
+from ponto_vault import PontoVault
+
+DEFAULT_WORKERS = 32
+
+# Vault with the credentials of all profiles, inside the profiles directory
+PROFILE_VAULT_DIR = ".vault"
+
+
+def profiles_dir(base_dir=None):
+    """Return the directory holding one sub-directory per profile."""
+    return os.path.join(base_dir or default_config_dir(), "profiles")
+
+
+def open_vault(base_dir=None):
+    """Return the vault shared by all profiles."""
+    return PontoVault(os.path.join(profiles_dir(base_dir), PROFILE_VAULT_DIR))
+
+
+def list_profiles(base_dir=None, vault=None):
+    """Return the names of all configured profiles, sorted.
+
+    Profiles from before the vault (credentials in their own config.json)
+    are included; they move into the vault when first used.
+    """
+    names = set((vault or open_vault(base_dir)).names())
+    directory = profiles_dir(base_dir)
+    if os.path.isdir(directory):
+        names.update(
+            name for name in os.listdir(directory)
+            if not name.startswith('.') and name not in names
+            and os.path.exists(os.path.join(directory, name, "config.json"))
+        )
+    return sorted(names)
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values (nearest-rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def latency_summary(latencies):
+    """Return count/mean/p50/p95/p99/max of a list of latencies in milliseconds."""
+    if not latencies:
+        return {'count': 0}
+    return {
+        'count': len(latencies),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(max(latencies), 3),
+    }
+
+
+class BatchPuncher:
+    """Runs register_time for many profiles on a bounded worker pool.
+
+    All backends share one pooled transport and one location provider, so
+    connections and the resolved location are reused across accounts.
+    Profiles left with offline punches are kept open until the end of the
+    run, when their journals are drained once before shutting down.
+    """
+
+    def __init__(self, names, base_dir=None, workers=DEFAULT_WORKERS, base_url=None):
+        self.names = names
+        self.base_dir = base_dir or default_config_dir()
+        self.workers = max(1, workers)
+        self.transport = ApiTransport(base_url or API_BASE_URL, pool_size=self.workers)
+        self.location_provider = LocationProvider(os.path.join(self.base_dir, "location.json"))
+        self.vault = open_vault(self.base_dir)
+        self._offline = []
+        self._offline_lock = threading.Lock()
+
+    def backend_for(self, name):
+        return PontoBackend(
+            config_dir=os.path.join(profiles_dir(self.base_dir), name),
+            transport=self.transport,
+            location_provider=self.location_provider,
+            vault=self.vault,
+            profile=name,
+        )
+
+    def punch_one(self, name):
+        """Punch for one profile and return its result record."""
+        start = time.perf_counter()
+        record = {'profile': name, 'username': ""}
+        backend = None
+        try:
+            backend = self.backend_for(name)
+            record['username'] = backend.username
+            record.update(backend.register_time().as_dict())
+        except Exception as e:
+            record.update({'success': False, 'message': f"Falha ao registrar ponto: {e}", 'time': ""})
+        finally:
+            if backend is not None:
+                self.release(backend)
+        record['latency_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        return record
+
+    def release(self, backend):
+        """Shut a profile's backend down, or keep it for the final drain if it has offline punches."""
+        try:
+            offline = backend.journal is not None and backend.journal.counts().get(STATUS_OFFLINE, 0) > 0
+        except Exception:
+            offline = False
+        if offline:
+            with self._offline_lock:
+                self._offline.append(backend)
+        else:
+            # Stops its replayer and worker pool; the shared transport stays open
+            backend.shutdown()
+
+    def drain_one(self, backend):
+        """Replay a profile's offline punches once, ignoring their backoff; return (sent, left)."""
+        try:
+            if backend.replayer is not None:
+                backend.replayer.stop()
+            sent = JournalReplayer(backend.journal, backend.replay_punch).replay_due(backoff=False)
+            return sent, backend.journal.counts().get(STATUS_OFFLINE, 0)
+        except Exception:
+            return 0, 1
+        finally:
+            backend.shutdown()
+
+    def take_offline(self):
+        with self._offline_lock:
+            backends, self._offline = self._offline, []
+        return backends
+
+    def run(self, on_result=None):
+        """Punch for every profile; call on_result for each record as it completes.
+
+        Returns a stats dict with throughput and latency percentiles.
+        """
+        self.location_provider.prefetch()
+        latencies = []
+        failures = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ponto-batch") as pool:
+            futures = [pool.submit(self.punch_one, name) for name in self.names]
+            for future in as_completed(futures):
+                record = future.result()
+                latencies.append(record['latency_ms'])
+                failures += 0 if record['success'] else 1
+                if on_result:
+                    on_result(record)
+            drained = list(pool.map(self.drain_one, self.take_offline()))
+        elapsed = time.perf_counter() - start
+        self.transport.close()
+        return self.summary(latencies, failures, elapsed, self.transport.circuits(), drained)
+
+    async def run_async(self, on_result=None):
+        """Like run, but all punches share one event loop and connection pool.
+
+        ``workers`` bounds the number of open connections instead of threads.
+        """
+        from ponto_async import AsyncHttpClient, AsyncPontoBackend
+        client = AsyncHttpClient(self.transport.base_url, pool_size=self.workers)
+        self.location_provider.prefetch()
+
+        async def punch_one(name):
+            start = time.perf_counter()
+            record = {'profile': name, 'username': ""}
+            sync_backend = None
+            try:
+                loop = asyncio.get_running_loop()
+                sync_backend = await loop.run_in_executor(None, self.backend_for, name)
+                backend = AsyncPontoBackend(client=client, backend=sync_backend)
+                record['username'] = backend.username
+                record.update((await backend.register_time()).as_dict())
+            except Exception as e:
+                record.update({'success': False, 'message': f"Falha ao registrar ponto: {e}", 'time': ""})
+            finally:
+                if sync_backend is not None:
+                    self.release(sync_backend)
+            record['latency_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            return record
+
+        latencies = []
+        failures = 0
+        start = time.perf_counter()
+        for future in asyncio.as_completed([punch_one(name) for name in self.names]):
+            record = await future
+            latencies.append(record['latency_ms'])
+            failures += 0 if record['success'] else 1
+            if on_result:
+                on_result(record)
+        # Offline punches are replayed through the shared blocking transport
+        loop = asyncio.get_running_loop()
+        drained = await asyncio.gather(*(
+            loop.run_in_executor(None, self.drain_one, backend) for backend in self.take_offline()
+        ))
+        elapsed = time.perf_counter() - start
+        await client.close()
+        self.transport.close()
+        return self.summary(latencies, failures, elapsed, client.circuits(), drained)
+
+    def summary(self, latencies, failures, elapsed, circuits=(), drained=()):
+        """Return a stats dict with throughput, latency percentiles and circuit breaker trips.
+
+        ``drained`` holds a (sent, still offline) pair per profile whose
+        journal was drained at the end of the run.
+        """
+        stats = latency_summary(latencies)
+        stats.update({
+            'succeeded': len(latencies) - failures,
+            'failed': failures,
+            'elapsed_s': round(elapsed, 3),
+            'throughput_per_s': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+            'workers': self.workers,
+            'circuit_trips': sum(circuit['trips'] for circuit in circuits),
+            'replayed': sum(sent for sent, _ in drained),
+            'still_offline': sum(left for _, left in drained),
+        })
+        return stats
+
+
+def cmd_add_profile(args):
+    password = sys.stdin.readline().rstrip("\n") if args.password_stdin else getpass.getpass("Senha: ")
+    backend = PontoBackend(
+        config_dir=os.path.join(profiles_dir(args.config_dir), args.name),
+        vault=open_vault(args.config_dir),
+        profile=args.name,
+    )
+    success, message = backend.update_credentials(args.username, password)
+    print(message, file=sys.stderr)
+    return 0 if success else 1
+
+
+def cmd_list(args):
+    for name in list_profiles(args.config_dir):
+        print(name)
+    return 0
+
+
+def cmd_punch(args):
+    names = list_profiles(args.config_dir) if args.all else args.profiles
+    if not names:
+        print("Nenhum perfil informado (use nomes de perfil ou --all)", file=sys.stderr)
+        return 2
+
+    def emit(record):
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+
+    puncher = BatchPuncher(names, args.config_dir, args.workers, args.base_url)
+    if args.use_async:
+        stats = asyncio.run(puncher.run_async(emit))
+    else:
+        stats = puncher.run(emit)
+    if stats['still_offline']:
+        print(f"{stats['still_offline']} ponto(s) ainda sem conexão; ficam guardados e serão "
+              "enviados na próxima execução", file=sys.stderr)
+    print(json.dumps({'summary': stats}), file=sys.stderr)
+    return 0 if stats['failed'] == 0 else 1
+
+
+def cmd_report(args):
+    try:
+        from ponto_analytics import PunchArrays, WorkedHours
+    except ImportError:
+        print("O relatório de horas requer o numpy (pip install numpy)", file=sys.stderr)
+        return 2
+
+    if args.file:
+        punches = PunchArrays.load(args.file)
+    else:
+        names = list_profiles(args.config_dir) if args.all else args.profiles
+        if names:
+            paths = [os.path.join(profiles_dir(args.config_dir), name, "history.db") for name in names]
+        else:
+            paths = [os.path.join(args.config_dir or default_config_dir(), "history.db")]
+        punches = PunchArrays.from_sqlite([path for path in paths if os.path.exists(path)])
+
+    report = WorkedHours(punches, args.daily_hours)
+    for row in report.monthly(args.month, args.users):
+        print(json.dumps(row, ensure_ascii=False))
+    return 0
+
+
+def parse_arguments(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Ponto App - registro de ponto sem interface gráfica')
+    parser.add_argument('--config-dir', default=None, help='Diretório de configuração base')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    add_parser = subparsers.add_parser('add-profile', help='Criar ou atualizar um perfil')
+    add_parser.add_argument('name', help='Nome do perfil')
+    add_parser.add_argument('--username', required=True, help='Usuário do Icarus')
+    add_parser.add_argument('--password-stdin', action='store_true', help='Ler a senha da entrada padrão')
+    add_parser.set_defaults(func=cmd_add_profile)
+
+    list_parser = subparsers.add_parser('list', help='Listar perfis')
+    list_parser.set_defaults(func=cmd_list)
+
+    punch_parser = subparsers.add_parser('punch', help='Bater ponto para um ou mais perfis')
+    punch_parser.add_argument('profiles', nargs='*', help='Perfis a registrar')
+    punch_parser.add_argument('--all', action='store_true', help='Registrar para todos os perfis')
+    punch_parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Número máximo de registros simultâneos')
+    punch_parser.add_argument('--base-url', default=None, help='URL da API (ex.: servidor simulado local)')
+    punch_parser.add_argument('--async', dest='use_async', action='store_true', help='Usar um único laço asyncio em vez de threads')
+    punch_parser.set_defaults(func=cmd_punch)
+
+    report_parser = subparsers.add_parser('report', help='Horas trabalhadas, extras e banco de horas por mês')
+    report_parser.add_argument('profiles', nargs='*', help='Perfis a incluir (padrão: histórico principal)')
+    report_parser.add_argument('--all', action='store_true', help='Incluir todos os perfis')
+    report_parser.add_argument('--file', default=None, help='Ler de um history.db ou exportação CSV/JSON')
+    report_parser.add_argument('--month', default=None, help='Mês no formato AAAA-MM')
+    report_parser.add_argument('--users', nargs='*', default=None, help='Filtrar por usuário')
+    report_parser.add_argument('--daily-hours', type=float, default=8.0, help='Jornada diária esperada em horas')
+    report_parser.set_defaults(func=cmd_report)
+
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    sys.exit(args.func(args))
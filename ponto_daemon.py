@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+"""Long-lived Ponto App backend daemon.
+
+Keeps one warm PontoBackend (derived key, pooled HTTP connections,
+cached token and location) and serves it over a Unix domain socket in
+the config directory. The GUIs and the command line act as thin
+clients, so a punch from a freshly opened window only pays for the
+register round-trip.
+
+Protocol: one JSON object per line. Requests are
+``{"cmd": "register" | "status" | "history" | "summary" | "update_credentials" | "cancel", ...}``.
+``register`` streams ``{"progress": phase}`` lines followed by
+``{"result": {...}}``; other commands answer with a single line.
+
+Usage:
+    python3 ponto_daemon.py serve
+    python3 ponto_daemon.py punch
+    python3 ponto_daemon.py status
+    python3 ponto_daemon.py credentials --username USER
+"""
+# Standard library imports
+import os
+import sys
+import json
+import time
+import socket
+import getpass
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+
+# Local imports
+from ponto_profile import Profiler, profile_requested, add_profile_arguments, profiled
+
+# Start profiling before the backend imports so they are measured too
+PROFILER = Profiler() if __name__ == "__main__" and profile_requested() else None
+
+from ponto_backend import PontoBackend, PunchResult, default_config_dir
+from ponto_history import HISTORY_LIMIT
+from ponto_breaker import format_circuits
+
+SOCKET_NAME = "ponto.sock"
+CONNECT_TIMEOUT = 0.5
+
+
+def socket_path(config_dir=None):
+    """Return the daemon socket path for a config directory."""
+    return os.path.join(config_dir or default_config_dir(), SOCKET_NAME)
+
+
+class DaemonHandler(socketserver.StreamRequestHandler):
+    """Serves one client connection; several requests may share it."""
+
+    def send(self, message):
+        self.wfile.write((json.dumps(message, ensure_ascii=False) + "\n").encode())
+        self.wfile.flush()
+
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                self.send({'error': "Requisição inválida"})
+                continue
+            command = request.get('cmd')
+            if command == 'register':
+                self.handle_register()
+                # A register connection is used for a single punch
+                return
+            elif command == 'status':
+                self.send({'result': self.server.status()})
+            elif command == 'history':
+                backend = self.server.backend
+                if request.get('today'):
+                    self.send({'result': backend.todays_punches()})
+                else:
+                    self.send({'result': backend.punch_history(request.get('limit', HISTORY_LIMIT))})
+            elif command == 'summary':
+                self.send({'result': self.server.backend.month_summary(request.get('month'))})
+            elif command == 'update_credentials':
+                success, message = self.server.backend.update_credentials(
+                    request.get('username', ''), request.get('password') or None
+                )
+                self.send({'result': {'success': success, 'message': message}})
+            else:
+                self.send({'error': f"Comando desconhecido: {command}"})
+
+    def handle_register(self):
+        cancel_event = threading.Event()
+
+        # Watch the connection for a cancel request (or the client going
+        # away) while the punch runs
+        def watch():
+            try:
+                for line in self.rfile:
+                    if json.loads(line).get('cmd') == 'cancel':
+                        break
+            except (OSError, ValueError):
+                pass
+            cancel_event.set()
+        threading.Thread(target=watch, daemon=True).start()
+
+        def progress(phase):
+            try:
+                self.send({'progress': phase})
+            except OSError:
+                cancel_event.set()
+
+        result = self.server.backend.register_time(progress, cancel_event)
+        self.server.punches += 1
+        try:
+            self.send({'result': result.as_dict()})
+        except OSError:
+            pass
+
+
+class PontoDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server around a single warm PontoBackend."""
+
+    daemon_threads = True
+
+    def __init__(self, backend=None, path=None):
+        self.backend = backend or PontoBackend()
+        self.path = path or socket_path(self.backend.config_dir)
+        self.started_at = time.time()
+        self.punches = 0
+        if os.path.exists(self.path):
+            # Only replace a stale socket, never a live daemon
+            if ping(self.path):
+                raise RuntimeError(f"Daemon já em execução em {self.path}")
+            os.remove(self.path)
+        # Bind with a restrictive umask: the socket is never reachable by
+        # other users, not even between bind() and chmod()
+        previous_umask = os.umask(0o077)
+        try:
+            super().__init__(self.path, DaemonHandler)
+        finally:
+            os.umask(previous_umask)
+        os.chmod(self.path, 0o600)
+
+    def status(self):
+        status = self.backend.status()
+        status.update({
+            'pid': os.getpid(),
+            'uptime_s': round(time.time() - self.started_at, 1),
+            'punches': self.punches,
+        })
+        return status
+
+    def warm_up(self):
+        """Load dependencies, derive the key and prefetch the location up front."""
+        self.backend.warm_up()
+        if self.backend.has_credentials():
+            self.backend.key_cache.get_fernet(self.backend.secret_key, self.backend.salt)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.backend.shutdown()
+
+
+def ping(path):
+    """Return True if a daemon answers on path."""
+    try:
+        DaemonClient(path).request({'cmd': 'status'})
+        return True
+    except (OSError, ValueError):
+        return False
+
+
+class DaemonClient:
+    """Thin client with the subset of the PontoBackend API the front-ends use."""
+
+    def __init__(self, path=None):
+        self.path = path or socket_path()
+        self.username = ""
+        self.configured = False
+        self.profiler = None
+
+    def connect(self):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(CONNECT_TIMEOUT)
+        client.connect(self.path)
+        client.settimeout(None)
+        return client
+
+    def request(self, message):
+        """Send a one-shot command and return its result."""
+        with self.connect() as client, client.makefile('rwb') as stream:
+            stream.write((json.dumps(message) + "\n").encode())
+            stream.flush()
+            response = json.loads(stream.readline())
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['result']
+
+    def status(self):
+        status = self.request({'cmd': 'status'})
+        self.username = status.get('username', "")
+        self.configured = status.get('configured', False)
+        return status
+
+    def has_credentials(self):
+        return self.configured
+
+    def circuit_message(self):
+        try:
+            return format_circuits(self.status().get('circuits', []))
+        except (OSError, ValueError):
+            return ""
+
+    def update_credentials(self, username, password=None):
+        try:
+            result = self.request({'cmd': 'update_credentials', 'username': username, 'password': password})
+        except (OSError, ValueError) as e:
+            return False, f"Falha ao comunicar com o serviço: {e}"
+        self.status()
+        return result['success'], result['message']
+
+    def punch_history(self, limit=HISTORY_LIMIT):
+        try:
+            return self.request({'cmd': 'history', 'limit': limit})
+        except (OSError, ValueError):
+            return []
+
+    def todays_punches(self):
+        try:
+            return self.request({'cmd': 'history', 'today': True})
+        except (OSError, ValueError):
+            return []
+
+    def month_summary(self, month=None):
+        try:
+            return tuple(self.request({'cmd': 'summary', 'month': month}))
+        except (OSError, ValueError) as e:
+            return False, f"Falha ao comunicar com o serviço: {e}"
+
+    @profiled('punch')
+    def register_time(self, progress=None, cancel_event=None):
+        """Punch through the daemon; same return value as PontoBackend.register_time."""
+        current_time = time.strftime("%H:%M:%S")
+        try:
+            with self.connect() as client, client.makefile('rwb') as stream:
+                stream.write(b'{"cmd": "register"}\n')
+                stream.flush()
+
+                done = threading.Event()
+                if cancel_event is not None:
+                    def forward_cancel():
+                        while not done.is_set():
+                            if cancel_event.wait(0.2):
+                                try:
+                                    client.sendall(b'{"cmd": "cancel"}\n')
+                                except OSError:
+                                    pass
+                                return
+                    threading.Thread(target=forward_cancel, daemon=True).start()
+
+                try:
+                    return self._read_result(stream, progress, current_time)
+                finally:
+                    done.set()
+        except (OSError, ValueError) as e:
+            return PunchResult(False, f"Falha ao comunicar com o serviço: {e}", current_time)
+
+    def _read_result(self, stream, progress, current_time):
+        for line in stream:
+            message = json.loads(line)
+            if 'progress' in message and progress:
+                progress(message['progress'])
+            elif 'result' in message:
+                return PunchResult.from_dict(message['result'])
+        return PunchResult(False, "O serviço encerrou a conexão", current_time)
+
+    def submit_register_time(self, progress=None, cancel_event=None):
+        """Run register_time in a thread and return its Future."""
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self.register_time(progress, cancel_event))
+            except Exception as e:
+                future.set_exception(e)
+        future.set_running_or_notify_cancel()
+        threading.Thread(target=run, name="ponto-client", daemon=True).start()
+        return future
+
+    def warm_up(self):
+        """The daemon is already warm."""
+
+    def submit_prepare(self):
+        """The daemon keeps its connection, key and token ready."""
+
+    def cancel_prepare(self):
+        """Nothing to cancel; see submit_prepare."""
+
+    def shutdown(self):
+        """Nothing to release; the daemon keeps running."""
+
+
+def connect_backend(config_dir=None):
+    """Return a DaemonClient if a daemon is running, else a local PontoBackend."""
+    if hasattr(socket, 'AF_UNIX'):
+        client = DaemonClient(socket_path(config_dir))
+        try:
+            client.status()
+            return client
+        except (OSError, ValueError):
+            pass
+    return PontoBackend(config_dir=config_dir)
+
+
+def cmd_serve(args):
+    backend = PontoBackend(config_dir=args.config_dir)
+    try:
+        server = PontoDaemon(backend)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    server.warm_up()
+    if PROFILER:
+        backend.profiler = PROFILER
+        PROFILER.finish()
+    if args.schedule:
+        # Fire scheduled punches from the same warm backend
+        from ponto_scheduler import Schedule, PunchScheduler
+        PunchScheduler(backend, Schedule.load(args.config_dir)).start()
+    print(f"Ponto daemon escutando em {server.path}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+def cmd_punch(args):
+    client = DaemonClient(socket_path(args.config_dir))
+    client.profiler = PROFILER
+    result = client.register_time(progress=lambda phase: print(f"{phase}...", file=sys.stderr))
+    print(json.dumps(result.as_dict(), ensure_ascii=False))
+    return 0 if result.success else 1
+
+
+def cmd_status(args):
+    try:
+        status = DaemonClient(socket_path(args.config_dir)).status()
+    except (OSError, ValueError) as e:
+        print(f"Daemon indisponível: {e}", file=sys.stderr)
+        return 1
+    print(json.dumps(status, ensure_ascii=False, indent=2))
+    return 0
+
+
+def cmd_credentials(args):
+    password = getpass.getpass("Senha (vazio para manter): ")
+    client = DaemonClient(socket_path(args.config_dir))
+    success, message = client.update_credentials(args.username, password or None)
+    print(message, file=sys.stderr)
+    return 0 if success else 1
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Ponto App - serviço em segundo plano')
+    parser.add_argument('--config-dir', default=None, help='Diretório de configuração')
+    add_profile_arguments(parser)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = subparsers.add_parser('serve', help='Iniciar o serviço')
+    serve_parser.add_argument('--schedule', action='store_true', help='Bater ponto nos horários de schedule.json')
+    serve_parser.set_defaults(func=cmd_serve)
+    subparsers.add_parser('punch', help='Bater ponto pelo serviço').set_defaults(func=cmd_punch)
+    subparsers.add_parser('status', help='Estado do serviço').set_defaults(func=cmd_status)
+
+    credentials_parser = subparsers.add_parser('credentials', help='Atualizar usuário e senha')
+    credentials_parser.add_argument('--username', required=True, help='Usuário do Icarus')
+    credentials_parser.set_defaults(func=cmd_credentials)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    if PROFILER:
+        PROFILER.top = args.profile_top
+        PROFILER.config_dir = args.config_dir
+        if args.command != 'serve':
+            PROFILER.finish()
+    sys.exit(args.func(args))
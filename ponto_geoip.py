@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""Offline IP-to-location lookup and per-network site coordinates.
+
+OfflineLocator is a drop-in for get_current_location (same signature):
+
+1. configured sites are matched against the current network, by default
+   gateway (IP or MAC address) and/or Wi-Fi SSID;
+2. otherwise the machine's address is looked up in a local IP-range
+   database: a sorted binary file that is memory-mapped and binary
+   searched, so a lookup takes microseconds and needs no network.
+
+The database covers IPv4 ranges. It is built from a CSV of ranges with
+coordinates, either ``start,end,...,latitude,longitude`` (DB-IP "IP to
+City Lite" format) or a file with a header naming ``network`` (CIDR) or
+``start``/``end`` and ``latitude``/``longitude`` columns. Only the
+local addresses are looked up, so it should map the organisation's own
+ranges (internal subnets per office, or the public ranges a host uses
+directly).
+
+Usage:
+    python3 ponto_geoip.py build ranges.csv [-o geoip.bin]
+    python3 ponto_geoip.py lookup [IP]
+    python3 ponto_geoip.py where
+"""
+# Standard library imports
+import os
+import sys
+import csv
+import mmap
+import socket
+import struct
+import argparse
+import ipaddress
+import subprocess
+from array import array
+from bisect import bisect_right
+
+# Local imports
+from ponto_backend import default_config_dir
+
+DATABASE_NAME = "geoip.bin"
+
+# File layout: header, then count little-endian uint32 range starts, count
+# uint32 range ends and count pairs of float64 (latitude, longitude)
+MAGIC = b"PGEOIP2\0"
+HEADER = struct.Struct("<8sII")
+IPV4 = struct.Struct("!I")
+
+# Databases built before the float64 layout store float32 coordinates,
+# which keep about 7 significant digits (~2 m at 180° longitude); they
+# are rounded to 5 decimal places to drop the representation noise
+MAGIC_FLOAT32 = b"PGEOIP1\0"
+FLOAT32_DIGITS = 5
+
+# Address used to find the outbound interface; no packet is sent
+PROBE_ADDRESS = ("192.0.2.1", 9)
+
+
+class GeoIPDatabase:
+    """Memory-mapped, sorted IPv4 range database."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, _ = HEADER.unpack_from(self._map, 0)
+        if magic == MAGIC:
+            coord_type, self._digits = 'd', None
+        elif magic == MAGIC_FLOAT32:
+            coord_type, self._digits = 'f', FLOAT32_DIGITS
+        else:
+            self._map.close()
+            raise ValueError(f"{path} não é uma base de geolocalização")
+        self.count = count
+        view = memoryview(self._map)
+        starts_end = HEADER.size + 4 * count
+        ends_end = starts_end + 4 * count
+        coords_end = ends_end + 2 * struct.calcsize(coord_type) * count
+        if sys.byteorder == 'little':
+            # Zero-copy: bisect runs directly on the mapped pages
+            self._starts = view[HEADER.size:starts_end].cast('I')
+            self._ends = view[starts_end:ends_end].cast('I')
+            self._coords = view[ends_end:coords_end].cast(coord_type)
+        else:
+            self._starts = self._load(view[HEADER.size:starts_end], 'I')
+            self._ends = self._load(view[starts_end:ends_end], 'I')
+            self._coords = self._load(view[ends_end:coords_end], coord_type)
+
+    @staticmethod
+    def _load(buffer, typecode):
+        values = array(typecode, bytes(buffer))
+        values.byteswap()
+        return values
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, address):
+        """Return (latitude, longitude) of the range containing address, or None."""
+        try:
+            ip, = IPV4.unpack(socket.inet_aton(address))
+        except (OSError, TypeError):
+            return None
+        index = bisect_right(self._starts, ip) - 1
+        if index < 0 or ip > self._ends[index]:
+            return None
+        latitude, longitude = self._coords[2 * index], self._coords[2 * index + 1]
+        if self._digits is not None:
+            latitude, longitude = round(latitude, self._digits), round(longitude, self._digits)
+        return latitude, longitude
+
+    def close(self):
+        for view in (self._starts, self._ends, self._coords):
+            if isinstance(view, memoryview):
+                view.release()
+        self._map.close()
+
+
+def write_database(ranges, path):
+    """Write (start, end, latitude, longitude) IPv4 ranges to a database file.
+
+    ``start``/``end`` are integers; ranges must not overlap. Returns the
+    number of ranges written.
+    """
+    ranges = sorted(ranges)
+    starts = array('I', (r[0] for r in ranges))
+    ends = array('I', (r[1] for r in ranges))
+    coords = array('d')
+    for _, _, latitude, longitude in ranges:
+        coords.append(latitude)
+        coords.append(longitude)
+    if sys.byteorder != 'little':
+        for values in (starts, ends, coords):
+            values.byteswap()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(ranges), 0))
+        starts.tofile(f)
+        ends.tofile(f)
+        coords.tofile(f)
+    os.replace(tmp_path, path)
+    return len(ranges)
+
+
+def read_ranges(path):
+    """Yield IPv4 (start, end, latitude, longitude) ranges from a CSV file."""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        columns = None
+        for row in reader:
+            if not row or row[0].startswith('#'):
+                continue
+            if columns is None:
+                columns = _columns(row)
+                if columns['header']:
+                    continue
+            try:
+                if columns['network'] is not None:
+                    network = ipaddress.ip_network(row[columns['network']].strip(), strict=False)
+                    if network.version != 4:
+                        continue
+                    start, end = int(network.network_address), int(network.broadcast_address)
+                else:
+                    first = ipaddress.ip_address(row[columns['start']].strip())
+                    last = ipaddress.ip_address(row[columns['end']].strip())
+                    if first.version != 4 or last.version != 4:
+                        continue
+                    start, end = int(first), int(last)
+                latitude = float(row[columns['latitude']])
+                longitude = float(row[columns['longitude']])
+            except (ValueError, IndexError):
+                continue
+            yield start, end, latitude, longitude
+
+
+def _columns(row):
+    """Work out the column layout from the first row."""
+    names = [name.strip().lower() for name in row]
+    header = not _is_address(row[0].split('/')[0].strip())
+    if not header:
+        # Headerless: start,end,...,latitude,longitude or network,...,latitude,longitude
+        network = 0 if '/' in row[0] else None
+        return {'header': False, 'network': network, 'start': 0, 'end': 1,
+                'latitude': len(row) - 2, 'longitude': len(row) - 1}
+
+    def find(*candidates):
+        for candidate in candidates:
+            if candidate in names:
+                return names.index(candidate)
+        return None
+    return {
+        'header': True,
+        'network': find('network', 'cidr'),
+        'start': find('start', 'ip_start', 'start_ip', 'first'),
+        'end': find('end', 'ip_end', 'end_ip', 'last'),
+        'latitude': find('latitude', 'lat'),
+        'longitude': find('longitude', 'lon', 'lng'),
+    }
+
+
+def _is_address(value):
+    try:
+        ipaddress.ip_address(value)
+        return True
+    except ValueError:
+        return False
+
+
+def local_address():
+    """Return the IPv4 address of the interface that routes to the internet, or None."""
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as probe:
+            # connect() on UDP only picks the route; nothing is sent
+            probe.connect(PROBE_ADDRESS)
+            return probe.getsockname()[0]
+    except OSError:
+        return None
+
+
+def default_gateway():
+    """Return the IPv4 default gateway, or None."""
+    try:
+        with open("/proc/net/route") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if fields[1] == "00000000" and int(fields[3], 16) & 2:
+                    return socket.inet_ntoa(struct.pack("<L", int(fields[2], 16)))
+    except (OSError, StopIteration, ValueError, IndexError):
+        pass
+    # Other platforms: ask the routing table tool
+    if sys.platform == 'win32':
+        command = ["route", "print", "0.0.0.0"]
+    else:
+        command = ["netstat", "-rn"]
+    output = _run(command)
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) >= 3 and fields[0] in ("default", "0.0.0.0"):
+            candidate = fields[2] if sys.platform == 'win32' else fields[1]
+            if _is_address(candidate):
+                return candidate
+    return None
+
+
+def gateway_mac(gateway):
+    """Return the MAC address of the gateway from the ARP table, or None."""
+    if not gateway:
+        return None
+    try:
+        with open("/proc/net/arp") as f:
+            next(f)
+            for line in f:
+                fields = line.split()
+                if fields[0] == gateway:
+                    return fields[3].lower()
+    except (OSError, StopIteration, IndexError):
+        pass
+    return None
+
+
+def wifi_ssid():
+    """Return the SSID of the connected Wi-Fi network, or None."""
+    if sys.platform == 'win32':
+        for line in _run(["netsh", "wlan", "show", "interfaces"]).splitlines():
+            name, _, value = line.partition(":")
+            if name.strip() == "SSID":
+                return value.strip() or None
+    elif sys.platform == 'darwin':
+        output = _run(["networksetup", "-getairportnetwork", "en0"])
+        if ":" in output:
+            return output.split(":", 1)[1].strip() or None
+    else:
+        return _run(["iwgetid", "-r"]).strip() or None
+    return None
+
+
+def _run(command):
+    try:
+        return subprocess.run(command, capture_output=True, text=True, timeout=2).stdout
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def match_site(sites, network):
+    """Return the first site whose gateway/ssid keys all match network, or None."""
+    for site in sites:
+        keys = [key for key in ('gateway', 'gateway_mac', 'ssid') if site.get(key)]
+        if keys and all(str(site[key]).lower() == str(network.get(key) or "").lower() for key in keys):
+            return site
+    return None
+
+
+class OfflineLocator:
+    """get_current_location replacement: configured sites, then the local IP database.
+
+    ``fallback`` (e.g. get_current_location) is called when neither
+    knows the current network.
+    """
+
+    def __init__(self, database_path=None, sites=None, fallback=None):
+        self.database_path = database_path
+        self.sites = sites or []
+        self.fallback = fallback
+        self._database = None
+
+    @property
+    def database(self):
+        if self._database is None and self.database_path and os.path.exists(self.database_path):
+            try:
+                self._database = GeoIPDatabase(self.database_path)
+            except (OSError, ValueError):
+                self.database_path = None
+        return self._database
+
+    def network(self):
+        """Return the gateway, gateway MAC and SSID of the current network."""
+        network = {'gateway': default_gateway()}
+        if any(site.get('gateway_mac') for site in self.sites):
+            network['gateway_mac'] = gateway_mac(network['gateway'])
+        if any(site.get('ssid') for site in self.sites):
+            # Spawns a tool; only when a site needs it
+            network['ssid'] = wifi_ssid()
+        return network
+
+    def __call__(self):
+        if self.sites:
+            site = match_site(self.sites, self.network())
+            if site:
+                return site['latitude'], site['longitude']
+        database = self.database
+        if database is not None:
+            address = local_address()
+            location = database.lookup(address) if address else None
+            if location:
+                return location
+        if self.fallback:
+            return self.fallback()
+        return None, None
+
+
+def cmd_build(args):
+    count = write_database(read_ranges(args.csv), args.output)
+    print(f"{count} faixas gravadas em {args.output}", file=sys.stderr)
+    return 0
+
+
+def cmd_lookup(args):
+    address = args.ip or local_address()
+    try:
+        database = GeoIPDatabase(args.database)
+    except (OSError, ValueError) as e:
+        print(e, file=sys.stderr)
+        return 1
+    location = database.lookup(address) if address else None
+    print(f"{address}: {location if location else 'não encontrado'}")
+    return 0 if location else 1
+
+
+def cmd_where(args):
+    gateway = default_gateway()
+    print(f"Endereço local: {local_address()}")
+    print(f"Gateway: {gateway} ({gateway_mac(gateway) or 'MAC desconhecido'})")
+    print(f"SSID: {wifi_ssid()}")
+    return 0
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Ponto App - geolocalização offline')
+    default_path = os.path.join(default_config_dir(), DATABASE_NAME)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='Gerar a base a partir de um CSV de faixas de IP')
+    build_parser.add_argument('csv', help='CSV com faixas de IP e coordenadas')
+    build_parser.add_argument('-o', '--output', default=default_path, help='Arquivo da base gerada')
+    build_parser.set_defaults(func=cmd_build)
+
+    lookup_parser = subparsers.add_parser('lookup', help='Consultar um IP (padrão: o endereço local)')
+    lookup_parser.add_argument('ip', nargs='?', help='Endereço IPv4')
+    lookup_parser.add_argument('--database', default=default_path, help='Arquivo da base')
+    lookup_parser.set_defaults(func=cmd_lookup)
+
+    where_parser = subparsers.add_parser('where', help='Mostrar gateway e SSID da rede atual (para configurar locais)')
+    where_parser.set_defaults(func=cmd_where)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    sys.exit(args.func(args))
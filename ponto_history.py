@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Local punch history.
+
+Successful punches are recorded in an SQLite database (WAL mode) in the
+config directory, indexed by user and time, so the front-ends can show
+today's punches and the recent history without any network call.
+
+Punches made elsewhere (another machine, the web page) are merged in by
+an incremental sync: only records newer than the per-user high-water
+mark are requested from the server.
+"""
+# Standard library imports
+import time
+import sqlite3
+import threading
+from datetime import datetime
+
+SOURCE_LOCAL = "local"
+SOURCE_SERVER = "server"
+
+# A server record this close (seconds) to an unmatched local punch is the same punch
+MATCH_WINDOW = 120
+
+# Default number of entries in the recent history
+HISTORY_LIMIT = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    punched_at REAL NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    source TEXT NOT NULL,
+    remote_id TEXT
+);
+CREATE INDEX IF NOT EXISTS history_user_time ON history (username, punched_at);
+CREATE UNIQUE INDEX IF NOT EXISTS history_remote ON history (username, remote_id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    username TEXT PRIMARY KEY,
+    high_water REAL NOT NULL,
+    synced_at REAL NOT NULL
+);
+"""
+
+
+def parse_timestamp(value):
+    """Return a Unix timestamp for an epoch number or an ISO 8601 string."""
+    if isinstance(value, (int, float)):
+        # Epoch in milliseconds
+        return value / 1000 if value > 1e11 else float(value)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+
+
+def start_of_day(now=None):
+    """Return the timestamp of local midnight for now."""
+    today = datetime.fromtimestamp(now or time.time()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today.timestamp()
+
+
+def format_today(punches):
+    """Return the summary line shown under the clock button."""
+    if not punches:
+        return "Nenhum registro hoje"
+    times = " · ".join(datetime.fromtimestamp(p['punched_at']).strftime("%H:%M") for p in punches)
+    return f"Hoje: {times}"
+
+
+def format_history(punches):
+    """Return the recent history as one line per punch."""
+    if not punches:
+        return "Nenhum registro no histórico"
+    return "\n".join(datetime.fromtimestamp(p['punched_at']).strftime("%d/%m/%Y %H:%M:%S") for p in punches)
+
+
+def format_summary(summary):
+    """Return a month summary (see PontoBackend.month_summary) as text."""
+    return (
+        f"Mês: {summary['month']}\n"
+        f"Dias trabalhados: {summary['days']}\n"
+        f"Horas trabalhadas: {summary['worked_h']:.2f} h de {summary['expected_h']:.2f} h\n"
+        f"Horas extras: {summary['overtime_h']:.2f} h\n"
+        f"Saldo do mês: {summary['balance_h']:+.2f} h\n"
+        f"Banco de horas: {summary['bank_h']:+.2f} h\n"
+        f"Dias com batida ímpar: {summary['incomplete_days']}"
+    )
+
+
+class PunchHistory:
+    """SQLite store of past punches with a per-user sync high-water mark."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def record(self, username, punched_at=None, latitude=None, longitude=None):
+        """Record a punch made from this machine and return its id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO history (username, punched_at, latitude, longitude, source) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (username, punched_at or time.time(), latitude, longitude, SOURCE_LOCAL),
+            )
+            return cursor.lastrowid
+
+    def merge(self, username, records):
+        """Merge server records into the history; return the number added.
+
+        Each record is a dict with ``remote_id``, ``punched_at`` and
+        optionally ``latitude``/``longitude``. A record matching an
+        unsynced local punch is attached to it instead of duplicated.
+        """
+        added = 0
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                high_water = self._high_water(username)
+                for record in records:
+                    remote_id = str(record['remote_id'])
+                    punched_at = record['punched_at']
+                    local = self._conn.execute(
+                        "SELECT id FROM history WHERE username = ? AND remote_id IS NULL "
+                        "AND punched_at BETWEEN ? AND ? ORDER BY ABS(punched_at - ?) LIMIT 1",
+                        (username, punched_at - MATCH_WINDOW, punched_at + MATCH_WINDOW, punched_at),
+                    ).fetchone()
+                    if local is not None:
+                        self._conn.execute(
+                            "UPDATE OR IGNORE history SET remote_id = ? WHERE id = ?", (remote_id, local['id'])
+                        )
+                    else:
+                        cursor = self._conn.execute(
+                            "INSERT OR IGNORE INTO history "
+                            "(username, punched_at, latitude, longitude, source, remote_id) "
+                            "VALUES (?, ?, ?, ?, ?, ?)",
+                            (username, punched_at, record.get('latitude'), record.get('longitude'),
+                             SOURCE_SERVER, remote_id),
+                        )
+                        added += cursor.rowcount
+                    high_water = max(high_water or 0.0, punched_at)
+                if high_water is not None:
+                    self._conn.execute(
+                        "INSERT INTO sync_state (username, high_water, synced_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT (username) DO UPDATE SET high_water = excluded.high_water, "
+                        "synced_at = excluded.synced_at",
+                        (username, high_water, time.time()),
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return added
+
+    def _high_water(self, username):
+        row = self._conn.execute(
+            "SELECT high_water FROM sync_state WHERE username = ?", (username,)
+        ).fetchone()
+        return row['high_water'] if row else None
+
+    def high_water(self, username):
+        """Return the timestamp of the newest server record seen, or None."""
+        with self._lock:
+            return self._high_water(username)
+
+    def recent(self, username, limit=HISTORY_LIMIT, since=None):
+        """Return the newest punches of username (newest first) as dicts."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT punched_at, latitude, longitude, source, remote_id FROM history "
+                "WHERE username = ? AND punched_at >= ? ORDER BY punched_at DESC LIMIT ?",
+                (username, since or 0.0, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def today(self, username, now=None):
+        """Return today's punches of username, oldest first."""
+        return list(reversed(self.recent(username, limit=-1, since=start_of_day(now))))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Durable offline journal of punch attempts.
+
+Every punch is appended to an SQLite database (WAL mode) in the config
+directory before any network I/O, and its outcome is recorded once the
+attempt finishes. Punches that could not reach the server are replayed
+later by JournalReplayer with exponential backoff.
+
+Several processes (the GUI, the daemon, the scheduler) may replay from
+the same journal: entries are claimed in an immediate transaction, so
+each is sent by one of them only, and an attempt in flight holds a lease;
+only attempts whose lease ran out (the process died) are marked unknown.
+
+The Icarus API stamps a punch with the time it is received, so the
+original timestamp kept here is for the user's own records. For the same
+reason a replay is only worth sending shortly after the punch and while
+nothing newer was sent: older entries expire, and entries overtaken by a
+later punch are dropped as duplicates.
+"""
+# Standard library imports
+import math
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Entry states
+STATUS_INFLIGHT = "inflight"    # attempt running (or the process died during it, see lease_until)
+STATUS_SENT = "sent"            # accepted by the server
+STATUS_FAILED = "failed"        # rejected by the server or local error; not replayed
+STATUS_OFFLINE = "offline"      # never reached the server; will be replayed
+STATUS_UNKNOWN = "unknown"      # may have reached the server; not replayed automatically
+STATUS_CANCELLED = "cancelled"  # cancelled by the user before it was sent
+STATUS_DUPLICATE = "duplicate"  # superseded by another punch in the same window or a later one
+STATUS_EXPIRED = "expired"      # too old to replay; the server would stamp it with the wrong time
+
+# Replay backoff (seconds)
+REPLAY_BACKOFF_BASE = 15
+REPLAY_BACKOFF_MAX = 15 * 60
+
+# Offline punches of the same user closer than this (seconds) are one punch
+DUPLICATE_WINDOW = 120
+
+# Offline punches older than this (seconds) are expired instead of replayed
+REPLAY_MAX_AGE = 30 * 60
+
+# An attempt in flight for longer than this (seconds) was abandoned by its process
+INFLIGHT_LEASE = 10 * 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS punches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    punched_at REAL NOT NULL,
+    latitude REAL,
+    longitude REAL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL,
+    last_error TEXT,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS punches_replay ON punches (status, next_attempt_at);
+"""
+
+
+class PunchJournal:
+    """Append-only SQLite journal of punch attempts."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        # WAL + synchronous=NORMAL keeps an append well under a millisecond
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(punches)")}
+        if 'lease_until' not in columns:
+            # Journals created before leases
+            self._conn.execute("ALTER TABLE punches ADD COLUMN lease_until REAL")
+        self.recover()
+
+    def append(self, username, punched_at=None, latitude=None, longitude=None):
+        """Record a new punch attempt and return its id."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO punches (username, punched_at, latitude, longitude, status, lease_until) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (username, punched_at or time.time(), latitude, longitude, STATUS_INFLIGHT,
+                 time.time() + INFLIGHT_LEASE),
+            )
+            return cursor.lastrowid
+
+    def complete(self, entry_id, status, latitude=None, longitude=None, error=None):
+        """Record the outcome of an attempt.
+
+        Offline entries are scheduled for replay with exponential backoff.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT attempts FROM punches WHERE id = ?", (entry_id,)
+            ).fetchone()
+            if row is None:
+                return
+            attempts = row['attempts'] + 1
+            next_attempt_at = None
+            if status == STATUS_OFFLINE:
+                delay = min(REPLAY_BACKOFF_BASE * 2 ** (attempts - 1), REPLAY_BACKOFF_MAX)
+                next_attempt_at = time.time() + delay
+            self._conn.execute(
+                "UPDATE punches SET status = ?, attempts = ?, next_attempt_at = ?, "
+                "latitude = COALESCE(?, latitude), longitude = COALESCE(?, longitude), "
+                "last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt_at, latitude, longitude, error, entry_id),
+            )
+
+    def release(self, entry_id):
+        """Return a claimed entry to the replay queue without counting an attempt."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE punches SET status = ? WHERE id = ? AND status = ?",
+                (STATUS_OFFLINE, entry_id, STATUS_INFLIGHT),
+            )
+
+    def recover(self, now=None):
+        """Mark attempts interrupted by a crash as unknown; they may have been sent.
+
+        Attempts still within their lease may belong to another running
+        process and are left alone.
+        """
+        with self._lock:
+            self._recover(now or time.time())
+
+    def _recover(self, now):
+        self._conn.execute(
+            "UPDATE punches SET status = ? WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)",
+            (STATUS_UNKNOWN, STATUS_INFLIGHT, now),
+        )
+
+    def superseded(self, entry):
+        """Return True if another punch of the entry's user makes replaying it wrong.
+
+        That is a pending or sent punch within DUPLICATE_WINDOW before it,
+        or a later punch that may have reached the server: sent, unknown,
+        or a live attempt in flight (replays being claimed don't count).
+        """
+        with self._lock:
+            return self._superseded(entry)
+
+    def _superseded(self, entry):
+        return self._conn.execute(
+            "SELECT 1 FROM punches WHERE username = ? AND id != ? AND ("
+            "(status IN (?, ?, ?, ?) AND punched_at BETWEEN ? AND ?) "
+            "OR (punched_at >= ? AND (status IN (?, ?) OR (status = ? AND attempts = 0)))) LIMIT 1",
+            (entry['username'], entry['id'],
+             STATUS_SENT, STATUS_OFFLINE, STATUS_INFLIGHT, STATUS_UNKNOWN,
+             entry['punched_at'] - DUPLICATE_WINDOW, entry['punched_at'],
+             entry['punched_at'], STATUS_SENT, STATUS_UNKNOWN, STATUS_INFLIGHT),
+        ).fetchone() is not None
+
+    @contextmanager
+    def _immediate(self):
+        # Takes SQLite's write lock up front: a claim in another process
+        # waits for this one instead of reading the same rows
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def claim_due(self, limit=50, now=None, max_age=REPLAY_MAX_AGE, backoff=True):
+        """Return offline entries due for replay, marking them in flight.
+
+        With ``backoff=False`` every offline entry is due, whatever its
+        next attempt time. Entries punched more than ``max_age`` seconds
+        ago are marked as expired, and superseded ones (see
+        ``superseded``) as duplicates.
+        The claim is one immediate transaction, so processes sharing the
+        journal never claim the same entry.
+        """
+        now = now or time.time()
+        with self._lock, self._immediate():
+            self._recover(now)
+            self._conn.execute(
+                "UPDATE punches SET status = ? WHERE status = ? AND punched_at < ?",
+                (STATUS_EXPIRED, STATUS_OFFLINE, now - max_age),
+            )
+            rows = self._conn.execute(
+                "SELECT * FROM punches WHERE status = ? AND next_attempt_at <= ? "
+                "ORDER BY punched_at LIMIT ?",
+                (STATUS_OFFLINE, now if backoff else math.inf, limit),
+            ).fetchall()
+            due = []
+            for row in rows:
+                if self._superseded(row):
+                    self._conn.execute(
+                        "UPDATE punches SET status = ? WHERE id = ?", (STATUS_DUPLICATE, row['id'])
+                    )
+                    continue
+                self._conn.execute(
+                    "UPDATE punches SET status = ?, lease_until = ? WHERE id = ?",
+                    (STATUS_INFLIGHT, now + INFLIGHT_LEASE, row['id'])
+                )
+                due.append(dict(row))
+            return due
+
+    def counts(self):
+        """Return the number of entries per status."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS total FROM punches GROUP BY status"
+            ).fetchall()
+        return {row['status']: row['total'] for row in rows}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JournalReplayer:
+    """Background thread that drains offline punches once connectivity returns.
+
+    ``send`` is called with a journal entry and returns a
+    ``(status, latitude, longitude, error)`` tuple for it (see
+    PontoBackend.replay_punch).
+    """
+
+    def __init__(self, journal, send, interval=REPLAY_BACKOFF_BASE):
+        self.journal = journal
+        self.send = send
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ponto-replayer", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+    def replay_due(self, backoff=True):
+        """Replay every due entry once (every offline one if not ``backoff``); return the number delivered."""
+        delivered = 0
+        offline = False
+        for entry in self.journal.claim_due(backoff=backoff):
+            if offline:
+                # Still offline: leave the rest for the next round
+                self.journal.release(entry['id'])
+                continue
+            status, latitude, longitude, error = self.send(entry)
+            self.journal.complete(entry['id'], status, latitude, longitude, error)
+            if status == STATUS_SENT:
+                delivered += 1
+            offline = status == STATUS_OFFLINE
+        return delivered
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.replay_due()
+            except Exception:
+                pass
+            self._stop.wait(self.interval)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Single-process launcher for pyIcarus.
+
+Detects the GUI toolkit (GTK or PyQt6), checks the Python dependencies,
+installs missing ones if needed and then runs the chosen front-end in
+this same interpreter. The detection result is cached per interpreter
+and package versions, so a warm launch costs one interpreter start.
+
+Usage:
+    python3 ponto_launcher.py [--toolkit gtk|pyqt] [--refresh] [front-end args...]
+"""
+# Standard library imports
+import os
+import sys
+import json
+import runpy
+import argparse
+import subprocess
+import importlib.util
+from pathlib import Path
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+CACHE_FILE = os.path.join(str(Path.home()), ".cache", "ponto_app", "launcher.json")
+
+# Per toolkit: front-end script, requirements file and modules it needs
+TOOLKITS = {
+    'gtk': {
+        'script': "ponto_app_gtk.py",
+        'requirements': "requirements.txt",
+        'modules': ['gi', 'requests', 'cryptography', 'geocoder'],
+    },
+    'pyqt': {
+        'script': "ponto_app_pyqt.py",
+        'requirements': "requirements_pyqt.txt",
+        'modules': ['PyQt6', 'requests', 'cryptography', 'geocoder'],
+    },
+}
+
+# Distributions whose versions invalidate the cache when they change
+DISTRIBUTIONS = ['PyGObject', 'PyQt6', 'requests', 'cryptography', 'geocoder']
+
+
+def cache_key():
+    """Return the key identifying this interpreter and its relevant packages."""
+    from importlib import metadata
+    versions = []
+    for name in DISTRIBUTIONS:
+        try:
+            versions.append(f"{name}={metadata.version(name)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{name}=")
+    return f"{sys.executable}|{'|'.join(versions)}"
+
+
+def load_cache():
+    try:
+        with open(CACHE_FILE, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache):
+    try:
+        os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+        with open(CACHE_FILE, 'w') as f:
+            json.dump(cache, f)
+    except OSError:
+        pass
+
+
+def module_available(name):
+    """Check for a module without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def missing_modules(toolkit):
+    return [name for name in TOOLKITS[toolkit]['modules'] if not module_available(name)]
+
+
+def detect_toolkit(preferred=None):
+    """Return the toolkit to use: the preferred one, else GTK if present, else PyQt."""
+    if preferred:
+        return preferred
+    if module_available('gi'):
+        return 'gtk'
+    return 'pyqt'
+
+
+def install_requirements(toolkit):
+    requirements = os.path.join(SCRIPT_DIR, TOOLKITS[toolkit]['requirements'])
+    print(f"Installing missing requirements from {os.path.basename(requirements)}...")
+    result = subprocess.run([sys.executable, "-m", "pip", "install", "-r", requirements])
+    return result.returncode == 0
+
+
+def resolve(preferred=None, refresh=False):
+    """Return the toolkit to launch, using the cache on the warm path."""
+    key = cache_key()
+    cache = load_cache()
+    entry = cache.get(key)
+    if not refresh and entry and (preferred is None or entry['toolkit'] == preferred):
+        return entry['toolkit']
+
+    toolkit = detect_toolkit(preferred)
+    missing = missing_modules(toolkit)
+    if missing:
+        print(f"Missing modules for {toolkit}: {', '.join(missing)}")
+        if not install_requirements(toolkit):
+            print("Failed to install requirements. Please install them manually.")
+            return None
+        importlib.invalidate_caches()
+        missing = missing_modules(toolkit)
+        if missing:
+            print(f"Still missing after install: {', '.join(missing)}")
+            return None
+        # Package versions changed with the install
+        key = cache_key()
+
+    cache = {key: {'toolkit': toolkit}}
+    save_cache(cache)
+    return toolkit
+
+
+def launch(toolkit, argv):
+    """Run the front-end in this interpreter as if started directly."""
+    script = os.path.join(SCRIPT_DIR, TOOLKITS[toolkit]['script'])
+    sys.argv = [script] + argv
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    runpy.run_path(script, run_name="__main__")
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Ponto App - inicializador')
+    parser.add_argument('--toolkit', choices=sorted(TOOLKITS), default=None, help='Forçar a interface gráfica')
+    parser.add_argument('--refresh', action='store_true', help='Ignorar o cache de detecção do ambiente')
+    return parser.parse_known_args()
+
+
+if __name__ == "__main__":
+    args, front_end_args = parse_arguments()
+    toolkit = resolve(args.toolkit, args.refresh)
+    if toolkit is None:
+        sys.exit(1)
+    launch(toolkit, front_end_args)
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""Load test: many simulated users punching through the real backend.
+
+Each simulated user has its own config dir, encrypted credentials and
+PontoBackend, and punches with ``register_time`` against a local
+stand-in of the Icarus API (ponto_mock_server, or --base-url). Arrivals
+follow a pattern:
+
+- ``burst``: everyone at the same moment (plus up to --spread seconds),
+  like a team punching at 08:00;
+- ``poisson``: exponential inter-arrival times at --rate per second;
+- ``uniform``: evenly spaced over --duration seconds.
+
+By default every user has its own secret key and vault, so each pays one
+PBKDF2 derivation as a separate app process would; --shared-key models
+many profiles in one shared vault, which derive the key once.
+
+The report has throughput, latency from the scheduled arrival (including
+queueing for a worker) and from the start of register_time, per-phase
+latencies, CPU time spent in PBKDF2 and a breakdown of errors. --json
+writes it to a file, and --compare checks it against an earlier run.
+
+Usage:
+    python3 ponto_loadtest.py --users 500 --arrival burst --json run.json
+    python3 ponto_loadtest.py --users 500 --arrival poisson --rate 50
+    python3 ponto_loadtest.py --users 500 --compare run.json --tolerance 0.2
+"""
+# Standard library imports
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Local imports
+from ponto_backend import PontoBackend, ApiTransport, LocationProvider, kdf_stats
+from ponto_vault import PontoVault, VAULT_DIR
+from ponto_mock_server import MockIcarusServer
+from ponto_cli import latency_summary
+
+ARRIVALS = ('burst', 'poisson', 'uniform')
+
+# Metrics compared by --compare: (path in the report, True if higher is better)
+REGRESSION_METRICS = (
+    (('latency', 'p50_ms'), False),
+    (('latency', 'p95_ms'), False),
+    (('latency', 'p99_ms'), False),
+    (('throughput_per_s',), True),
+)
+
+
+def arrival_offsets(pattern, users, rate=None, duration=None, spread=0.0, seed=0):
+    """Return sorted arrival times (seconds from the start) for users."""
+    rng = random.Random(seed)
+    if pattern == 'burst':
+        offsets = [rng.uniform(0, spread) if spread else 0.0 for _ in range(users)]
+    elif pattern == 'poisson':
+        offsets = []
+        moment = 0.0
+        for _ in range(users):
+            moment += rng.expovariate(rate)
+            offsets.append(moment)
+    else:
+        step = duration / users if users else 0.0
+        offsets = [index * step for index in range(users)]
+    return sorted(offsets)
+
+
+class SimulatedUser:
+    """One user with its own config dir and backend."""
+
+    def __init__(self, index, base_dir, base_url, shared_key, geo_latency, transport=None, vault=None):
+        self.name = f"user{index:04d}"
+        config_dir = os.path.join(base_dir, self.name)
+
+        def lookup():
+            if geo_latency:
+                time.sleep(geo_latency)
+            return -27.5, -48.5
+        self.backend = PontoBackend(
+            config_dir=config_dir,
+            base_url=base_url,
+            transport=transport,
+            location_provider=LocationProvider(os.path.join(config_dir, "location.json"), lookup=lookup),
+            vault=vault,
+            profile=self.name,
+            secret_key=None if shared_key else f"loadtest-{index}",
+        )
+        self.backend.update_credentials(self.name, f"password-{index}")
+        # Start cold, like a freshly started app: no derived key, no token
+        self.backend.key_cache.invalidate(self.backend.secret_key, self.backend.salt)
+        self.backend.token_cache.invalidate()
+
+
+class LoadTest:
+    """Drives the simulated users and collects their results."""
+
+    def __init__(self, args, base_url):
+        self.args = args
+        self.base_url = base_url
+        self.records = []
+        self._lock = threading.Lock()
+
+    def setup(self, base_dir):
+        transport = None
+        if self.args.shared_transport:
+            transport = ApiTransport(self.base_url, pool_size=self.args.workers)
+        vault = None
+        if self.args.shared_key:
+            vault = PontoVault(os.path.join(base_dir, VAULT_DIR))
+        self.users = [
+            SimulatedUser(index, base_dir, self.base_url, self.args.shared_key,
+                          self.args.geo_latency_ms / 1000, transport, vault)
+            for index in range(self.args.users)
+        ]
+
+    def punch(self, user, scheduled, origin):
+        # Wait for this user's arrival time
+        delay = origin + scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        started = time.perf_counter()
+        try:
+            result = user.backend.register_time()
+            record = {'success': result.success, 'status': result.status or "",
+                      'message': result.message, 'phases': result.phases}
+        except Exception as e:
+            record = {'success': False, 'status': "exception", 'message': f"{type(e).__name__}: {e}", 'phases': {}}
+        finished = time.perf_counter()
+        record.update({
+            'latency_ms': (finished - origin - scheduled) * 1000,
+            'service_ms': (finished - started) * 1000,
+            'queue_ms': max(started - origin - scheduled, 0.0) * 1000,
+            'finished': finished - origin,
+        })
+        with self._lock:
+            self.records.append(record)
+
+    def run(self):
+        args = self.args
+        offsets = arrival_offsets(args.arrival, args.users, args.rate, args.duration, args.spread, args.seed)
+        kdf_before = dict(kdf_stats)
+        cpu_before = time.process_time()
+        with ThreadPoolExecutor(max_workers=args.workers, thread_name_prefix="loadtest") as pool:
+            origin = time.perf_counter() + 0.1
+            for user, offset in zip(self.users, offsets):
+                pool.submit(self.punch, user, offset, origin)
+        wall = max((record['finished'] for record in self.records), default=0.0)
+        cpu = time.process_time() - cpu_before
+        for user in self.users:
+            user.backend.shutdown()
+        return self.report(wall, cpu, {key: kdf_stats[key] - kdf_before[key] for key in kdf_stats})
+
+    def report(self, wall, cpu, kdf):
+        records = self.records
+        failures = [record for record in records if not record['success']]
+        phases = {}
+        for record in records:
+            for phase, elapsed in record['phases'].items():
+                phases.setdefault(phase, []).append(elapsed)
+        return {
+            'config': {key: value for key, value in vars(self.args).items()
+                       if key not in ('json', 'compare', 'tolerance')},
+            'users': len(records),
+            'succeeded': len(records) - len(failures),
+            'failed': len(failures),
+            'wall_s': round(wall, 3),
+            'throughput_per_s': round(len(records) / wall, 2) if wall > 0 else 0.0,
+            'latency': latency_summary([record['latency_ms'] for record in records]),
+            'service': latency_summary([record['service_ms'] for record in records]),
+            'queue': latency_summary([record['queue_ms'] for record in records]),
+            'phases': {phase: latency_summary(values) for phase, values in sorted(phases.items())},
+            'cpu_s': round(cpu, 3),
+            'pbkdf2': {
+                'derivations': kdf['derivations'],
+                'cpu_s': round(kdf['cpu_s'], 3),
+                'cpu_ms_per_derivation': round(kdf['cpu_s'] / kdf['derivations'] * 1000, 3)
+                if kdf['derivations'] else 0.0,
+                'share_of_cpu': round(kdf['cpu_s'] / cpu, 3) if cpu > 0 else 0.0,
+            },
+            'errors': {
+                'by_status': dict(Counter(record['status'] for record in failures)),
+                'by_message': dict(Counter(record['message'] for record in failures).most_common(10)),
+            },
+        }
+
+
+def compare(report, baseline, tolerance):
+    """Return (lines, regressed) comparing report to a baseline report."""
+    lines = []
+    regressed = False
+    for path, higher_is_better in REGRESSION_METRICS:
+        current, previous = report, baseline
+        for key in path:
+            current = current.get(key, {}) if isinstance(current, dict) else None
+            previous = previous.get(key, {}) if isinstance(previous, dict) else None
+        if not isinstance(current, (int, float)) or not isinstance(previous, (int, float)) or not previous:
+            continue
+        change = (current - previous) / previous
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > tolerance:
+            flag = "  REGRESSÃO"
+            regressed = True
+        lines.append(f"{'.'.join(path):<22} {previous:10.2f} -> {current:10.2f} ({change:+.1%}){flag}")
+    return lines, regressed
+
+
+def print_report(report):
+    out = sys.stderr
+    print(f"users: {report['users']}  succeeded: {report['succeeded']}  failed: {report['failed']}  "
+          f"wall: {report['wall_s']} s  throughput: {report['throughput_per_s']}/s", file=out)
+    print(f"{'':<16} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  (ms)", file=out)
+    rows = [('latency', report['latency']), ('queue', report['queue']), ('service', report['service'])]
+    rows += [(f"  {phase}", stats) for phase, stats in report['phases'].items()]
+    for name, stats in rows:
+        if stats.get('count'):
+            print(f"{name:<16} {stats['mean_ms']:9.2f} {stats['p50_ms']:9.2f} {stats['p95_ms']:9.2f} "
+                  f"{stats['p99_ms']:9.2f} {stats['max_ms']:9.2f}", file=out)
+    kdf = report['pbkdf2']
+    print(f"cpu: {report['cpu_s']} s  pbkdf2: {kdf['derivations']} derivations, {kdf['cpu_s']} s "
+          f"({kdf['cpu_ms_per_derivation']} ms each, {kdf['share_of_cpu']:.0%} of cpu)", file=out)
+    if report['failed']:
+        print(f"errors: {report['errors']['by_status']}", file=out)
+        for message, count in report['errors']['by_message'].items():
+            print(f"  {count:5d}  {message}", file=out)
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Ponto App - teste de carga com usuários simulados')
+    parser.add_argument('--users', type=int, default=200, help='Número de usuários simulados')
+    parser.add_argument('--arrival', choices=ARRIVALS, default='burst', help='Padrão de chegada')
+    parser.add_argument('--spread', type=float, default=0.0, help='burst: chegadas espalhadas em até N segundos')
+    parser.add_argument('--rate', type=float, default=50.0, help='poisson: chegadas por segundo')
+    parser.add_argument('--duration', type=float, default=10.0, help='uniform: duração em segundos')
+    parser.add_argument('--workers', type=int, default=None, help='Batidas simultâneas (padrão: uma por usuário)')
+    parser.add_argument('--seed', type=int, default=0, help='Semente das chegadas aleatórias')
+    parser.add_argument('--shared-key', action='store_true', help='Mesma chave e cofre para todos (vários perfis num processo)')
+    parser.add_argument('--shared-transport', action='store_true', help='Um pool de conexões para todos (como o ponto_cli)')
+    parser.add_argument('--base-url', default=None, help='API a usar em vez do servidor simulado')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='Latência do servidor simulado')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Latência aleatória adicional do servidor')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração de respostas com erro do servidor simulado')
+    parser.add_argument('--geo-latency-ms', type=float, default=80.0, help='Latência simulada da geolocalização')
+    parser.add_argument('--json', help='Gravar o relatório neste arquivo')
+    parser.add_argument('--compare', help='Relatório JSON de uma execução anterior para comparar')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Piora relativa aceita em --compare')
+    args = parser.parse_args()
+    args.workers = max(1, args.workers or args.users)
+    return args
+
+
+def main():
+    args = parse_arguments()
+    server = None
+    base_url = args.base_url
+    if base_url is None:
+        server = MockIcarusServer(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                                  error_rate=args.error_rate)
+        base_url = server.start()
+
+    test = LoadTest(args, base_url)
+    with tempfile.TemporaryDirectory(prefix="ponto-loadtest-") as base_dir:
+        print(f"Preparando {args.users} usuários...", file=sys.stderr)
+        test.setup(base_dir)
+        report = test.run()
+    if server is not None:
+        report['server_requests'] = server.counters
+        server.stop()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        lines, regressed = compare(report, baseline, args.tolerance)
+        print("\n".join(lines), file=sys.stderr)
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Optional metrics export for Ponto App.
+
+Enabled with ``"metrics_export": true`` in config.json. Each punch is
+appended to metrics.jsonl in the config directory, and aggregated
+counters are written to ponto.prom in the Prometheus textfile format
+(for node_exporter's textfile collector).
+"""
+# Standard library imports
+import os
+import json
+import time
+import threading
+
+METRIC_HELP = {
+    'ponto_punches_total': ('counter', 'Punch attempts by result and journal status.'),
+    'ponto_punch_duration_seconds': ('summary', 'Wall time of register_time.'),
+    'ponto_punch_phase_duration_seconds': ('summary', 'Wall time of each punch phase.'),
+    'ponto_last_punch_timestamp_seconds': ('gauge', 'Unix time of the last punch attempt.'),
+    'ponto_circuit_state': ('gauge', 'API circuit breaker state (0 closed, 1 half-open, 2 open).'),
+    'ponto_circuit_trips_total': ('counter', 'Times the API circuit breaker opened.'),
+    'ponto_circuit_error_rate': ('gauge', 'Error rate over the circuit breaker window.'),
+    'ponto_endpoint_timeout_seconds': ('gauge', 'Adaptive read timeout of the endpoint.'),
+}
+
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+    return "{" + inner + "}"
+
+
+class MetricsExporter:
+    """Aggregates metrics in memory and writes JSON-lines and textfile exports."""
+
+    def __init__(self, config_dir, jsonl_name="metrics.jsonl", textfile_name="ponto.prom"):
+        self.jsonl_path = os.path.join(config_dir, jsonl_name)
+        self.textfile_path = os.path.join(config_dir, textfile_name)
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # name -> {labels tuple: value}; summaries keep name_sum and name_count
+        self._values = {}
+
+    @staticmethod
+    def describe(name, kind, help_text):
+        """Register the type and help text of an additional metric."""
+        METRIC_HELP.setdefault(name, (kind, help_text))
+
+    def _add(self, name, labels, value, replace=False):
+        key = tuple(sorted((labels or {}).items()))
+        series = self._values.setdefault(name, {})
+        series[key] = value if replace else series.get(key, 0.0) + value
+
+    def inc(self, name, labels=None, value=1.0):
+        with self._lock:
+            self._add(name, labels, value)
+
+    def set_gauge(self, name, value, labels=None):
+        with self._lock:
+            self._add(name, labels, value, replace=True)
+
+    def observe(self, name, value, labels=None):
+        with self._lock:
+            self._add(f"{name}_sum", labels, value)
+            self._add(f"{name}_count", labels, 1.0)
+
+    def record_punch(self, result, username=None):
+        """Record a PunchResult and export it."""
+        outcome = "success" if result.success else "failure"
+        self.inc('ponto_punches_total', {'result': outcome, 'status': result.status or ""})
+        self.observe('ponto_punch_duration_seconds', result.total_ms / 1000)
+        for phase, elapsed in result.phases.items():
+            self.observe('ponto_punch_phase_duration_seconds', elapsed / 1000, {'phase': phase})
+        self.set_gauge('ponto_last_punch_timestamp_seconds', time.time())
+
+        record = {'ts': time.time(), 'user': username}
+        record.update(result.as_dict())
+        self.append_jsonl(record)
+        self.write_textfile()
+
+    def record_circuits(self, snapshots):
+        """Record circuit breaker snapshots (see ApiTransport.circuits); written with the next punch."""
+        for snapshot in snapshots:
+            labels = {'endpoint': snapshot['endpoint']}
+            self.set_gauge('ponto_circuit_state', CIRCUIT_STATES[snapshot['state']], labels)
+            self.set_gauge('ponto_circuit_trips_total', snapshot['trips'], labels)
+            self.set_gauge('ponto_circuit_error_rate', snapshot['error_rate'], labels)
+            if 'timeout_s' in snapshot:
+                self.set_gauge('ponto_endpoint_timeout_seconds', snapshot['timeout_s'], labels)
+
+    def append_jsonl(self, record):
+        try:
+            with self._lock, open(self.jsonl_path, 'a') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+    def render(self):
+        """Return the Prometheus textfile contents."""
+        lines = []
+        with self._lock:
+            names = sorted(self._values)
+            written = set()
+            for name in names:
+                base = name[:-4] if name.endswith("_sum") else name[:-6] if name.endswith("_count") else name
+                if base not in written and base in METRIC_HELP:
+                    kind, help_text = METRIC_HELP[base]
+                    lines.append(f"# HELP {base} {help_text}")
+                    lines.append(f"# TYPE {base} {kind}")
+                    written.add(base)
+                for key, value in sorted(self._values[name].items()):
+                    lines.append(f"{name}{format_labels(dict(key))} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self):
+        """Atomically replace the textfile so scrapers never see a partial file."""
+        tmp_path = f"{self.textfile_path}.tmp"
+        try:
+            with self._write_lock:
+                with open(tmp_path, 'w') as f:
+                    f.write(self.render())
+                os.replace(tmp_path, self.textfile_path)
+        except OSError:
+            pass
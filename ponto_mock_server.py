@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""Local stand-in for the Icarus API.
+
+Implements /usuario/logar, /ponto/bater and a punch listing at
+/ponto/historico (for ``"history_path"``) with configurable latency,
+error rate and response shape, so the backend can be exercised and
+benchmarked without touching backendicarus.pontoicarus.com.br.
+
+Usage:
+    python3 ponto_mock_server.py [--port 8089] [--latency-ms 50] [--error-rate 0.1] [--response ok|json|empty]
+
+Then point the backend at it with ``"api_base_url": "http://127.0.0.1:8089"``
+in config.json, or ``PontoBackend(base_url=...)``.
+"""
+# Standard library imports
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Register response shapes the real API has been seen to return
+RESPONSE_SHAPES = ('ok', 'json', 'empty')
+
+
+def make_token(username, ttl):
+    """Return an unsigned JWT-shaped token carrying an exp claim."""
+    def encode(data):
+        return base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b'=').decode()
+    header = encode({'alg': 'none', 'typ': 'JWT'})
+    payload = encode({'sub': username, 'exp': int(time.time() + ttl)})
+    return f"{header}.{payload}.mock"
+
+
+class MockIcarusHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_body(self, status, body, content_type="application/json"):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def do_POST(self):
+        server = self.server
+        payload = self.read_json()
+        server.count(self.path)
+
+        delay = server.latency.get(self.path, server.latency.get('*', 0.0))
+        if server.jitter:
+            delay += random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+
+        if server.error_rate and random.random() < server.error_rate:
+            server.count('errors')
+            self.send_body(server.error_status, json.dumps({'message': 'Erro simulado'}))
+            return
+
+        if self.path == "/usuario/logar":
+            self.handle_login(payload)
+        elif self.path == "/ponto/bater":
+            self.handle_register(payload)
+        else:
+            self.send_body(404, json.dumps({'message': 'Not found'}))
+
+    def handle_login(self, payload):
+        username = payload.get('username')
+        if not username or not payload.get('password'):
+            self.send_body(401, json.dumps({'message': 'Usuário ou senha inválidos'}))
+            return
+        token = make_token(username, self.server.token_ttl)
+        with self.server.lock:
+            self.server.tokens.add(token)
+        # Stable idMutuario per user
+        id_mutuario = int(hashlib.sha256(username.encode()).hexdigest()[:6], 16)
+        self.send_body(200, json.dumps({'token': token, 'employee': [{'idMutuario': id_mutuario}]}))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        self.server.count(url.path)
+        if url.path != "/ponto/historico":
+            self.send_body(404, json.dumps({'message': 'Not found'}))
+            return
+        if not self.authorized():
+            self.send_body(401, json.dumps({'message': 'Token inválido'}))
+            return
+        query = parse_qs(url.query)
+        id_mutuario = int(query.get('idMutuario', ['0'])[0])
+        since = query.get('desde', [None])[0]
+        with self.server.lock:
+            punches = list(self.server.punches.get(id_mutuario, []))
+        if since:
+            punches = [p for p in punches if p['dataHora'] >= since]
+        self.send_body(200, json.dumps(punches))
+
+    def authorized(self):
+        token = self.headers.get("Authorization", "").replace("Bearer ", "", 1)
+        with self.server.lock:
+            return token in self.server.tokens
+
+    def handle_register(self, payload):
+        if not self.authorized():
+            self.send_body(401, json.dumps({'message': 'Token inválido'}))
+            return
+        if not payload.get('idMutuario'):
+            self.send_body(400, json.dumps({'message': 'idMutuario ausente'}))
+            return
+        self.server.add_punch(payload['idMutuario'], payload.get('latitude'), payload.get('longitude'))
+        shape = self.server.response_shape
+        if shape == 'ok':
+            self.send_body(200, "ok", "text/plain")
+        elif shape == 'json':
+            self.send_body(200, json.dumps({'message': 'Ponto registrado com sucesso'}))
+        else:
+            self.send_body(200, "", "text/plain")
+
+
+class MockIcarusServer(ThreadingHTTPServer):
+    """Threaded mock server; use start()/stop() or run standalone."""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, login_latency=None,
+                 register_latency=None, jitter=0.0, error_rate=0.0, error_status=503,
+                 response_shape='ok', token_ttl=3600, verbose=False):
+        super().__init__((host, port), MockIcarusHandler)
+        self.latency = {'*': latency}
+        if login_latency is not None:
+            self.latency["/usuario/logar"] = login_latency
+        if register_latency is not None:
+            self.latency["/ponto/bater"] = register_latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.response_shape = response_shape
+        self.token_ttl = token_ttl
+        self.verbose = verbose
+        self.tokens = set()
+        # idMutuario -> list of punches, as returned by /ponto/historico
+        self.punches = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def add_punch(self, id_mutuario, latitude=None, longitude=None, when=None):
+        """Record a punch for the listing endpoint."""
+        with self.lock:
+            punches = self.punches.setdefault(id_mutuario, [])
+            punches.append({
+                'id': sum(len(p) for p in self.punches.values()),
+                'dataHora': (when or datetime.now()).isoformat(timespec='seconds'),
+                'latitude': latitude,
+                'longitude': longitude,
+            })
+
+    def start(self):
+        """Serve in a background thread and return the base URL."""
+        self._thread = threading.Thread(target=self.serve_forever, name="mock-icarus", daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Servidor Icarus simulado para testes locais')
+    parser.add_argument('--host', default="127.0.0.1", help='Endereço de escuta')
+    parser.add_argument('--port', type=int, default=8089, help='Porta de escuta')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Latência de cada resposta')
+    parser.add_argument('--login-latency-ms', type=float, default=None, help='Latência do login')
+    parser.add_argument('--register-latency-ms', type=float, default=None, help='Latência do registro')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Latência aleatória adicional')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fração de respostas com erro (0-1)')
+    parser.add_argument('--error-status', type=int, default=503, help='Código HTTP dos erros simulados')
+    parser.add_argument('--response', choices=RESPONSE_SHAPES, default='ok', help='Formato da resposta do registro')
+    parser.add_argument('--token-ttl', type=int, default=3600, help='Validade dos tokens em segundos')
+    parser.add_argument('--verbose', action='store_true', help='Registrar cada requisição')
+    return parser.parse_args()
+
+
+def ms(value):
+    return None if value is None else value / 1000
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    server = MockIcarusServer(
+        args.host, args.port, ms(args.latency_ms), ms(args.login_latency_ms),
+        ms(args.register_latency_ms), ms(args.jitter_ms), args.error_rate,
+        args.error_status, args.response, args.token_ttl, args.verbose,
+    )
+    print(f"Mock Icarus API em {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
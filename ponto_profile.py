@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""Built-in profiling for startup and punches (``--profile``).
+
+The front-ends and the daemon create a Profiler before their heavy
+imports when ``--profile`` is on the command line. Startup (imports,
+backend construction, config loading, window construction) is profiled
+with cProfile until ``finish()``, and each ``register_time`` call runs
+under its own cProfile with tracemalloc snapshots around it.
+
+For every profiled section the config dir's ``profiling/`` folder gets
+``<section>-<timestamp>.prof`` (pstats format, e.g. for
+``python3 -m pstats`` or snakeviz) and a ``.txt`` summary. The summary,
+also printed to stderr, lists the top N functions by cumulative time
+and the top N allocation sites.
+
+Only the standard library is imported here, so starting the profiler
+doesn't distort the import timings it measures.
+"""
+# Standard library imports
+import io
+import os
+import sys
+import time
+import threading
+import functools
+
+PROFILING_DIR = "profiling"
+DEFAULT_TOP = 20
+
+# Allocation sites hidden from the memory summary
+IGNORED_FRAMES = ("<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>", "<unknown>")
+
+# Import machinery frames hidden from the function ranking (they wrap every import)
+RANKING_FILTER = r"^(?!<frozen importlib\.|\{built-in method builtins\.exec\})"
+
+
+def profile_requested(argv=None):
+    """Return True if --profile is on the command line (checked before argparse runs).
+
+    Entry points check this at import time, guarded by ``__name__ ==
+    "__main__"`` so that importing them from another front-end doesn't
+    start a second profiler.
+    """
+    return '--profile' in (sys.argv if argv is None else argv)
+
+
+def resident_memory():
+    """Return the resident set size of this process in bytes, or None if unknown.
+
+    Reads /proc on Linux; elsewhere falls back to the peak RSS.
+    """
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Profiler:
+    """Collects cProfile stats and tracemalloc snapshots per section."""
+
+    def __init__(self, config_dir=None, top=DEFAULT_TOP, stream=None):
+        import cProfile
+        import tracemalloc
+        self._cprofile = cProfile
+        self._tracemalloc = tracemalloc
+        self.config_dir = config_dir
+        self.top = top
+        self.stream = stream or sys.stderr
+        self.marks = []
+        # Only one cProfile may be active at a time (process-wide on 3.12+)
+        self._active = threading.Lock()
+        self._punches = 0
+        tracemalloc.start()
+        self._started = time.perf_counter()
+        self._startup = cProfile.Profile()
+        self._active.acquire()
+        self._startup.enable()
+
+    def mark(self, name):
+        """Record elapsed time and traced memory at a startup milestone."""
+        current, peak = self._tracemalloc.get_traced_memory()
+        self.marks.append((name, (time.perf_counter() - self._started) * 1000, current, peak))
+
+    def finish(self):
+        """End the startup section and write its report. Returns False (for idle/timer callbacks)."""
+        if self._startup is None:
+            return False
+        self._startup.disable()
+        profile, self._startup = self._startup, None
+        self.mark('startup')
+        elapsed = (time.perf_counter() - self._started) * 1000
+        snapshot = self._tracemalloc.take_snapshot()
+        self._active.release()
+        self.write('startup', profile, elapsed, snapshot.filter_traces(self._filters()).statistics('lineno'))
+        return False
+
+    def run(self, name, function, *args, **kwargs):
+        """Call function under cProfile and tracemalloc and write a report for it.
+
+        Runs unprofiled if another section is being profiled.
+        """
+        if not self._active.acquire(blocking=False):
+            return function(*args, **kwargs)
+        try:
+            before = self._tracemalloc.take_snapshot()
+            profile = self._cprofile.Profile()
+            started = time.perf_counter()
+            try:
+                return profile.runcall(function, *args, **kwargs)
+            finally:
+                elapsed = (time.perf_counter() - started) * 1000
+                after = self._tracemalloc.take_snapshot()
+                self._punches += 1
+                statistics = after.filter_traces(self._filters()).compare_to(
+                    before.filter_traces(self._filters()), 'lineno'
+                )
+                self.write(f"{name}-{self._punches}", profile, elapsed, statistics)
+        finally:
+            self._active.release()
+
+    def _filters(self):
+        tracemalloc = self._tracemalloc
+        filters = [tracemalloc.Filter(False, frame) for frame in IGNORED_FRAMES]
+        filters.append(tracemalloc.Filter(False, tracemalloc.__file__))
+        return filters
+
+    def write(self, section, profile, elapsed_ms, memory_statistics):
+        """Save the stats and summary of a section and print the summary."""
+        import pstats
+        text = io.StringIO()
+        text.write(f"== {section}: {elapsed_ms:.1f} ms ==\n")
+        if section == 'startup' and self.marks:
+            for name, at_ms, current, peak in self.marks:
+                text.write(f"  {name:<12} {at_ms:9.1f} ms  {current / 2**20:8.2f} MiB (pico {peak / 2**20:.2f} MiB)\n")
+        stats = pstats.Stats(profile, stream=text)
+        stats.sort_stats('cumulative').print_stats(RANKING_FILTER, self.top)
+        text.write(f"-- top {self.top} alocações (por linha) --\n")
+        for statistic in memory_statistics[:self.top]:
+            text.write(f"  {statistic}\n")
+        summary = text.getvalue()
+        print(summary, file=self.stream)
+
+        directory = self.directory()
+        if directory is None:
+            return
+        base = os.path.join(directory, f"{section}-{time.strftime('%Y%m%d-%H%M%S')}")
+        try:
+            stats.dump_stats(f"{base}.prof")
+            with open(f"{base}.txt", 'w') as f:
+                f.write(summary)
+        except OSError as e:
+            print(f"Falha ao gravar o perfil: {e}", file=self.stream)
+
+    def directory(self):
+        config_dir = self.config_dir
+        if config_dir is None:
+            from ponto_backend import default_config_dir
+            config_dir = default_config_dir()
+        path = os.path.join(config_dir, PROFILING_DIR)
+        try:
+            os.makedirs(path, exist_ok=True)
+        except OSError:
+            return None
+        return path
+
+
+def profiled(section):
+    """Decorator for methods whose object may carry a ``profiler`` attribute."""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            profiler = getattr(self, 'profiler', None)
+            if profiler is None:
+                return method(self, *args, **kwargs)
+            return profiler.run(section, method, self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def add_profile_arguments(parser):
+    """Add --profile and --profile-top to an argparse parser."""
+    parser.add_argument('--profile', action='store_true',
+                        help='Medir tempo e memória da inicialização e de cada batida (grava em profiling/)')
+    parser.add_argument('--profile-top', type=int, default=DEFAULT_TOP,
+                        help='Número de funções e alocações listadas no perfil')
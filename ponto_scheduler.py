@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""Built-in punch scheduler.
+
+Replaces launching the GUI with ``--auto`` from cron: a single process
+keeps a warm PontoBackend and sleeps until the next deadline of a
+weekly schedule (heap of timers, no polling). Shortly before each
+deadline it pre-warms the connection, token and location so the punch
+itself fires within milliseconds of the target time.
+
+The schedule lives in schedule.json in the config directory::
+
+    {
+        "punches": [
+            {"days": ["mon", "tue", "wed", "thu", "fri"], "time": "08:00"},
+            {"days": [0, 1, 2, 3, 4], "time": "17:00"}
+        ],
+        "jitter_seconds": 60,
+        "holidays": ["2026-12-25"],
+        "prewarm_seconds": 30
+    }
+
+Usage:
+    python3 ponto_scheduler.py run
+    python3 ponto_scheduler.py next [--count N]
+"""
+# Standard library imports
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import argparse
+import threading
+from datetime import datetime, timedelta, date
+
+# Local imports
+from ponto_backend import PontoBackend, default_config_dir
+
+SCHEDULE_FILE = "schedule.json"
+
+DAY_NAMES = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+
+# Seconds before a deadline to pre-warm, and how late a firing may be
+# before it counts as missed (e.g. the machine was suspended)
+DEFAULT_PREWARM = 30
+MISSED_AFTER = 300
+
+# Upper bound for a single sleep, so wall-clock jumps are noticed
+MAX_SLEEP = 300
+
+
+class Schedule:
+    """Weekly punch times with optional jitter and holiday exclusions."""
+
+    def __init__(self, punches=None, jitter_seconds=0, holidays=None, prewarm_seconds=DEFAULT_PREWARM):
+        # List of (set of weekdays, hour, minute)
+        self.rules = []
+        for punch in punches or []:
+            hour, minute = (int(part) for part in punch['time'].split(':'))
+            days = {self.parse_day(day) for day in punch.get('days', range(5))}
+            self.rules.append((days, hour, minute))
+        self.jitter_seconds = jitter_seconds
+        self.holidays = {date.fromisoformat(day) for day in holidays or []}
+        self.prewarm_seconds = prewarm_seconds
+
+    @staticmethod
+    def parse_day(day):
+        if isinstance(day, int):
+            return day % 7
+        return DAY_NAMES.index(day.strip().lower()[:3])
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get('punches', []),
+            data.get('jitter_seconds', 0),
+            data.get('holidays', []),
+            data.get('prewarm_seconds', DEFAULT_PREWARM),
+        )
+
+    @classmethod
+    def load(cls, config_dir=None):
+        path = os.path.join(config_dir or default_config_dir(), SCHEDULE_FILE)
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def next_for_rule(self, rule, after):
+        """Return the first datetime of rule strictly after ``after``."""
+        days, hour, minute = rule
+        candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if candidate <= after:
+            candidate += timedelta(days=1)
+        # A year ahead is enough to skip any run of holidays
+        for _ in range(366):
+            if candidate.weekday() in days and candidate.date() not in self.holidays:
+                return candidate
+            candidate += timedelta(days=1)
+        return None
+
+    def upcoming(self, after, count):
+        """Return the next ``count`` nominal deadlines after ``after`` (no jitter)."""
+        result = []
+        cursor = after
+        while len(result) < count:
+            nexts = [n for n in (self.next_for_rule(rule, cursor) for rule in self.rules) if n]
+            if not nexts:
+                break
+            cursor = min(nexts)
+            result.append(cursor)
+        return result
+
+    def jitter(self):
+        if not self.jitter_seconds:
+            return 0.0
+        return random.uniform(-self.jitter_seconds, self.jitter_seconds)
+
+
+class PunchScheduler:
+    """Fires punches at the schedule's deadlines using a heap of timers.
+
+    Each rule has one pending punch timer and one pre-warm timer in the
+    heap. The scheduler thread sleeps until the earliest one; ``stop()``
+    or ``reschedule()`` wake it up early.
+    """
+
+    def __init__(self, backend, schedule, clock=time.time):
+        self.backend = backend
+        self.schedule = schedule
+        self.clock = clock
+        self.stats = {'fired': 0, 'succeeded': 0, 'missed': 0, 'late_ms': []}
+        self.on_result = None
+        self._heap = []
+        self._sequence = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _push(self, deadline, kind, rule_index, nominal):
+        self._sequence += 1
+        heapq.heappush(self._heap, (deadline, self._sequence, kind, rule_index, nominal))
+
+    def _schedule_rule(self, rule_index, after):
+        nominal = self.schedule.next_for_rule(self.schedule.rules[rule_index], after)
+        if nominal is None:
+            return
+        deadline = nominal.timestamp() + self.schedule.jitter()
+        self._push(deadline, 'punch', rule_index, nominal.timestamp())
+        prewarm_at = deadline - self.schedule.prewarm_seconds
+        if prewarm_at > self.clock():
+            self._push(prewarm_at, 'prewarm', rule_index, nominal.timestamp())
+
+    def reschedule(self):
+        """Rebuild the timer heap from the schedule (e.g. after it changed)."""
+        now = datetime.fromtimestamp(self.clock())
+        with self._lock:
+            self._heap = []
+            for index in range(len(self.schedule.rules)):
+                self._schedule_rule(index, now)
+        self._wakeup.set()
+
+    def next_deadline(self):
+        with self._lock:
+            punches = [entry[0] for entry in self._heap if entry[2] == 'punch']
+        return min(punches) if punches else None
+
+    def start(self):
+        """Run the scheduler in a background thread."""
+        self.reschedule()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name="ponto-scheduler", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                deadline = self._heap[0][0] if self._heap else None
+            timeout = MAX_SLEEP if deadline is None else min(MAX_SLEEP, max(0.0, deadline - self.clock()))
+            if timeout > 0:
+                self._wakeup.wait(timeout)
+                self._wakeup.clear()
+                continue
+
+            with self._lock:
+                deadline, _, kind, rule_index, nominal = heapq.heappop(self._heap)
+            if kind == 'prewarm':
+                self.prewarm()
+            else:
+                self.fire(deadline, rule_index, nominal)
+
+    def prewarm(self):
+        """Open the connection, refresh the token and location before a deadline."""
+        try:
+            self.backend.prepare()
+        except Exception:
+            pass
+
+    def fire(self, deadline, rule_index, nominal):
+        lateness = self.clock() - deadline
+        # Schedule the rule's next occurrence before punching. It follows
+        # the nominal time, not the jittered deadline: a punch fired before
+        # its nominal time must not bring the same day's occurrence back
+        # (next_for_rule returns times strictly after its argument)
+        with self._lock:
+            self._schedule_rule(rule_index, datetime.fromtimestamp(max(self.clock(), nominal)))
+
+        if lateness > MISSED_AFTER:
+            self.stats['missed'] += 1
+            self.export('missed', lateness)
+            return
+
+        result = self.backend.register_time()
+        self.stats['fired'] += 1
+        self.stats['succeeded'] += 1 if result.success else 0
+        self.stats['late_ms'].append(lateness * 1000)
+        self.export('fired', lateness)
+        if self.on_result:
+            self.on_result(deadline, lateness, result)
+
+    def export(self, outcome, lateness):
+        metrics = self.backend.metrics
+        if metrics is None:
+            return
+        metrics.describe('ponto_scheduler_firings_total', 'counter', 'Scheduled punches by outcome.')
+        metrics.describe('ponto_scheduler_lateness_seconds', 'summary', 'Delay between deadline and firing.')
+        metrics.inc('ponto_scheduler_firings_total', {'outcome': outcome})
+        if outcome == 'fired':
+            metrics.observe('ponto_scheduler_lateness_seconds', max(0.0, lateness))
+        metrics.write_textfile()
+
+
+def cmd_next(args):
+    schedule = Schedule.load(args.config_dir)
+    for deadline in schedule.upcoming(datetime.now(), args.count):
+        print(deadline.strftime("%a %d/%m/%Y %H:%M"))
+    return 0
+
+
+def cmd_run(args):
+    schedule = Schedule.load(args.config_dir)
+    backend = PontoBackend(config_dir=args.config_dir)
+    scheduler = PunchScheduler(backend, schedule)
+
+    def report(deadline, lateness, result):
+        record = {'deadline': datetime.fromtimestamp(deadline).isoformat(timespec='seconds'),
+                  'late_ms': round(lateness * 1000, 3)}
+        record.update(result.as_dict())
+        print(json.dumps(record, ensure_ascii=False), flush=True)
+
+    scheduler.on_result = report
+    scheduler.reschedule()
+    deadline = scheduler.next_deadline()
+    if deadline is None:
+        print("Nenhum horário configurado em schedule.json", file=sys.stderr)
+        return 1
+    print(f"Próximo ponto: {datetime.fromtimestamp(deadline):%d/%m %H:%M:%S}", file=sys.stderr)
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backend.shutdown()
+    return 0
+
+
+def parse_arguments():
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Ponto App - agendador de batidas')
+    parser.add_argument('--config-dir', default=None, help='Diretório de configuração')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('run', help='Executar o agendador').set_defaults(func=cmd_run)
+
+    next_parser = subparsers.add_parser('next', help='Mostrar os próximos horários')
+    next_parser.add_argument('--count', type=int, default=8, help='Quantidade de horários')
+    next_parser.set_defaults(func=cmd_next)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_arguments()
+    sys.exit(args.func(args))
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""Single-flight guard for punches.
+
+Concurrent punch requests for the same config directory share one
+in-flight attempt and its result, instead of each logging in and
+registering on their own:
+
+- within a process, callers arriving while a punch runs wait on the
+  same Future;
+- across processes (a second app instance, the scheduler, cron), an
+  exclusive file lock serialises attempts, and the last result is kept
+  in a small state file next to it;
+- a successful result stays shared for ``window`` seconds, so a double
+  click or a second ``--auto`` start does not punch twice.
+
+Work that must not overlap a punch but has its own result (replaying a
+journaled punch) runs with ``exclusive`` under the same locks.
+"""
+# Standard library imports
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future
+
+if os.name == 'nt':
+    import msvcrt
+else:
+    import fcntl
+
+# Seconds between attempts to take a busy lock
+LOCK_POLL_INTERVAL = 0.05
+
+
+class FileLock:
+    """Exclusive advisory lock on a file, released when the process exits."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, timeout=None):
+        """Take the lock; return False if it is still busy after timeout seconds."""
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                if os.name == 'nt':
+                    msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._fd = fd
+                return True
+            except OSError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+
+    def release(self):
+        if self._fd is None:
+            return
+        try:
+            if os.name == 'nt':
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls into one and shares its result.
+
+    ``encode``/``decode`` convert a result to and from a JSON-serialisable
+    dict for the cross-process state file; ``shareable`` says whether a
+    finished result may be handed to later callers within the window
+    (e.g. only successful punches).
+    """
+
+    def __init__(self, lock_path, state_path, window, encode, decode, shareable=None,
+                 lock_timeout=None):
+        self.lock = FileLock(lock_path)
+        self.state_path = state_path
+        self.window = window
+        self.encode = encode
+        self.decode = decode
+        self.shareable = shareable or (lambda result: True)
+        self.lock_timeout = lock_timeout
+        self._mutex = threading.Lock()
+        # Held while the file lock is: one FileLock object serves every thread
+        self._call_lock = threading.Lock()
+        self._flight = None
+        self._finished_at = 0.0
+        self.coalesced = 0
+
+    def run(self, call, busy=None):
+        """Return call()'s result, or the result of a concurrent/recent call.
+
+        ``busy`` is returned if another process holds the lock for longer
+        than lock_timeout.
+        """
+        with self._mutex:
+            flight = self._flight
+            if flight is not None and (not flight.done() or self._recent()):
+                self.coalesced += 1
+                leader = False
+            else:
+                flight = self._flight = Future()
+                leader = True
+        if not leader:
+            return flight.result()
+
+        try:
+            result = self._run_locked(call, busy)
+        except BaseException as e:
+            with self._mutex:
+                self._flight = None
+            flight.set_exception(e)
+            raise
+        with self._mutex:
+            self._finished_at = time.monotonic()
+            if not self.shareable(result):
+                self._flight = None
+        flight.set_result(result)
+        return result
+
+    def reset(self):
+        """Forget the shared result, e.g. after the credentials changed."""
+        with self._mutex:
+            if self._flight is not None and self._flight.done():
+                self._flight = None
+        try:
+            os.remove(self.state_path)
+        except OSError:
+            pass
+
+    def _recent(self):
+        return time.monotonic() - self._finished_at < self.window
+
+    def exclusive(self, call, busy=None):
+        """Return call()'s result, run while no other call holds the locks.
+
+        Unlike ``run`` the result is neither shared nor taken from a
+        recent call. ``busy`` is returned if the lock stays taken for
+        longer than lock_timeout.
+        """
+        if not self._call_lock.acquire(timeout=-1 if self.lock_timeout is None else self.lock_timeout):
+            return busy
+        try:
+            if not self.lock.acquire(self.lock_timeout):
+                return busy
+            try:
+                return call()
+            finally:
+                self.lock.release()
+        finally:
+            self._call_lock.release()
+
+    def _run_locked(self, call, busy):
+        with self._call_lock:
+            if not self.lock.acquire(self.lock_timeout):
+                return busy
+            try:
+                # Another process may have just finished the same punch
+                shared = self.recent()
+                if shared is not None:
+                    self.coalesced += 1
+                    return shared
+                result = call()
+                self.remember(result)
+                return result
+            finally:
+                self.lock.release()
+
+    def recent(self):
+        """Return the result another process shared within the window, or None."""
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - state.get('finished_at', 0) >= self.window:
+            return None
+        return self.decode(state['result'])
+
+    def remember(self, result):
+        """Share result with other processes if it is shareable."""
+        if not self.shareable(result):
+            return
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'finished_at': time.time(), 'result': self.encode(result)}, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError:
+            pass
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""Credential vault holding many profiles under one master key.
+
+A vault is a directory:
+
+- ``vault.json``: format version, PBKDF2 salt and iterations of the
+  master key, a key-check token and a random key for naming records;
+- ``index.json``: the sorted profile names, for listing;
+- ``records/<id>.json``: one record per profile with the username and
+  the password encrypted under the master key. The id is an HMAC of the
+  profile name, so looking a profile up opens exactly one small file,
+  whatever the number of profiles, and file names don't reveal profile
+  names.
+
+Every password in a vault is encrypted with the same key, derived once
+from the secret and the vault's salt (and cached per process by
+KeyCache), instead of once per profile.
+
+The secret itself is never stored in the vault: it is the
+application's default, or kept by the caller (the OS keyring, or asked
+from the user). The key-check token, a constant encrypted under the
+master key, tells whether a secret is the right one; vaults still on
+the default secret have none. Rotating the secret writes the new token
+(and the previous one, until every record is re-encrypted) before
+touching any record, so readers and later processes can tell which key
+a record is under, and an interrupted rotation can be detected and
+finished.
+
+Each write goes to a temporary file in the same directory that is
+fsynced and renamed over the target, so a crash leaves either the old
+or the new version. Updating a profile rewrites only its record; adding
+or removing profiles also rewrites the index, under a file lock shared
+by all processes.
+"""
+# Standard library imports
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import tempfile
+import threading
+from contextlib import contextmanager
+
+# Local imports
+from ponto_singleflight import FileLock
+
+VAULT_DIR = "vault"
+VAULT_FORMAT = 1
+DEFAULT_PROFILE = "default"
+
+# Seconds to wait for another process changing the index or rotating the key
+VAULT_LOCK_TIMEOUT = 30
+
+# Plaintext of the key-check token
+KEY_CHECK = b"ponto-vault-key-check"
+
+
+class VaultError(Exception):
+    """The vault is busy, damaged or from a newer version."""
+
+
+def atomic_write(path, data):
+    """Replace path with data (str or bytes) through a temporary file and a rename.
+
+    The temporary file is created with mode 0600 and fsynced before the
+    rename, so readers see either the old or the new content.
+    """
+    if isinstance(data, str):
+        data = data.encode()
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class PontoVault:
+    """Profile records addressed by a keyed hash of their name, plus a name index.
+
+    Records are dicts (``username``, ``encrypted_password``); the vault
+    stores them but leaves encryption to the caller, which derives the
+    master key from its secret and ``salt``.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "vault.json")
+        self.index_path = os.path.join(directory, "index.json")
+        self.records_dir = os.path.join(directory, "records")
+        self.lock_path = os.path.join(directory, "vault.lock")
+        self.salt = None
+        self.iterations = None
+        # Identifies the vault to secret stores (derived from the salt)
+        self.id = None
+        self.key_check = None
+        self.previous_key_check = None
+        # The secret in use, known only in memory: shared by every backend
+        # holding this object, None while it is the default one
+        self.secret = None
+        self._name_key = None
+        self._lock = threading.Lock()
+
+    def open(self, iterations):
+        """Load the vault header, creating an empty vault if there is none. Returns self.
+
+        ``iterations`` is only used for a new vault.
+        """
+        with self._lock:
+            if self.salt is not None:
+                return self
+            meta = self._read_json(self.meta_path)
+            if meta is None:
+                os.makedirs(self.directory, mode=0o700, exist_ok=True)
+                with self._locked():
+                    # Another process may have created it while we waited
+                    meta = self._read_json(self.meta_path) or self._create(iterations)
+            if meta.get('format') != VAULT_FORMAT:
+                raise VaultError(f"Formato de cofre não suportado em {self.directory}")
+            self.iterations = meta['iterations']
+            self._name_key = base64.b64decode(meta['name_key'])
+            self.salt = base64.b64decode(meta['salt'])
+            self.id = hashlib.sha256(self.salt).hexdigest()[:16]
+            self._load_checks(meta)
+        return self
+
+    def reload(self):
+        """Re-read the key-check tokens, e.g. after another process rotated the secret.
+
+        Returns True if they changed.
+        """
+        with self._lock:
+            before = (self.key_check, self.previous_key_check)
+            self._load_checks(self._read_json(self.meta_path) or {})
+            return (self.key_check, self.previous_key_check) != before
+
+    @property
+    def rotating(self):
+        """True while a rotation is unfinished: some records may be under the previous key."""
+        return self.previous_key_check is not None
+
+    def verifies(self, fernet, previous=False):
+        """Return True if fernet holds the vault's key (or the previous one, mid-rotation).
+
+        Vaults without a token are on the default secret: None is returned.
+        """
+        from cryptography.fernet import InvalidToken
+        token = self.previous_key_check if previous else self.key_check
+        if token is None:
+            return None
+        try:
+            return hmac.compare_digest(fernet.decrypt(token.encode()), KEY_CHECK)
+        except InvalidToken:
+            return False
+
+    def record_path(self, name):
+        digest = hmac.new(self._name_key, name.encode(), hashlib.sha256).hexdigest()[:32]
+        return os.path.join(self.records_dir, f"{digest}.json")
+
+    def get(self, name):
+        """Return the record of a profile, or None if there is none."""
+        try:
+            with open(self.record_path(name), 'r') as f:
+                record = json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            raise VaultError(f"Registro do perfil {name} danificado")
+        return record if record.get('name') == name else None
+
+    def put(self, name, record):
+        """Store the record of one profile."""
+        self.put_many({name: record})
+
+    def put_many(self, records):
+        """Store the records of several profiles ({name: record}).
+
+        New names are added to the index (in one rewrite) before their
+        records are written, so an interruption can leave a listed
+        profile without credentials but never credentials that aren't
+        listed.
+        """
+        new = [name for name in records if not os.path.exists(self.record_path(name))]
+        if new:
+            with self._locked():
+                index = set(self.names())
+                if not index.issuperset(new):
+                    self._write_index(index.union(new))
+        for name, record in records.items():
+            self._write_record(name, record)
+
+    def delete(self, name):
+        """Remove a profile; returns True if it existed."""
+        with self._locked():
+            index = set(self.names())
+            try:
+                os.remove(self.record_path(name))
+                existed = True
+            except FileNotFoundError:
+                existed = False
+            if name in index:
+                index.discard(name)
+                self._write_index(index)
+                existed = True
+        return existed
+
+    def names(self):
+        """Return the sorted profile names from the index."""
+        index = self._read_json(self.index_path)
+        return index['profiles'] if index else []
+
+    def rekey(self, key_cache, old_secret, new_secret):
+        """Re-encrypt every password under new_secret. Returns the number of records rewritten.
+
+        The caller must keep new_secret (and old_secret, until this
+        returns) where it can find them again: the vault only records a
+        key-check token for each, written before any record is touched.
+        ``previous_key_check`` is dropped once the last record is
+        rewritten. Records already under the new key are skipped, so an
+        interrupted rotation can simply be run again with the same
+        secrets.
+        """
+        from cryptography.fernet import InvalidToken
+        rewritten = 0
+        with self._locked():
+            meta = self._read_json(self.meta_path)
+            self._load_checks(meta)
+            old = key_cache.get_fernet(old_secret, self.salt)
+            new = key_cache.get_fernet(new_secret, self.salt)
+            if not (self.verifies(old) is not False or self.verifies(old, previous=True)):
+                raise VaultError("Chave secreta atual incorreta")
+            if self.key_check is None and not self._opens_a_record(old, new):
+                raise VaultError("Chave secreta atual incorreta")
+            meta['key_check'] = new.encrypt(KEY_CHECK).decode()
+            meta['previous_key_check'] = old.encrypt(KEY_CHECK).decode()
+            atomic_write(self.meta_path, json.dumps(meta))
+            self._load_checks(meta)
+            self.secret = new_secret
+            for name in self.names():
+                record = self.get(name)
+                token = record.get('encrypted_password') if record else None
+                if not token:
+                    continue
+                try:
+                    password = old.decrypt(token.encode())
+                except InvalidToken:
+                    # Raises InvalidToken too if neither secret fits
+                    new.decrypt(token.encode())
+                    continue
+                record['encrypted_password'] = new.encrypt(password).decode()
+                self._write_record(name, record)
+                rewritten += 1
+            del meta['previous_key_check']
+            atomic_write(self.meta_path, json.dumps(meta))
+            self._load_checks(meta)
+        return rewritten
+
+    def _opens_a_record(self, *fernets):
+        # Without a key-check token, the first stored password tells
+        from cryptography.fernet import InvalidToken
+        for name in self.names():
+            record = self.get(name)
+            token = record.get('encrypted_password') if record else None
+            if not token:
+                continue
+            for fernet in fernets:
+                try:
+                    fernet.decrypt(token.encode())
+                    return True
+                except InvalidToken:
+                    pass
+            return False
+        return True
+
+    def _load_checks(self, meta):
+        self.key_check = meta.get('key_check')
+        self.previous_key_check = meta.get('previous_key_check')
+
+    def _create(self, iterations):
+        os.makedirs(self.records_dir, mode=0o700, exist_ok=True)
+        meta = {
+            'format': VAULT_FORMAT,
+            'kdf': "pbkdf2-sha256",
+            'iterations': iterations,
+            'salt': base64.b64encode(os.urandom(16)).decode(),
+            'name_key': base64.b64encode(os.urandom(32)).decode(),
+            'created_at': time.time(),
+        }
+        if not os.path.exists(self.index_path):
+            self._write_index(())
+        # The header goes last: a vault without one is not in use yet
+        atomic_write(self.meta_path, json.dumps(meta))
+        return meta
+
+    def _write_record(self, name, record):
+        record = dict(record, name=name, updated_at=time.time())
+        atomic_write(self.record_path(name), json.dumps(record))
+
+    def _write_index(self, names):
+        atomic_write(self.index_path, json.dumps({'profiles': sorted(names)}))
+
+    @contextmanager
+    def _locked(self):
+        # A lock object per use: flock is per open file, which also
+        # serialises threads of this process
+        lock = FileLock(self.lock_path)
+        if not lock.acquire(VAULT_LOCK_TIMEOUT):
+            raise VaultError("Cofre de credenciais ocupado por outro processo")
+        try:
+            yield
+        finally:
+            lock.release()
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            raise VaultError(f"Arquivo do cofre danificado: {path}")
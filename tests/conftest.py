@@ -0,0 +1,75 @@
+"""Shared fixtures: a local mock Icarus server and backends pointed at it."""
+# Standard library imports
+import os
+import sys
+import json
+import types
+
+# Third-party imports
+import pytest
+
+# The ponto_* modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Local imports
+from ponto_backend import PontoBackend
+from ponto_mock_server import MockIcarusServer
+
+USERNAME = "maria"
+PASSWORD = "segredo"
+
+
+def seed_location(config_dir):
+    """Cache a location that never expires, so no test looks it up on the network."""
+    with open(os.path.join(config_dir, "location.json"), 'w') as f:
+        json.dump({"latitude": -27.46, "longitude": -48.51, "resolved_at": 9999999999}, f)
+
+
+@pytest.fixture
+def mock_server():
+    server = MockIcarusServer()
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def config_dir(tmp_path):
+    seed_location(str(tmp_path))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def make_backend(config_dir, mock_server):
+    """Return a factory of backends on the mock server; all are shut down afterwards."""
+    backends = []
+
+    def make(**kwargs):
+        kwargs.setdefault('config_dir', config_dir)
+        kwargs.setdefault('base_url', mock_server.url)
+        backend = PontoBackend(**kwargs)
+        backends.append(backend)
+        return backend
+
+    yield make
+    for backend in backends:
+        backend.shutdown()
+
+
+@pytest.fixture
+def backend(make_backend):
+    backend = make_backend()
+    backend.update_credentials(USERNAME, PASSWORD)
+    return backend
+
+
+@pytest.fixture
+def keyring(monkeypatch):
+    """Replace the OS keyring with an in-memory one; returns its {(service, name): secret} dict."""
+    entries = {}
+    module = types.ModuleType("keyring")
+    module.get_password = lambda service, name: entries.get((service, name))
+    module.set_password = lambda service, name, secret: entries.__setitem__((service, name), secret)
+    module.delete_password = lambda service, name: entries.pop((service, name), None)
+    monkeypatch.setitem(sys.modules, "keyring", module)
+    return entries
@@ -0,0 +1,101 @@
+"""AsyncHttpClient stale-connection handling and the GUI loop drivers."""
+# Standard library imports
+import asyncio
+import threading
+
+# Third-party imports
+import pytest
+
+# Local imports
+from ponto_async import AsyncHttpClient, HttpError
+
+
+async def serve_once_per_connection(received):
+    """Start a server that answers the first request on a connection and
+    closes it, unanswered, on the second (as if it timed the connection out
+    just as the request arrived). Returns (server, url)."""
+    async def handle(reader, writer):
+        answered = False
+        while True:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except asyncio.IncompleteReadError:
+                break
+            length = 0
+            for line in head.decode('latin-1').split("\r\n"):
+                name, _, value = line.partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            received.append(head.split(b" ", 1)[0].decode())
+            if answered:
+                break
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\n{}")
+            await writer.drain()
+            answered = True
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    return server, f"http://127.0.0.1:{port}"
+
+
+async def two_requests(method, idempotent):
+    received = []
+    server, url = await serve_once_per_connection(received)
+    client = AsyncHttpClient(url, max_retries=0, backoff=0)
+    try:
+        await client.request(method, "/ponto", idempotent=idempotent, json_body={})
+        try:
+            response = await client.request(method, "/ponto", idempotent=idempotent, json_body={})
+        except HttpError as e:
+            response = e
+        return response, received
+    finally:
+        await client.close()
+        server.close()
+        await server.wait_closed()
+
+
+def test_punch_is_not_resent_after_the_server_drops_the_connection():
+    response, received = asyncio.run(two_requests('POST', idempotent=False))
+    # The server got the punch: sending it again could record it twice
+    assert isinstance(response, HttpError)
+    assert received == ['POST', 'POST']
+
+
+def test_idempotent_request_is_resent_on_a_fresh_connection():
+    response, received = asyncio.run(two_requests('GET', idempotent=True))
+    assert response.status_code == 200
+    assert received == ['GET', 'GET', 'GET']
+
+
+def test_qt_driver_runs_coroutines_off_the_gui_thread():
+    QtCore = pytest.importorskip("PyQt6.QtCore")
+    from ponto_async import QtLoopDriver
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    driver = QtLoopDriver()
+    delivered = []
+
+    async def work(value):
+        await asyncio.sleep(0.01)
+        return value, threading.get_ident()
+
+    def done(future):
+        delivered.append((future.result(), threading.get_ident()))
+        if len(delivered) == 100:
+            app.quit()
+
+    try:
+        for value in range(100):
+            driver.submit(work(value), done)
+        QtCore.QTimer.singleShot(5000, app.quit)
+        app.exec()
+    finally:
+        driver.close()
+    gui_thread = threading.get_ident()
+    assert sorted(result[0][0] for result in delivered) == list(range(100))
+    # Every coroutine ran on the loop thread, every callback on the GUI thread
+    assert {result[0][1] for result in delivered} == {driver._thread.ident}
+    assert {result[1] for result in delivered} == {gui_thread}
+    assert driver.loop.is_closed()
@@ -0,0 +1,96 @@
+"""Circuit breaker state machine, driven by a fake clock."""
+# Third-party imports
+import pytest
+
+# Local imports
+from ponto_breaker import (
+    CircuitBreaker, CircuitOpenError, BREAKER_MIN_CALLS, BREAKER_OPEN_SECONDS,
+    STATE_CLOSED, STATE_OPEN, STATE_HALF_OPEN,
+)
+
+PROBE_TIMEOUT = 10
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("POST /ponto/bater", clock)
+
+
+def trip(breaker):
+    for _ in range(BREAKER_MIN_CALLS):
+        breaker.before_call(PROBE_TIMEOUT)
+        breaker.record_failure()
+
+
+def test_stays_closed_below_the_minimum_number_of_calls(breaker):
+    for _ in range(BREAKER_MIN_CALLS - 1):
+        breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+    breaker.before_call(PROBE_TIMEOUT)
+
+
+def test_stays_closed_while_most_calls_succeed(breaker):
+    for _ in range(BREAKER_MIN_CALLS):
+        breaker.record_success(0.05)
+        breaker.record_success(0.05)
+        breaker.record_failure()
+    assert breaker.state == STATE_CLOSED
+
+
+def test_opens_and_fails_fast(breaker, clock):
+    trip(breaker)
+    assert breaker.state == STATE_OPEN
+    assert breaker.trips == 1
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.before_call(PROBE_TIMEOUT)
+    assert error.value.retry_in == pytest.approx(BREAKER_OPEN_SECONDS)
+
+
+def test_half_open_lets_one_probe_through(breaker, clock):
+    trip(breaker)
+    clock.now += BREAKER_OPEN_SECONDS
+    breaker.before_call(PROBE_TIMEOUT)
+    assert breaker.state == STATE_HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call(PROBE_TIMEOUT)
+    # An unanswered probe lets another call probe after its timeout
+    clock.now += PROBE_TIMEOUT
+    breaker.before_call(PROBE_TIMEOUT)
+
+
+def test_successful_probe_closes(breaker, clock):
+    trip(breaker)
+    clock.now += BREAKER_OPEN_SECONDS
+    breaker.before_call(PROBE_TIMEOUT)
+    breaker.record_success(0.05)
+    assert breaker.state == STATE_CLOSED
+    assert breaker.snapshot()['calls'] == 1
+    breaker.before_call(PROBE_TIMEOUT)
+
+
+def test_failed_probe_reopens_with_a_longer_cool_down(breaker, clock):
+    trip(breaker)
+    clock.now += BREAKER_OPEN_SECONDS
+    breaker.before_call(PROBE_TIMEOUT)
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN
+    assert breaker.trips == 2
+    clock.now += BREAKER_OPEN_SECONDS
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call(PROBE_TIMEOUT)
+    clock.now += BREAKER_OPEN_SECONDS
+    breaker.before_call(PROBE_TIMEOUT)
+    assert breaker.state == STATE_HALF_OPEN
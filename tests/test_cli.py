@@ -0,0 +1,72 @@
+"""BatchPuncher: punching for many profiles and draining offline punches."""
+# Standard library imports
+import os
+import asyncio
+
+# Third-party imports
+import pytest
+
+# Local imports
+from ponto_backend import PontoBackend, REGISTER_PATH, STATUS_OFFLINE, STATUS_SENT
+from ponto_cli import BatchPuncher, profiles_dir, open_vault
+
+PROFILES = ["ana", "bia"]
+
+
+@pytest.fixture
+def base_dir(config_dir):
+    for name in PROFILES:
+        backend = PontoBackend(config_dir=os.path.join(profiles_dir(config_dir), name),
+                               vault=open_vault(config_dir), profile=name)
+        backend.update_credentials(name, f"senha-{name}")
+        backend.shutdown()
+    return config_dir
+
+
+def offline_puncher(base_dir, mock_server):
+    """Return a puncher that can't reach the server until the final drain."""
+    puncher = BatchPuncher(PROFILES, base_dir=base_dir, workers=2, base_url="http://127.0.0.1:1")
+    puncher.transport.max_retries = 0
+    puncher.transport.breakers = None
+    take_offline = puncher.take_offline
+
+    def back_online():
+        puncher.transport.base_url = mock_server.url
+        return take_offline()
+    puncher.take_offline = back_online
+    return puncher
+
+
+def journal_counts(base_dir, name):
+    backend = PontoBackend(config_dir=os.path.join(profiles_dir(base_dir), name),
+                           vault=open_vault(base_dir), profile=name)
+    try:
+        return backend.journal.counts()
+    finally:
+        backend.shutdown()
+
+
+def test_punches_every_profile(base_dir, mock_server):
+    records = []
+    stats = BatchPuncher(PROFILES, base_dir=base_dir, base_url=mock_server.url).run(records.append)
+    assert sorted(record['profile'] for record in records) == PROFILES
+    assert stats['succeeded'] == 2
+    assert stats['replayed'] == 0
+    assert mock_server.counters[REGISTER_PATH] == 2
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_offline_punches_are_drained_before_exit(base_dir, mock_server, use_async):
+    puncher = offline_puncher(base_dir, mock_server)
+    records = []
+    if use_async:
+        stats = asyncio.run(puncher.run_async(records.append))
+    else:
+        stats = puncher.run(records.append)
+
+    assert {record['status'] for record in records} == {STATUS_OFFLINE}
+    assert stats['replayed'] == 2
+    assert stats['still_offline'] == 0
+    assert mock_server.counters[REGISTER_PATH] == 2
+    for name in PROFILES:
+        assert journal_counts(base_dir, name) == {STATUS_SENT: 1}
@@ -0,0 +1,168 @@
+"""Offline journal: duplicate and expiry rules, and replay through the backend."""
+# Standard library imports
+import os
+import time
+import sqlite3
+import threading
+
+# Third-party imports
+import pytest
+
+# Local imports
+from ponto_backend import REGISTER_PATH
+from ponto_journal import (
+    PunchJournal, JournalReplayer, SCHEMA, DUPLICATE_WINDOW, REPLAY_MAX_AGE, INFLIGHT_LEASE,
+    STATUS_SENT, STATUS_OFFLINE, STATUS_INFLIGHT, STATUS_UNKNOWN, STATUS_DUPLICATE, STATUS_EXPIRED,
+)
+
+NOW = 1_800_000_000.0
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = PunchJournal(os.path.join(str(tmp_path), "journal.db"))
+    yield journal
+    journal.close()
+
+
+def add(journal, status, punched_at, username="maria"):
+    entry_id = journal.append(username, punched_at)
+    journal.complete(entry_id, status)
+    return entry_id
+
+
+def claim(journal):
+    # Past every backoff delay
+    return [entry['id'] for entry in journal.claim_due(now=NOW + REPLAY_MAX_AGE / 2)]
+
+
+def test_due_entry_is_claimed_once(journal):
+    entry_id = add(journal, STATUS_OFFLINE, NOW)
+    assert claim(journal) == [entry_id]
+    assert claim(journal) == []
+    assert journal.counts() == {STATUS_INFLIGHT: 1}
+
+
+def test_entries_within_the_window_are_one_punch(journal):
+    first = add(journal, STATUS_OFFLINE, NOW)
+    add(journal, STATUS_OFFLINE, NOW + DUPLICATE_WINDOW / 2)
+    assert claim(journal) == [first]
+    assert journal.counts()[STATUS_DUPLICATE] == 1
+
+
+def test_entry_followed_by_a_sent_punch_is_not_replayed(journal):
+    add(journal, STATUS_OFFLINE, NOW)
+    add(journal, STATUS_SENT, NOW + 10 * DUPLICATE_WINDOW)
+    assert claim(journal) == []
+    assert journal.counts()[STATUS_DUPLICATE] == 1
+
+
+def test_other_users_do_not_supersede(journal):
+    entry_id = add(journal, STATUS_OFFLINE, NOW)
+    add(journal, STATUS_SENT, NOW + 60, username="joao")
+    assert claim(journal) == [entry_id]
+
+
+def test_old_entries_expire(journal):
+    add(journal, STATUS_OFFLINE, NOW - REPLAY_MAX_AGE)
+    assert claim(journal) == []
+    assert journal.counts() == {STATUS_EXPIRED: 1}
+
+
+def test_replayer_stops_at_the_first_offline_result(journal):
+    add(journal, STATUS_OFFLINE, NOW)
+    add(journal, STATUS_OFFLINE, NOW + 10 * DUPLICATE_WINDOW, username="joao")
+    sent = []
+
+    def send(entry):
+        sent.append(entry['id'])
+        return STATUS_OFFLINE, None, None, "Sem conexão com o servidor"
+
+    journal.claim_due = lambda **kwargs: PunchJournal.claim_due(journal, now=NOW + REPLAY_MAX_AGE / 2, **kwargs)
+    assert JournalReplayer(journal, send).replay_due() == 0
+    assert len(sent) == 1
+    # The second entry went back to the queue without counting an attempt
+    assert journal.counts() == {STATUS_OFFLINE: 2}
+
+
+def test_offline_punch_is_replayed_when_the_server_is_back(backend, mock_server):
+    backend.transport.base_url = "http://127.0.0.1:9"
+    backend.transport.max_retries = 0
+    assert backend.punch().status == STATUS_OFFLINE
+
+    backend.transport.base_url = mock_server.url
+    entries = backend.journal.claim_due(now=time.time() + REPLAY_MAX_AGE / 2)
+    assert len(entries) == 1
+    status, _, _, error = backend.replay_punch(entries[0])
+    backend.journal.complete(entries[0]['id'], status)
+    assert (status, error) == (STATUS_SENT, None)
+    assert mock_server.counters[REGISTER_PATH] == 1
+    assert backend.journal.counts() == {STATUS_SENT: 1}
+
+
+def test_processes_sharing_the_journal_claim_each_entry_once(journal):
+    entry_id = add(journal, STATUS_OFFLINE, NOW)
+    # A second connection stands in for the daemon replaying the same journal
+    other = PunchJournal(journal.path)
+    threads, claimed_by_other = [], []
+    check = journal._superseded
+
+    def superseded(row):
+        # The other process tries to claim between this one's read and update
+        thread = threading.Thread(target=lambda: claimed_by_other.extend(claim(other)))
+        thread.start()
+        thread.join(0.3)
+        threads.append(thread)
+        return check(row)
+
+    journal._superseded = superseded
+    assert claim(journal) == [entry_id]
+    threads[0].join(5)
+    other.close()
+    assert claimed_by_other == []
+
+
+def test_recovery_leaves_live_attempts_alone(journal):
+    journal.append("maria")
+    # Opening the journal in another process keeps this attempt in flight
+    other = PunchJournal(journal.path)
+    assert other.counts() == {STATUS_INFLIGHT: 1}
+    other.recover(now=time.time() + INFLIGHT_LEASE + 1)
+    other.close()
+    assert journal.counts() == {STATUS_UNKNOWN: 1}
+
+
+def test_journal_without_leases_is_upgraded(tmp_path):
+    path = os.path.join(str(tmp_path), "journal.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA.replace(",\n    lease_until REAL", ""))
+    conn.execute("INSERT INTO punches (username, punched_at, status) VALUES ('maria', 1, 'inflight')")
+    conn.commit()
+    conn.close()
+    journal = PunchJournal(path)
+    # An attempt from before leases can't be told from a dead one
+    assert journal.counts() == {STATUS_UNKNOWN: 1}
+    journal.close()
+
+
+def test_replay_waits_for_a_running_punch(backend, mock_server):
+    entry_id = backend.journal.append(backend.username, time.time() - 60)
+    backend.journal.complete(entry_id, STATUS_OFFLINE)
+    entry, = backend.journal.claim_due(now=time.time() + REPLAY_MAX_AGE / 2)
+
+    # A punch holds the lock while the replay waits for it
+    started = threading.Event()
+    results = []
+
+    def punch():
+        started.set()
+        time.sleep(0.2)
+        return backend.punch()
+    holder = threading.Thread(target=lambda: results.append(backend.single_flight.exclusive(punch)))
+    holder.start()
+    started.wait(5)
+    status, _, _, _ = backend.replay_punch(entry)
+    holder.join()
+    assert results[0].success
+    assert status == STATUS_DUPLICATE
+    assert mock_server.counters[REGISTER_PATH] == 1
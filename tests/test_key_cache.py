@@ -0,0 +1,137 @@
+"""Key derivation cache and the vault secret, which never lands on disk."""
+# Standard library imports
+import os
+import sys
+import json
+import threading
+
+# Third-party imports
+import pytest
+
+# Local imports
+from ponto_backend import KeyCache, DEFAULT_SECRET_KEY, kdf_stats
+
+from conftest import USERNAME, PASSWORD
+
+NEW_SECRET = "novo-segredo"
+
+
+def vault_files(backend):
+    """Return the content of every file in the backend's vault."""
+    contents = []
+    for directory, _, names in os.walk(backend.vault.directory):
+        for name in names:
+            with open(os.path.join(directory, name)) as f:
+                contents.append(f.read())
+    return "\n".join(contents)
+
+
+def test_key_is_derived_once_per_process():
+    cache = KeyCache(iterations=1000)
+    salt = os.urandom(16)
+    before = kdf_stats['derivations']
+    assert cache.get_fernet("segredo", salt) is KeyCache(iterations=1000).get_fernet("segredo", salt)
+    assert kdf_stats['derivations'] == before + 1
+    cache.invalidate("segredo", salt)
+    assert not cache.is_cached("segredo", salt)
+
+
+def test_rotated_secret_is_kept_in_the_keyring_only(backend, keyring):
+    assert backend.update_credentials(USERNAME, secret_key=NEW_SECRET)[0]
+    assert NEW_SECRET in keyring.values()
+    assert NEW_SECRET not in vault_files(backend)
+    assert backend.decrypt_password() == (True, PASSWORD)
+
+
+def test_rotated_secret_survives_a_restart(backend, make_backend, keyring):
+    backend.update_credentials(USERNAME, secret_key=NEW_SECRET)
+    restarted = make_backend()
+    assert restarted.secret_key == NEW_SECRET
+    assert restarted.decrypt_password() == (True, PASSWORD)
+
+
+def test_rotation_is_refused_without_a_keyring(backend, make_backend, monkeypatch):
+    monkeypatch.setitem(sys.modules, "keyring", None)
+    success, message = backend.update_credentials(USERNAME, secret_key=NEW_SECRET)
+    assert not success
+    assert "keyring" in message
+    restarted = make_backend()
+    assert restarted.secret_key == DEFAULT_SECRET_KEY
+    assert restarted.decrypt_password() == (True, PASSWORD)
+
+
+def test_secret_can_be_supplied_instead_of_stored(make_backend, config_dir):
+    backend = make_backend(secret_key=NEW_SECRET)
+    backend.update_credentials(USERNAME, PASSWORD)
+    assert NEW_SECRET not in vault_files(backend)
+
+    assert make_backend(secret_key=NEW_SECRET).decrypt_password() == (True, PASSWORD)
+    # Without the secret the vault can't be opened, and says why
+    success, message = make_backend().decrypt_password()
+    assert not success
+    assert "keyring" in message
+
+
+def test_other_process_follows_a_rotation(backend, make_backend, keyring):
+    other = make_backend()
+    backend.update_credentials(USERNAME, secret_key=NEW_SECRET)
+    # Saving from the stale process must not store the old ciphertext back
+    assert other.update_credentials(USERNAME)[0]
+    assert other.secret_key == NEW_SECRET
+    assert make_backend().decrypt_password() == (True, PASSWORD)
+
+
+def test_interrupted_rotation_is_finished_on_the_next_start(backend, make_backend, keyring, monkeypatch):
+    import ponto_vault
+    writes = []
+    real_write = ponto_vault.atomic_write
+
+    def crash_after_header(path, data):
+        # Let the new key-check token through, then die on the first record
+        writes.append(path)
+        if len(writes) > 1:
+            raise OSError("processo interrompido")
+        real_write(path, data)
+
+    monkeypatch.setattr(ponto_vault, "atomic_write", crash_after_header)
+    assert not backend.update_credentials(USERNAME, secret_key=NEW_SECRET)[0]
+    monkeypatch.setattr(ponto_vault, "atomic_write", real_write)
+
+    restarted = make_backend()
+    assert not restarted.vault.rotating
+    assert restarted.decrypt_password() == (True, PASSWORD)
+    with open(restarted.vault.meta_path) as f:
+        assert 'previous_key_check' not in json.load(f)
+
+
+def test_concurrent_misses_derive_once_without_blocking_other_keys(monkeypatch):
+    cache = KeyCache(iterations=1000)
+    slow_salt, fast_salt = os.urandom(16), os.urandom(16)
+    started = threading.Event()
+    release = threading.Event()
+    derivations = []
+    real_derive = KeyCache.derive_key
+
+    def derive(self, secret_key, salt):
+        derivations.append(salt)
+        if salt == slow_salt:
+            started.set()
+            release.wait(5)
+        return real_derive(self, secret_key, salt)
+
+    monkeypatch.setattr(KeyCache, "derive_key", derive)
+    threads = [threading.Thread(target=cache.get_fernet, args=("segredo", slow_salt)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    # The slow derivation must not hold up a different key
+    fast = threading.Thread(target=cache.get_fernet, args=("segredo", fast_salt))
+    fast.start()
+    fast.join(2)
+    blocked = fast.is_alive()
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert not blocked
+    assert derivations.count(slow_salt) == 1
+    assert cache.is_cached("segredo", slow_salt)
@@ -0,0 +1,93 @@
+"""Scheduler rescheduling with a fake clock, fixed jitter and a stub backend."""
+# Standard library imports
+from datetime import datetime, timedelta
+
+# Third-party imports
+import pytest
+
+# Local imports
+from ponto_backend import PunchResult
+from ponto_scheduler import Schedule, PunchScheduler, MISSED_AFTER
+
+# A Monday
+START = datetime(2026, 10, 19, 7, 0)
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri"]
+
+
+class StubBackend:
+    metrics = None
+
+    def __init__(self):
+        self.punches = 0
+
+    def register_time(self):
+        self.punches += 1
+        return PunchResult(True, "Ponto registrado com sucesso", "08:00:00")
+
+
+class FakeClock:
+    def __init__(self, start):
+        self.now = start.timestamp()
+
+    def __call__(self):
+        return self.now
+
+
+def make_scheduler(jitter, punches=None, holidays=None):
+    schedule = Schedule(punches or [{"days": WEEKDAYS, "time": "08:00"}], 60, holidays)
+    schedule.jitter = lambda: jitter
+    clock = FakeClock(START)
+    scheduler = PunchScheduler(StubBackend(), schedule, clock)
+    scheduler.reschedule()
+    return scheduler, clock
+
+
+def fire_next(scheduler, clock, delay=0.0):
+    """Advance the clock to the next punch (plus delay) and fire it; return its deadline."""
+    entry = min(entry for entry in scheduler._heap if entry[2] == 'punch')
+    scheduler._heap.remove(entry)
+    deadline, _, _, rule_index, nominal = entry
+    clock.now = deadline + delay
+    scheduler.fire(deadline, rule_index, nominal)
+    return datetime.fromtimestamp(deadline)
+
+
+@pytest.mark.parametrize("jitter", [-45.0, 0.0, 45.0])
+def test_one_punch_per_day_whatever_the_jitter(jitter):
+    scheduler, clock = make_scheduler(jitter)
+    fired = [fire_next(scheduler, clock) for _ in range(10)]
+    assert len({deadline.date() for deadline in fired}) == 10
+    assert all(deadline.weekday() < 5 for deadline in fired)
+    assert fired[0] == datetime(2026, 10, 19, 8, 0) + timedelta(seconds=jitter)
+    assert scheduler.backend.punches == 10
+
+
+def test_weekend_and_holidays_are_skipped():
+    scheduler, clock = make_scheduler(0.0, holidays=["2026-10-20"])
+    fired = [fire_next(scheduler, clock).date().isoformat() for _ in range(4)]
+    assert fired == ["2026-10-19", "2026-10-21", "2026-10-22", "2026-10-23"]
+    assert fire_next(scheduler, clock).date().isoformat() == "2026-10-26"
+
+
+def test_late_firing_is_missed_and_rescheduled_after_now():
+    scheduler, clock = make_scheduler(0.0)
+    # The machine slept through Monday and Tuesday morning
+    fire_next(scheduler, clock, delay=timedelta(days=1, hours=2).total_seconds())
+    assert scheduler.stats['missed'] == 1
+    assert scheduler.backend.punches == 0
+    next_deadline = datetime.fromtimestamp(scheduler.next_deadline())
+    assert next_deadline == datetime(2026, 10, 21, 8, 0)
+
+
+def test_slightly_late_firing_still_punches():
+    scheduler, clock = make_scheduler(0.0)
+    fire_next(scheduler, clock, delay=MISSED_AFTER / 2)
+    assert scheduler.stats['fired'] == 1
+    assert scheduler.stats['late_ms'] == [pytest.approx(MISSED_AFTER / 2 * 1000)]
+
+
+def test_each_rule_keeps_its_own_timer():
+    punches = [{"days": WEEKDAYS, "time": "08:00"}, {"days": WEEKDAYS, "time": "17:00"}]
+    scheduler, clock = make_scheduler(-30.0, punches)
+    fired = [fire_next(scheduler, clock).strftime("%d %H:%M") for _ in range(4)]
+    assert fired == ["19 07:59", "19 16:59", "20 07:59", "20 16:59"]
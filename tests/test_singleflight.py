@@ -0,0 +1,92 @@
+"""Single-flight coalescing of punches, within and across processes."""
+# Standard library imports
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Third-party imports
+import pytest
+
+# Local imports
+from ponto_backend import LOGIN_PATH, REGISTER_PATH
+from ponto_singleflight import SingleFlight, FileLock
+
+
+def make_flight(directory, window=60, shareable=None):
+    return SingleFlight(
+        os.path.join(directory, "punch.lock"),
+        os.path.join(directory, "punch.last"),
+        window,
+        lambda result: {'value': result},
+        lambda data: data['value'],
+        shareable=shareable,
+        lock_timeout=1,
+    )
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path)
+
+
+def test_concurrent_calls_share_one_attempt(directory):
+    flight = make_flight(directory)
+    release = threading.Event()
+    calls = []
+
+    def call():
+        calls.append(1)
+        release.wait(5)
+        return "ok"
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(flight.run, call) for _ in range(8)]
+        # Let every caller join the flight before it lands
+        for _ in range(500):
+            if flight.coalesced == 7:
+                break
+            time.sleep(0.01)
+        release.set()
+        results = [future.result() for future in futures]
+    assert results == ["ok"] * 8
+    assert len(calls) == 1
+
+
+def test_result_is_shared_within_the_window(directory):
+    flight = make_flight(directory)
+    assert flight.run(lambda: "first") == "first"
+    assert flight.run(lambda: "second") == "first"
+    flight.reset()
+    assert flight.run(lambda: "third") == "third"
+
+
+def test_unshareable_result_is_not_reused(directory):
+    flight = make_flight(directory, shareable=lambda result: result == "ok")
+    assert flight.run(lambda: "failed") == "failed"
+    assert flight.run(lambda: "ok") == "ok"
+
+
+def test_result_is_shared_with_another_process(directory):
+    assert make_flight(directory).run(lambda: "first") == "first"
+    # A second instance stands in for another process on the same files
+    assert make_flight(directory).run(lambda: "second") == "first"
+
+
+def test_busy_result_while_another_process_holds_the_lock(directory):
+    lock = FileLock(os.path.join(directory, "punch.lock"))
+    assert lock.acquire()
+    try:
+        flight = make_flight(directory)
+        flight.lock_timeout = 0.1
+        assert flight.run(lambda: "punched", busy="busy") == "busy"
+    finally:
+        lock.release()
+
+
+def test_double_click_punches_once(backend, mock_server):
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(lambda _: backend.register_time(), range(4)))
+    assert all(result.success for result in results)
+    assert mock_server.counters[LOGIN_PATH] == 1
+    assert mock_server.counters[REGISTER_PATH] == 1
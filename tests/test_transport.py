@@ -0,0 +1,72 @@
+"""Retry policy of ApiTransport and the token cache, against the mock server."""
+# Third-party imports
+import pytest
+
+# Local imports
+from ponto_backend import ApiTransport, LOGIN_PATH, REGISTER_PATH, STATUS_SENT, STATUS_OFFLINE
+
+
+@pytest.fixture
+def transport(mock_server):
+    transport = ApiTransport(mock_server.url, max_retries=2, backoff=0)
+    yield transport
+    transport.close()
+
+
+def test_idempotent_call_is_retried_on_gateway_errors(transport, mock_server):
+    mock_server.error_rate = 1.0
+    response = transport.post(LOGIN_PATH, idempotent=True, json={'username': "u", 'password': "p"})
+    assert response.status_code == 503
+    assert mock_server.counters[LOGIN_PATH] == transport.max_retries + 1
+
+
+def test_punch_is_never_retried(transport, mock_server):
+    mock_server.error_rate = 1.0
+    response = transport.post(REGISTER_PATH, json={'idMutuario': 1})
+    assert response.status_code == 503
+    assert mock_server.counters[REGISTER_PATH] == 1
+
+
+def test_retry_stops_at_first_success(transport, mock_server):
+    response = transport.post(LOGIN_PATH, idempotent=True, json={'username': "u", 'password': "p"})
+    assert response.status_code == 200
+    assert mock_server.counters[LOGIN_PATH] == 1
+
+
+def test_unreachable_server_keeps_the_punch_offline(make_backend, mock_server):
+    backend = make_backend()
+    backend.update_credentials("maria", "segredo")
+    # Nothing listens there any more: the connection is refused
+    mock_server.stop()
+    backend.transport.max_retries = 0
+    result = backend.punch()
+    assert not result.success
+    assert result.status == STATUS_OFFLINE
+    assert backend.journal.counts() == {STATUS_OFFLINE: 1}
+
+
+def test_token_is_reused_between_punches(backend, mock_server):
+    assert backend.punch().status == STATUS_SENT
+    assert backend.punch().status == STATUS_SENT
+    assert mock_server.counters[LOGIN_PATH] == 1
+    assert mock_server.counters[REGISTER_PATH] == 2
+
+
+def test_token_is_reused_by_a_new_process(backend, make_backend, mock_server):
+    assert backend.punch().success
+    # Same config directory: the encrypted token file is picked up
+    assert make_backend().punch().success
+    assert mock_server.counters[LOGIN_PATH] == 1
+
+
+def test_revoked_token_is_refreshed_once(backend, mock_server):
+    assert backend.punch().success
+    with mock_server.lock:
+        mock_server.tokens.clear()
+    result = backend.punch()
+    assert result.success
+    assert result.status == STATUS_SENT
+    # The 401 register, then a login and the register that went through
+    assert mock_server.counters[LOGIN_PATH] == 2
+    assert mock_server.counters[REGISTER_PATH] == 3
+
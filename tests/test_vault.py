@@ -0,0 +1,126 @@
+"""Credential vault: profiles, key rotation and the move from config.json."""
+# Standard library imports
+import os
+import json
+
+# Third-party imports
+import pytest
+
+# Local imports
+import ponto_vault
+from ponto_backend import KeyCache, LEGACY_SALT, DEFAULT_SECRET_KEY
+from ponto_vault import PontoVault, VaultError
+
+from conftest import USERNAME, PASSWORD, seed_location
+
+
+@pytest.fixture
+def vault_dir(tmp_path):
+    return os.path.join(str(tmp_path), "vault")
+
+
+@pytest.fixture
+def profile_backend(make_backend, tmp_path, vault_dir):
+    """Return a factory of backends, one config directory per profile, on one vault directory."""
+    def make(profile, vault=None):
+        config_dir = os.path.join(str(tmp_path), profile)
+        os.makedirs(config_dir, exist_ok=True)
+        seed_location(config_dir)
+        return make_backend(config_dir=config_dir, vault=vault or PontoVault(vault_dir), profile=profile)
+    return make
+
+
+def read_meta(vault_dir):
+    with open(os.path.join(vault_dir, "vault.json")) as f:
+        return json.load(f)
+
+
+def test_legacy_config_is_moved_into_the_vault(make_backend, config_dir):
+    fernet = KeyCache().get_fernet(DEFAULT_SECRET_KEY, LEGACY_SALT)
+    config_file = os.path.join(config_dir, "config.json")
+    with open(config_file, 'w') as f:
+        json.dump({
+            'username': USERNAME,
+            'encrypted_password': fernet.encrypt(PASSWORD.encode()).decode(),
+            'punch_window': 30,
+        }, f)
+
+    backend = make_backend()
+    assert backend.decrypt_password() == (True, PASSWORD)
+    assert backend.vault.get(backend.profile)['username'] == USERNAME
+    with open(config_file) as f:
+        settings = json.load(f)
+    assert 'username' not in settings
+    assert 'encrypted_password' not in settings
+    assert settings['punch_window'] == 30
+
+
+def test_rekey_rewrites_every_profile(profile_backend, vault_dir, keyring):
+    first = profile_backend("a")
+    first.update_credentials("ana", "senha-a")
+    profile_backend("b").update_credentials("bia", "senha-b")
+
+    assert first.update_credentials("ana", secret_key="novo-segredo")[0]
+    meta = read_meta(vault_dir)
+    assert 'key_check' in meta
+    assert 'previous_key_check' not in meta
+    # Every record is already under the new secret, and the old one is refused
+    vault = PontoVault(vault_dir).open(0)
+    fernet = KeyCache().get_fernet("novo-segredo", vault.salt)
+    passwords = {fernet.decrypt(vault.get(name)['encrypted_password'].encode()) for name in vault.names()}
+    assert passwords == {b"senha-a", b"senha-b"}
+    with pytest.raises(VaultError):
+        vault.rekey(KeyCache(), DEFAULT_SECRET_KEY, "outro")
+    assert profile_backend("b").decrypt_password() == (True, "senha-b")
+
+
+def test_backends_sharing_a_vault_follow_a_rotation(profile_backend, vault_dir, keyring):
+    shared = PontoVault(vault_dir)
+    first = profile_backend("a", shared)
+    second = profile_backend("b", shared)
+    first.update_credentials("ana", "senha-a")
+    second.update_credentials("bia", "senha-b")
+
+    first.update_credentials("ana", secret_key="novo-segredo")
+    assert second.secret_key == "novo-segredo"
+    assert second.decrypt_password() == (True, "senha-b")
+
+
+def test_rekey_with_a_wrong_secret_is_refused(profile_backend, vault_dir):
+    profile_backend("a").update_credentials("ana", "senha-a")
+    vault = PontoVault(vault_dir).open(KeyCache().iterations)
+    with pytest.raises(VaultError):
+        vault.rekey(KeyCache(), "errado", "novo-segredo")
+    assert 'key_check' not in read_meta(vault_dir)
+    assert profile_backend("a").decrypt_password() == (True, "senha-a")
+
+
+def test_rekey_is_refused_if_the_header_cannot_be_written(backend, make_backend, keyring, monkeypatch):
+    records_before = {
+        name: open(os.path.join(backend.vault.records_dir, name)).read()
+        for name in os.listdir(backend.vault.records_dir)
+    }
+
+    real_write = ponto_vault.atomic_write
+
+    def fail(path, data):
+        raise OSError("disco cheio")
+    monkeypatch.setattr(ponto_vault, "atomic_write", fail)
+
+    success, _ = backend.update_credentials(USERNAME, secret_key="novo-segredo")
+    assert not success
+    monkeypatch.setattr(ponto_vault, "atomic_write", real_write)
+    for name, content in records_before.items():
+        assert open(os.path.join(backend.vault.records_dir, name)).read() == content
+    assert not keyring
+    restarted = make_backend()
+    assert restarted.secret_key == DEFAULT_SECRET_KEY
+    assert restarted.decrypt_password() == (True, PASSWORD)
+
+
+def test_damaged_header_is_reported(vault_dir):
+    PontoVault(vault_dir).open(1000)
+    with open(os.path.join(vault_dir, "vault.json"), 'w') as f:
+        f.write("{")
+    with pytest.raises(VaultError):
+        PontoVault(vault_dir).open(1000)